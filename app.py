@@ -1,33 +1,105 @@
 import streamlit as st
 import os
-import json
-from process_embeddings import PineconeLoader  
+import shutil
+from ingest_jobs import ACTIVE_STATUSES, FAILED, QUEUED, IngestWorkerPool, JobQueue
+from doc_store import CandidateDocStore
+from index_manifest import IndexManifest
+from json_stream import preview_records
+from process_embeddings import PineconeLoader
+from sqlite_cache import EmbeddingCache
+from vector_store import LocalVectorStore, PineconeVectorStore
+
+INDEX_NAME = "cv-index"
+# Uploads are staged here until their ingest job finishes
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join("/tmp", "cv_uploads"))
+
+
+@st.cache_resource
+def get_ingest_pool():
+    """One worker pool per server process, shared by every session and kept across reruns.
+
+    The index client, manifest, embedding cache and doc store are created once here, so reruns
+    don't reconnect to Pinecone and concurrent jobs share one view of the index.
+    """
+    # Set LOCAL_VECTOR_STORE_PATH to index into an in-process store instead of Pinecone
+    local_path = os.getenv("LOCAL_VECTOR_STORE_PATH")
+    vector_store = LocalVectorStore(local_path) if local_path else PineconeVectorStore(INDEX_NAME)
+    manifest = IndexManifest(vector_store.location)
+    embedding_cache = EmbeddingCache()
+    doc_store = CandidateDocStore()
+
+    def make_loader(job):
+        return PineconeLoader(
+            aggregated_json_path=job["file_path"],
+            index_name=job["index_name"],
+            vector_store=vector_store,
+            manifest=manifest,
+            embedding_cache=embedding_cache,
+            doc_store=doc_store,
+            delete_missing=bool(job["full_ingest"]),
+        )
+
+    return IngestWorkerPool(JobQueue(), make_loader).start()
+
+
+def stage_upload(uploaded_file):
+    """Copy an upload to disk once per distinct file, without holding a second copy in memory."""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    file_path = os.path.join(UPLOAD_DIR, f"{uploaded_file.file_id}-{os.path.basename(uploaded_file.name)}")
+    if not os.path.exists(file_path):
+        uploaded_file.seek(0)
+        with open(file_path + ".part", "wb") as f:
+            shutil.copyfileobj(uploaded_file, f, 1024 * 1024)
+        os.replace(file_path + ".part", file_path)
+    return file_path
+
+
+pool = get_ingest_pool()
+
 # Streamlit app title
 st.title("Pinecone Candidate Data Loader")
 
 # File uploader for JSON file
-uploaded_file = st.file_uploader("Upload a JSON file containing candidate data", type=["json"])
+uploaded_file = st.file_uploader("Upload a JSON file containing candidate data", type=["json", "jsonl"])
 
 if uploaded_file is not None:
-    # Save the uploaded file temporarily
-    file_path = os.path.join("/tmp", uploaded_file.name)
-    with open(file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-
-    # Initialize PineconeLoader with the uploaded file
-    loader = PineconeLoader(
-        aggregated_json_path=file_path,
-        index_name="cv-index"
-    )
-
-    # Button to trigger the loading and indexing process
+    file_path = stage_upload(uploaded_file)
+
+    # A complete export (e.g. aggregated_data.json) replaces the index contents; a partial one only adds
+    full_ingest = st.checkbox("This file holds every candidate (remove candidates missing from it)")
+
+    # Queue the file for the background workers; the page stays usable while it's indexed
     if st.button("Load and Index Data"):
-        with st.spinner("Loading and indexing data..."):
-            loader.load_and_index()
-        st.success("Data successfully loaded and indexed into Pinecone!")
+        pool.submit(file_path, INDEX_NAME, name=uploaded_file.name, remove_file=True, full_ingest=full_ingest)
+        st.success(f"Queued {uploaded_file.name} for indexing. Progress is shown below.")
 
-    # Optionally, display the content of the uploaded file
+    # Optionally, display the first candidates of the uploaded file without parsing all of it
     if st.checkbox("Show uploaded JSON content"):
-        with open(file_path, "r") as f:
-            json_data = json.load(f)
-            st.json(json_data)
\ No newline at end of file
+        st.json(preview_records(file_path, limit=20))
+
+
+# Re-render just the job list every few seconds instead of rerunning the whole script
+@st.fragment(run_every=2)
+def show_jobs():
+    jobs = pool.queue.list(limit=20)
+    if not jobs:
+        return
+    st.subheader("Ingest jobs")
+    for job in jobs:
+        stats = (f"{job['processed']}" + (f"/{job['total']}" if job["total"] is not None else "")
+                 + f" candidates, {job['rate']:.1f}/sec, {job['upserted']} upserted, "
+                 f"{job['unchanged']} unchanged, {job['deleted']} deleted, {job['errors']} errors, {job['elapsed']:.0f}s")
+        label = f"**{job['name']}** — {job['status']}"
+        if job["status"] in ACTIVE_STATUSES:
+            st.progress(job["fraction"] or 0.0, text=f"{label}: {stats}")
+            if job["status"] == QUEUED and st.button("Cancel", key=f"cancel-{job['id']}"):
+                pool.queue.cancel(job["id"])
+        else:
+            st.markdown(f"{label}: {stats}")
+            if job["status"] == FAILED:
+                st.error(job["error"])
+                if os.path.exists(job["file_path"]) and st.button("Retry", key=f"retry-{job['id']}"):
+                    pool.retry(job["id"])
+
+
+show_jobs()
@@ -0,0 +1,4 @@
+"""Offline benchmark harness: synthetic corpus, fake Drive/S3, mock OpenAI API and a runner.
+
+Run with `python -m benchmarks --help`.
+"""
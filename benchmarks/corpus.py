@@ -0,0 +1,267 @@
+import io
+import os
+import json
+import random
+import zipfile
+from xml.sax.saxutils import escape
+
+FIRST_NAMES = ["Aarav", "Priya", "Rahul", "Ananya", "Vikram", "Sneha", "Arjun", "Kavya", "Rohan", "Meera",
+               "James", "Olivia", "Liam", "Emma", "Noah", "Sophia", "Lucas", "Mia", "Ethan", "Isla"]
+LAST_NAMES = ["Sharma", "Patel", "Iyer", "Reddy", "Gupta", "Nair", "Singh", "Mehta", "Rao", "Das",
+              "Smith", "Brown", "Taylor", "Wilson", "Clark", "Lewis", "Walker", "Hall", "Young", "King"]
+CITIES = ["Bengaluru", "Pune", "Hyderabad", "Chennai", "Mumbai", "Delhi", "Noida", "Gurugram", "London", "Remote"]
+SKILLS = ["Python", "Django", "Flask", "FastAPI", "JavaScript", "TypeScript", "React", "Node.js", "SQL",
+          "PostgreSQL", "MongoDB", "Redis", "Docker", "Kubernetes", "AWS", "GCP", "Azure", "Terraform",
+          "Machine Learning", "PyTorch", "TensorFlow", "NLP", "Pandas", "Spark", "Kafka", "Go", "Java",
+          "Spring Boot", "CI/CD", "Git", "Linux", "REST API", "GraphQL", "Airflow", "Tableau", "Excel"]
+TITLES = ["Software Engineer", "Senior Software Engineer", "Backend Developer", "Data Scientist",
+          "Data Engineer", "DevOps Engineer", "Full Stack Developer", "ML Engineer", "Tech Lead", "QA Engineer"]
+COMPANIES = ["Infosys", "TCS", "Wipro", "Accenture", "Flipkart", "Swiggy", "Zomato", "Razorpay",
+             "Freshworks", "Zoho", "Amazon", "Microsoft", "Google", "Atlassian", "Thoughtworks"]
+DEGREES = ["B.Tech Computer Science", "B.E. Information Technology", "M.Tech Data Science", "MCA", "B.Sc Mathematics"]
+INSTITUTIONS = ["IIT Bombay", "IIT Delhi", "NIT Trichy", "BITS Pilani", "VIT Vellore", "Anna University",
+                "Delhi University", "University of Pune"]
+VERBS = ["Built", "Designed", "Led", "Migrated", "Optimized", "Automated", "Maintained", "Shipped", "Scaled"]
+OBJECTS = ["a payments service", "the data pipeline", "internal dashboards", "a recommendation engine",
+           "CI/CD workflows", "REST APIs", "the search backend", "ETL jobs", "microservices", "a mobile backend"]
+
+LINES_PER_PAGE = 50
+# Kinds of synthetic documents and the extension they are stored under
+# Bump when the generated documents change, so cached corpora are rebuilt
+CORPUS_VERSION = 2
+KIND_EXTENSIONS = {"text_pdf": ".pdf", "scanned_pdf": ".pdf", "docx": ".docx"}
+
+
+def synthetic_candidate(rng):
+    """A Candidate-shaped dict with plausible random content."""
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    handle = name.lower().replace(" ", ".")
+    jobs = rng.randint(1, 4)
+    experience = [
+        {
+            "job_title": rng.choice(TITLES),
+            "company": rng.choice(COMPANIES),
+            "address": rng.choice(CITIES),
+            "duration": f"{2012 + i * 2} - {2014 + i * 2}",
+            "responsibilities": [f"{rng.choice(VERBS)} {rng.choice(OBJECTS)}" for _ in range(rng.randint(2, 5))],
+        }
+        for i in range(jobs)
+    ]
+    return {
+        "personal_info": {
+            "name": name,
+            "email": f"{handle}{rng.randint(1, 999)}@example.com",
+            "phone": f"+91 9{rng.randint(100000000, 999999999)}",
+            "address": rng.choice(CITIES),
+            "linkedin": f"linkedin.com/in/{handle}",
+            "github": None,
+        },
+        "career_objective": f"{rng.choice(TITLES)} looking to work on {rng.choice(OBJECTS)}.",
+        "skills": rng.sample(SKILLS, rng.randint(4, 12)),
+        "experience": experience,
+        "education": [{"degree": rng.choice(DEGREES), "institution": rng.choice(INSTITUTIONS), "duration": "2008 - 2012"}],
+        "projects": [
+            {"title": f"Project {rng.randint(1, 99)}", "description": f"{rng.choice(VERBS)} {rng.choice(OBJECTS)}",
+             "technologies_used": rng.sample(SKILLS, 3)}
+            for _ in range(rng.randint(0, 3))
+        ],
+        "certifications": [],
+        "achievements": [],
+        "total_experience": round(jobs * 2 + rng.random(), 1),
+        "relevant_experience": {job["job_title"]: 2.0 for job in experience},
+    }
+
+
+def synthetic_jd(rng):
+    """A JobDescription-shaped dict."""
+    low = rng.randint(0, 8)
+    return {
+        "role": rng.choice(TITLES),
+        "experience": f"{low}-{low + rng.randint(1, 4)} years",
+        "location": rng.choice(CITIES),
+        "job_description": f"We are hiring to work on {rng.choice(OBJECTS)} at {rng.choice(COMPANIES)}.",
+        "key_responsibilities": [f"{rng.choice(VERBS)} {rng.choice(OBJECTS)}" for _ in range(rng.randint(3, 6))],
+        "qualifications": [rng.choice(DEGREES)],
+        "skills": rng.sample(SKILLS, rng.randint(3, 8)),
+    }
+
+
+def _candidate_lines(candidate):
+    info = candidate["personal_info"]
+    lines = [info["name"], f"{info['email']} | {info['phone']} | {info['address']}", "",
+             "Objective", candidate["career_objective"], "", "Skills", ", ".join(candidate["skills"]), "", "Experience"]
+    for job in candidate["experience"]:
+        lines += [f"{job['job_title']} at {job['company']}, {job['address']} ({job['duration']})"]
+        lines += [f"- {item}" for item in job["responsibilities"]]
+    lines += ["", "Education"]
+    lines += [f"{e['degree']}, {e['institution']} ({e['duration']})" for e in candidate["education"]]
+    for project in candidate["projects"]:
+        lines += ["", project["title"], project["description"], "Tech: " + ", ".join(project["technologies_used"])]
+    return lines
+
+
+def _jd_lines(jd):
+    lines = [jd["role"], f"Location: {jd['location']}", f"Experience: {jd['experience']}", "", jd["job_description"],
+             "", "Responsibilities"]
+    lines += [f"- {item}" for item in jd["key_responsibilities"]]
+    lines += ["", "Qualifications"] + jd["qualifications"] + ["", "Skills: " + ", ".join(jd["skills"])]
+    return lines
+
+
+def _paginate(lines, pages, rng):
+    """Spread the content over exactly `pages` pages, padding with filler bullet points."""
+    target = (pages - 1) * LINES_PER_PAGE + LINES_PER_PAGE // 2
+    lines = list(lines)
+    while len(lines) < target:
+        lines.append(f"- {rng.choice(VERBS)} {rng.choice(OBJECTS)} using {rng.choice(SKILLS)}")
+    lines = lines[:pages * LINES_PER_PAGE]
+    return [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)]
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def text_pdf_bytes(pages):
+    """A minimal PDF with a real text layer (Helvetica), one content stream per page."""
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        stream = "BT /F1 10 Tf 14 TL 50 790 Td " + " ".join(f"({_pdf_escape(line)}) Tj T*" for line in lines) + " ET"
+        data = stream.encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Resources << /Font << /F1 3 0 R >> >> "
+            f"/Contents {content_id} 0 R >>".encode()
+        )
+        kids.append(len(objects))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{k} 0 R' for k in kids)}] /Count {len(kids)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def scanned_pdf_bytes(pages, dpi=150):
+    """An image-only PDF (no text layer), as produced by a scanner; needs Pillow."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    try:
+        font = ImageFont.load_default(size=dpi // 6)
+    except TypeError:  # Pillow < 10.1 only has the small bitmap font
+        font = ImageFont.load_default()
+    width, height = int(8.27 * dpi), int(11.69 * dpi)
+    images = []
+    for lines in pages:
+        image = Image.new("L", (width, height), 255)
+        draw = ImageDraw.Draw(image)
+        y = dpi // 2
+        for line in lines:
+            draw.text((dpi // 2, y), line, fill=0, font=font)
+            y += dpi // 5
+        images.append(image)
+    buffer = io.BytesIO()
+    images[0].save(buffer, "PDF", resolution=dpi, save_all=True, append_images=images[1:])
+    return buffer.getvalue()
+
+
+def docx_bytes(pages):
+    """A minimal .docx (one paragraph per line, page breaks between pages)."""
+    paragraphs = []
+    for i, lines in enumerate(pages):
+        if i:
+            paragraphs.append('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+        paragraphs += [f'<w:p><w:r><w:t xml:space="preserve">{escape(line)}</w:t></w:r></w:p>' for line in lines]
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f'<w:body>{"".join(paragraphs)}</w:body></w:document>'
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            '</Types>'
+        ))
+        archive.writestr("_rels/.rels", (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="word/document.xml"/></Relationships>'
+        ))
+        archive.writestr("word/document.xml", document)
+    return buffer.getvalue()
+
+
+RENDERERS = {"text_pdf": text_pdf_bytes, "scanned_pdf": scanned_pdf_bytes, "docx": docx_bytes}
+
+
+def _pick_kind(rng, kinds):
+    roll, total = rng.random(), 0.0
+    for kind, share in kinds.items():
+        total += share
+        if roll < total:
+            return kind
+    return next(reversed(kinds))
+
+
+def generate_corpus(directory, cvs=50, jds=20, candidates=1000, max_pages=4, scanned_ratio=0.3,
+                    docx_ratio=0.3, seed=0):
+    """Write a reproducible synthetic corpus and return its manifest.
+
+    CVs and JDs are each a mix of text PDFs, scanned PDFs and DOCX. Page counts vary from 1 to `max_pages`. `candidates`
+    extracted candidate records are also written as candidates.jsonl for the indexing
+    benchmark. The manifest (corpus.json) lists every document with its kind and page
+    count; an existing corpus with the same parameters is reused.
+    """
+    params = {"version": CORPUS_VERSION, "cvs": cvs, "jds": jds, "candidates": candidates, "max_pages": max_pages,
+              "scanned_ratio": scanned_ratio, "docx_ratio": docx_ratio, "seed": seed}
+    manifest_path = os.path.join(directory, "corpus.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest["params"] == params:
+            return manifest
+
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    documents = []
+    # Both pipelines sniff content types, so CV and JD folders get the same mix of formats
+    kinds = {"docx": docx_ratio, "scanned_pdf": (1 - docx_ratio) * scanned_ratio,
+             "text_pdf": (1 - docx_ratio) * (1 - scanned_ratio)}
+    for role, count, content in (("cv", cvs, lambda: _candidate_lines(synthetic_candidate(rng))),
+                                 ("jd", jds, lambda: _jd_lines(synthetic_jd(rng)))):
+        for i in range(count):
+            kind = _pick_kind(rng, kinds)
+            pages = _paginate(content(), rng.randint(1, max_pages), rng)
+            name = f"{role}_{i:05d}{KIND_EXTENSIONS[kind]}"
+            path = os.path.join(directory, name)
+            with open(path, "wb") as f:
+                f.write(RENDERERS[kind](pages))
+            documents.append({"role": role, "name": name, "path": path, "kind": kind, "pages": len(pages)})
+
+    candidates_path = os.path.join(directory, "candidates.jsonl")
+    with open(candidates_path, "w", encoding="utf-8") as f:
+        for _ in range(candidates):
+            f.write(json.dumps(synthetic_candidate(rng)) + "\n")
+
+    manifest = {"params": params, "documents": documents, "candidates_path": candidates_path}
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
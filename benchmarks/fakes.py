@@ -0,0 +1,206 @@
+import io
+import re
+import time
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+MIME_TYPES = {
+    ".pdf": "application/pdf",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".doc": "application/msword",
+}
+
+
+class _Blob:
+    """An in-memory file with the metadata Drive and S3 report for it."""
+
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+        self.md5 = hashlib.md5(data).hexdigest()
+        self.modified = datetime.now(timezone.utc)
+
+
+class _NetworkModel:
+    """Per-request latency plus optional bandwidth limit, to make the fakes behave like a WAN."""
+
+    def __init__(self, latency=0.0, bandwidth=None):
+        self.latency = latency
+        self.bandwidth = bandwidth
+
+    def wait(self, size=0):
+        delay = self.latency + (size / self.bandwidth if self.bandwidth else 0.0)
+        if delay:
+            time.sleep(delay)
+
+
+class _Response(dict):
+    """Stands in for httplib2.Response: a header dict with a status attribute."""
+
+    def __init__(self, status, headers):
+        super().__init__(headers)
+        self.status = status
+
+
+class _RangeHttp:
+    """Minimal http object serving Range requests, as MediaIoBaseDownload expects."""
+
+    def __init__(self, service):
+        self.service = service
+        self.requests = 0
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        blob = self.service.blobs[uri.rsplit("/", 1)[1]]
+        total = len(blob.data)
+        match = re.match(r"bytes=(\d+)-(\d+)", (headers or {}).get("range", ""))
+        start, end = (int(match.group(1)), min(int(match.group(2)), total - 1)) if match else (0, total - 1)
+        content = blob.data[start:end + 1]
+        with self.service.lock:
+            self.requests += 1
+        self.service.network.wait(len(content))
+        return _Response(206, {"content-range": f"bytes {start}-{end}/{total}",
+                               "content-length": str(len(content))}), content
+
+
+class _MediaRequest:
+    """What files().get_media() returns: enough of HttpRequest for MediaIoBaseDownload."""
+
+    def __init__(self, service, file_id):
+        self.uri = f"https://fake-drive.local/files/{file_id}"
+        self.http = service.http
+        self.headers = {}
+        self.method = "GET"
+
+    def execute(self):
+        _, content = self.http.request(self.uri)
+        return content
+
+
+class _ListRequest:
+    def __init__(self, service, page_size, page_token):
+        self.service = service
+        self.page_size = page_size
+        self.page_token = page_token
+
+    def execute(self):
+        self.service.network.wait()
+        start = int(self.page_token or 0)
+        ids = self.service.order[start:start + self.page_size]
+        response = {"files": [self.service.metadata(file_id) for file_id in ids]}
+        if start + self.page_size < len(self.service.order):
+            response["nextPageToken"] = str(start + self.page_size)
+        return response
+
+
+class _Files:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, q=None, fields=None, pageSize=100, pageToken=None, **kwargs):
+        return _ListRequest(self.service, pageSize, pageToken)
+
+    def get_media(self, fileId, **kwargs):
+        return _MediaRequest(self.service, fileId)
+
+
+class FakeDriveService:
+    """In-memory stand-in for the Drive v3 service object used by latest.py.
+
+    Supports paginated files().list() and files().get_media() downloads through the real
+    googleapiclient MediaIoBaseDownload (Range requests over a fake http object), with
+    optional per-request latency and bandwidth.
+    """
+
+    def __init__(self, files, latency=0.0, bandwidth=None):
+        """`files` is an iterable of (name, bytes)."""
+        self.lock = threading.Lock()
+        self.network = _NetworkModel(latency, bandwidth)
+        self.http = _RangeHttp(self)
+        self.blobs = {}
+        self.order = []
+        for i, (name, data) in enumerate(files):
+            file_id = f"file{i:06d}"
+            self.blobs[file_id] = _Blob(name, data)
+            self.order.append(file_id)
+
+    def metadata(self, file_id):
+        blob = self.blobs[file_id]
+        extension = "." + blob.name.rsplit(".", 1)[-1].lower()
+        return {
+            "id": file_id,
+            "name": blob.name,
+            "mimeType": MIME_TYPES.get(extension, "application/octet-stream"),
+            "modifiedTime": blob.modified.isoformat().replace("+00:00", "Z"),
+            "md5Checksum": blob.md5,
+            "size": str(len(blob.data)),
+        }
+
+    def files(self):
+        return _Files(self)
+
+
+class _Body(io.BytesIO):
+    """StreamingBody stand-in."""
+
+    def iter_chunks(self, chunk_size=1024 * 1024):
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+class FakeS3Client:
+    """In-memory stand-in for the boto3 S3 client calls made by jd.py.
+
+    Implements list_objects_v2 pagination, head_object, ranged get_object and
+    download_fileobj, with optional per-request latency and bandwidth.
+    """
+
+    def __init__(self, bucket, objects, latency=0.0, bandwidth=None):
+        """`objects` is an iterable of (key, bytes)."""
+        self.bucket = bucket
+        self.network = _NetworkModel(latency, bandwidth)
+        self.blobs = {key: _Blob(key, data) for key, data in objects}
+        self.keys = sorted(self.blobs)
+
+    def _blob(self, bucket, key):
+        if bucket != self.bucket or key not in self.blobs:
+            raise KeyError(f"NoSuchKey: s3://{bucket}/{key}")
+        return self.blobs[key]
+
+    def _summary(self, key):
+        blob = self.blobs[key]
+        return {"Key": key, "ETag": f'"{blob.md5}"', "Size": len(blob.data), "LastModified": blob.modified}
+
+    def list_objects_v2(self, Bucket, Prefix="", ContinuationToken=None, MaxKeys=1000, **kwargs):
+        self.network.wait()
+        keys = [key for key in self.keys if Bucket == self.bucket and key.startswith(Prefix)]
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + MaxKeys]
+        response = {"Contents": [self._summary(key) for key in page], "KeyCount": len(page),
+                    "IsTruncated": start + MaxKeys < len(keys)}
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = str(start + MaxKeys)
+        return response
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self.network.wait()
+        blob = self._blob(Bucket, Key)
+        return {"ContentLength": len(blob.data), "ETag": f'"{blob.md5}"', "LastModified": blob.modified}
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        blob = self._blob(Bucket, Key)
+        data = blob.data
+        match = re.match(r"bytes=(\d+)-(\d*)", Range or "")
+        if match:
+            end = int(match.group(2)) + 1 if match.group(2) else len(data)
+            data = data[int(match.group(1)):end]
+        self.network.wait(len(data))
+        return {"Body": _Body(data), "ContentLength": len(data), "ETag": f'"{blob.md5}"'}
+
+    def download_fileobj(self, Bucket, Key, Fileobj, **kwargs):
+        blob = self._blob(Bucket, Key)
+        self.network.wait(len(blob.data))
+        Fileobj.write(blob.data)
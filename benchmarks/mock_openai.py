@@ -0,0 +1,181 @@
+import re
+import json
+import time
+import base64
+import random
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from benchmarks.corpus import synthetic_candidate, synthetic_jd
+
+DEFAULT_EMBEDDING_DIMENSION = 1536
+
+
+def _seeded_rng(text):
+    return random.Random(int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little"))
+
+
+def _embedding(text, dimension):
+    """Deterministic unit vector for a text, so repeated runs index identical data."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def _extraction(candidate):
+    """A candidate in the response schema, which lists relevant_experience as {title, years} entries."""
+    relevant = candidate.get("relevant_experience") or {}
+    return {**candidate, "relevant_experience": [{"title": title, "years": years} for title, years in relevant.items()]}
+
+
+class MockOpenAIServer:
+    """Local HTTP server speaking enough of the OpenAI API for the pipelines.
+
+    Serves /chat/completions (answers in the shape the request's json_schema
+    response_format asks for: Candidate, CandidateBatch or JobDescription) and
+    /embeddings (deterministic vectors, float or base64). Each request sleeps `latency`
+    seconds plus up to `jitter`, and a `rate_429` fraction of requests is rejected with
+    429 and a Retry-After of `retry_after` seconds. A `malformed_rate` fraction of chat
+    responses is truncated to exercise the repair path.
+    """
+
+    def __init__(self, latency=0.2, jitter=0.1, rate_429=0.0, retry_after=0.1, malformed_rate=0.0,
+                 embedding_latency=None, seed=0, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.malformed_rate = malformed_rate
+        self.embedding_latency = latency if embedding_latency is None else embedding_latency
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {}
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + amount
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {}
+
+    def _roll(self, rate):
+        with self._lock:
+            return self._rng.random() < rate
+
+    def _delay(self, base):
+        with self._lock:
+            extra = self._rng.uniform(0, self.jitter) if self.jitter else 0.0
+        time.sleep(base + extra)
+
+    def chat_response(self, payload):
+        messages = payload.get("messages") or []
+        user_text = "\n".join(str(m.get("content", "")) for m in messages if m.get("role") == "user")
+        rng = _seeded_rng(user_text)
+        response_format = payload.get("response_format") or {}
+        schema_name = (response_format.get("json_schema") or {}).get("name", "")
+        if schema_name == "CandidateBatch":
+            ids = re.findall(r"^=== DOCUMENT (.+?) ===$", user_text, re.M)
+            result = {"results": [{"id": doc_id, "candidate": _extraction(synthetic_candidate(rng))}
+                                  for doc_id in ids]}
+        elif schema_name == "JobDescription":
+            result = synthetic_jd(rng)
+        else:
+            result = _extraction(synthetic_candidate(rng))
+        content = json.dumps(result)
+        if self.malformed_rate and self._roll(self.malformed_rate):
+            self._count("malformed")
+            content = content[: len(content) * 2 // 3]
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+        completion_tokens = len(content) // 4
+        return {
+            "id": f"chatcmpl-{rng.getrandbits(48):x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    def embeddings_response(self, payload):
+        inputs = payload.get("input")
+        inputs = [inputs] if isinstance(inputs, str) else list(inputs or [])
+        dimension = payload.get("dimensions") or DEFAULT_EMBEDDING_DIMENSION
+        as_base64 = payload.get("encoding_format") == "base64"
+        data = []
+        for index, text in enumerate(inputs):
+            vector = _embedding(str(text), dimension)
+            embedding = base64.b64encode(vector.tobytes()).decode("ascii") if as_base64 else vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        tokens = sum(len(str(text)) for text in inputs) // 4
+        return {"object": "list", "data": data, "model": payload.get("model"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body, headers=None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if self.path.endswith("/chat/completions"):
+                    kind, base, respond = "chat", server.latency, server.chat_response
+                elif self.path.endswith("/embeddings"):
+                    kind, base, respond = "embeddings", server.embedding_latency, server.embeddings_response
+                else:
+                    self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+                    return
+                server._count(f"{kind}_requests")
+                if server.rate_429 and server._roll(server.rate_429):
+                    server._count(f"{kind}_429")
+                    self._send(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+                               {"Retry-After": str(server.retry_after)})
+                    return
+                server._delay(base)
+                self._send(200, respond(payload))
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,270 @@
+import os
+import sys
+import json
+import time
+import queue
+import shutil
+import argparse
+import resource
+import multiprocessing
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.mock_openai import MockOpenAIServer
+
+TARGETS = ("cv", "jd", "index")
+
+
+def _rss_mb(usage_kind):
+    peak = resource.getrusage(usage_kind).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _run_cv(config, corpus, workdir):
+    from benchmarks.fakes import FakeDriveService
+    from latest import process_pdfs_to_nested_json
+
+    documents = [d for d in corpus["documents"] if d["role"] == "cv"]
+    drive = FakeDriveService([(d["name"], _read(d["path"])) for d in documents],
+                             latency=config["source_latency"], bandwidth=config["source_bandwidth"])
+    output = os.path.join(workdir, "candidates.jsonl")
+    process_pdfs_to_nested_json(drive, "bench-cvs", output, batch_llm=config["batch_llm"], metrics_path=None,
+                                dedup_path=os.path.join(workdir, "dedup_index.sqlite"))
+    return len(documents), sum(d["pages"] for d in documents)
+
+
+def _run_jd(config, corpus, workdir):
+    from benchmarks.fakes import FakeS3Client
+    from jd import process_jds_to_local
+
+    documents = [d for d in corpus["documents"] if d["role"] == "jd"]
+    s3 = FakeS3Client("bench-jds", [(d["name"], _read(d["path"])) for d in documents],
+                      latency=config["source_latency"], bandwidth=config["source_bandwidth"])
+    output = os.path.join(workdir, "jds.jsonl")
+    process_jds_to_local(s3, "bench-jds", "", output, metrics_path=None)
+    return len(documents), sum(d["pages"] for d in documents)
+
+
+def _run_index(config, corpus, workdir):
+    from doc_store import CandidateDocStore
+    from index_manifest import IndexManifest
+    from process_embeddings import PineconeLoader
+    from vector_store import LocalVectorStore
+
+    vector_store = LocalVectorStore(os.path.join(workdir, "vectors"))
+    loader = PineconeLoader(
+        corpus["candidates_path"],
+        index_name="bench",
+        embedding_cache=False,
+        vector_store=vector_store,
+        skill_index_path=os.path.join(workdir, "skills.json"),
+        chunk_mode=config["chunk_mode"],
+        manifest=IndexManifest(vector_store.location, path=os.path.join(workdir, "index_manifest.sqlite")),
+        doc_store=CandidateDocStore(os.path.join(workdir, "candidate_docs.sqlite")),
+    )
+    loader.load_and_index(metrics_path=None)
+    return corpus["params"]["candidates"], 0
+
+
+RUNNERS = {"cv": _run_cv, "jd": _run_jd, "index": _run_index}
+
+
+def _stage_key(entry):
+    """Histogram name for reports, e.g. "text_extraction (content_type=pdf)"."""
+    labels = dict(entry["labels"])
+    stage = labels.pop("stage", None) or entry["name"]
+    extra = ", ".join(f"{name}={value}" for name, value in sorted(labels.items()))
+    return f"{stage} ({extra})" if extra else stage
+
+
+def run_target(target, config, corpus, results):
+    """Child-process entry point: run one pipeline cold against the fakes and report metrics.
+
+    Each target runs in a fresh interpreter so peak RSS and module-level state (shared
+    clients, caches) belong to that target alone.
+    """
+    workdir = os.path.join(config["workdir"], f"run-{target}")
+    shutil.rmtree(workdir, ignore_errors=True)
+    os.makedirs(workdir)
+    os.environ.update({
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": config["base_url"],
+        "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.sqlite"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.sqlite"),
+        "LOG_LEVEL": config["log_level"],
+    })
+    os.environ.pop("METRICS_PATH", None)
+    for name, value in config["env"].items():
+        os.environ[name] = str(value)
+
+    from metrics import metrics
+
+    metrics.reset()
+    try:
+        started = time.perf_counter()
+        documents, pages = RUNNERS[target](config, corpus, workdir)
+        elapsed = time.perf_counter() - started
+    except Exception as e:
+        results.put({"target": target, "error": f"{type(e).__name__}: {e}"})
+        return
+    finally:
+        if "llm_client" in sys.modules:
+            sys.modules["llm_client"].close_extraction_clients()
+
+    snapshot = metrics.snapshot()
+    counters = {}
+    for entry in snapshot["counters"]:
+        counters[entry["name"]] = counters.get(entry["name"], 0) + entry["value"]
+    stages = {
+        _stage_key(entry): {
+            "calls": entry["count"], "total_seconds": round(entry["sum"], 3),
+            "p50": round(entry["p50"], 4), "p99": round(entry["p99"], 4),
+        }
+        for entry in snapshot["histograms"]
+        if entry["name"] in ("stage_seconds", "llm_request_seconds")
+    }
+    results.put({
+        "target": target,
+        "documents": documents,
+        "pages": pages,
+        "elapsed_seconds": round(elapsed, 3),
+        "docs_per_sec": round(documents / elapsed, 3) if elapsed else 0.0,
+        "pages_per_sec": round(pages / elapsed, 3) if elapsed and pages else None,
+        "stages": stages,
+        "counters": counters,
+        "peak_rss_mb": round(_rss_mb(resource.RUSAGE_SELF), 1),
+        "peak_child_rss_mb": round(_rss_mb(resource.RUSAGE_CHILDREN), 1),
+    })
+
+
+def run_benchmarks(config, targets=TARGETS):
+    """Generate (or reuse) the corpus, start the mock API and run each target in a subprocess."""
+    corpus = generate_corpus(os.path.join(config["workdir"], "corpus"), **config["corpus"])
+    reports = []
+    context = multiprocessing.get_context("spawn")
+    with MockOpenAIServer(**config["mock"]) as server:
+        config = dict(config, base_url=server.base_url)
+        for target in targets:
+            server.reset_stats()
+            results = context.Queue()
+            process = context.Process(target=run_target, args=(target, config, corpus, results),
+                                      name=f"benchmark-{target}")
+            process.start()
+            # Drain before join: a child blocks on exit until its queued report is consumed
+            report = None
+            while report is None and (process.is_alive() or not results.empty()):
+                try:
+                    report = results.get(timeout=1)
+                except queue.Empty:
+                    pass
+            process.join()
+            if report is None:
+                report = {"target": target, "error": f"benchmark process exited with code {process.exitcode}"}
+            report["mock_api"] = dict(server.stats)
+            reports.append(report)
+    return {"config": {k: v for k, v in config.items() if k != "base_url"}, "reports": reports}
+
+
+def format_report(result):
+    lines = []
+    for report in result["reports"]:
+        if "error" in report:
+            lines.append(f"{report['target']}: FAILED ({report['error']})")
+            continue
+        pages = f", {report['pages_per_sec']:.2f} pages/sec" if report["pages_per_sec"] else ""
+        lines.append(
+            f"{report['target']}: {report['documents']} docs in {report['elapsed_seconds']:.2f}s "
+            f"({report['docs_per_sec']:.2f} docs/sec{pages}), peak RSS {report['peak_rss_mb']:.0f} MB "
+            f"(children {report['peak_child_rss_mb']:.0f} MB)"
+        )
+        for stage, stats in report["stages"].items():
+            lines.append(f"    {stage:<44} {stats['calls']:>6} calls  p50 {stats['p50']:.3f}s  "
+                         f"p99 {stats['p99']:.3f}s  total {stats['total_seconds']:.2f}s")
+        lines.append(f"    mock API: {report['mock_api']}")
+    return "\n".join(lines)
+
+
+def find_regressions(result, baseline, tolerance):
+    """Targets whose docs/sec dropped more than `tolerance` (a fraction) below the baseline's."""
+    previous = {r["target"]: r for r in baseline["reports"] if "error" not in r}
+    regressions = []
+    for report in result["reports"]:
+        if "error" in report:
+            regressions.append(f"{report['target']}: failed")
+            continue
+        before = previous.get(report["target"])
+        if before and report["docs_per_sec"] < before["docs_per_sec"] * (1 - tolerance):
+            regressions.append(f"{report['target']}: {report['docs_per_sec']:.2f} docs/sec "
+                               f"vs {before['docs_per_sec']:.2f} in the baseline")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Offline throughput benchmark for the CV, JD and indexing pipelines.",
+    )
+    parser.add_argument("--workdir", default="benchmark_data", help="Corpus and scratch directory")
+    parser.add_argument("--targets", default=",".join(TARGETS), help="Comma-separated subset of cv,jd,index")
+    parser.add_argument("--cvs", type=int, default=50)
+    parser.add_argument("--jds", type=int, default=20)
+    parser.add_argument("--candidates", type=int, default=1000)
+    parser.add_argument("--max-pages", type=int, default=4)
+    parser.add_argument("--scanned-ratio", type=float, default=0.3)
+    parser.add_argument("--docx-ratio", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.5, help="Mock chat completion latency (seconds)")
+    parser.add_argument("--embedding-latency", type=float, default=0.1)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of API requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.1)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--source-latency", type=float, default=0.02, help="Drive/S3 per-request latency")
+    parser.add_argument("--source-bandwidth", type=float, default=None, help="Drive/S3 bytes/sec (default unlimited)")
+    parser.add_argument("--batch-llm", action="store_true", help="Use batched CV extraction")
+    parser.add_argument("--chunk-mode", action="store_true", help="Index section-level chunks")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="Extra environment for the pipelines, e.g. OPENAI_CONCURRENCY=20")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("-o", "--output", default="benchmark_report.json")
+    parser.add_argument("--baseline", help="Previous report to compare docs/sec against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed docs/sec drop vs the baseline")
+    args = parser.parse_args(argv)
+
+    config = {
+        "workdir": os.path.abspath(args.workdir),
+        "corpus": {"cvs": args.cvs, "jds": args.jds, "candidates": args.candidates, "max_pages": args.max_pages,
+                   "scanned_ratio": args.scanned_ratio, "docx_ratio": args.docx_ratio, "seed": args.seed},
+        "mock": {"latency": args.latency, "jitter": args.jitter, "rate_429": args.rate_429,
+                 "retry_after": args.retry_after, "malformed_rate": args.malformed_rate,
+                 "embedding_latency": args.embedding_latency, "seed": args.seed},
+        "source_latency": args.source_latency,
+        "source_bandwidth": args.source_bandwidth,
+        "batch_llm": args.batch_llm,
+        "chunk_mode": args.chunk_mode,
+        "env": dict(item.split("=", 1) for item in args.env),
+        "log_level": args.log_level,
+    }
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+
+    result = run_benchmarks(config, targets)
+    print(format_report(result))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Report saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = find_regressions(result, json.load(f), args.tolerance)
+        if regressions:
+            print("Performance regressions:\n  " + "\n  ".join(regressions))
+            return 1
+    return 0
@@ -0,0 +1,41 @@
+import re
+import json
+import hashlib
+
+
+def normalize_email(email):
+    return (email or "").strip().lower()
+
+
+def normalize_phone(phone):
+    """Digits only, keeping the last 10 so '+91 98765-43210' and '9876543210' agree."""
+    digits = re.sub(r"\D", "", phone or "")
+    return digits[-10:]
+
+
+def normalize_name(name):
+    return " ".join(re.findall(r"\w+", (name or "").lower()))
+
+
+def stable_candidate_id(candidate, source_id=None):
+    """Deterministic candidate ID, keyed on the source document when the record has one.
+
+    The pipelines tag every record with the `source_id` of the file it came from, so the
+    same CV keeps its ID whatever the output format and even if re-extraction reads a
+    different email or phone. Records without a source fall back to normalized
+    email/phone/name, and those with no contact details either to a hash of the whole record.
+    """
+    source_id = source_id if source_id is not None else candidate.get("source_id")
+    if source_id:
+        parts = ["source", str(source_id)]
+    else:
+        personal_info = candidate.get("personal_info") or {}
+        parts = [
+            normalize_email(personal_info.get("email")),
+            normalize_phone(personal_info.get("phone")),
+            normalize_name(personal_info.get("name")),
+        ]
+    if not any(parts):
+        parts = [json.dumps(candidate, sort_keys=True, default=str)]
+    digest = hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+    return f"cand_{digest[:24]}"
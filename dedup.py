@@ -0,0 +1,229 @@
+import os
+import re
+import json
+import struct
+import sqlite3
+import hashlib
+import threading
+from collections import defaultdict
+
+# MinHash/LSH parameters: 128 hashes in 32 bands of 4 rows puts the LSH threshold
+# around Jaccard 0.42, and candidates are then confirmed against NEAR_DUP_THRESHOLD
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+NEAR_DUP_THRESHOLD = 0.9
+# Primaries whose record was saved, so later runs can resolve copies of them too
+DEFAULT_DEDUP_PATH = os.getenv("DEDUP_INDEX_PATH", "dedup_index.sqlite")
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _permutations(seed=1):
+    """Deterministic (a, b) pairs for the universal hashes h(x) = (a*x + b) mod p."""
+    params = []
+    counter = 0
+    while len(params) < NUM_PERM:
+        digest = hashlib.sha256(f"{seed}:{counter}".encode()).digest()
+        a, b = struct.unpack("<QQ", digest[:16])
+        params.append((a % (_MERSENNE_PRIME - 1) + 1, b % _MERSENNE_PRIME))
+        counter += 1
+    return params
+
+
+_PERMUTATIONS = _permutations()
+
+
+def normalize_text(text):
+    """Lowercase and collapse whitespace/punctuation so OCR noise doesn't break exact matches."""
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    words = normalize_text(text).split()
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(shingle_set):
+    """MinHash signature of a set of shingles."""
+    hashes = [
+        struct.unpack("<I", hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest())[0]
+        for s in shingle_set
+    ]
+    if not hashes:
+        return (_MAX_HASH,) * NUM_PERM
+    return tuple(
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def estimated_jaccard(sig_a, sig_b):
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+class Deduplicator:
+    """Finds exact and near-duplicate documents, within a run and (with a `path`) across runs.
+
+    Exact duplicates are detected on a hash of the raw bytes (before OCR) and of the
+    normalized text; near-duplicates with MinHash/LSH over word shingles. Each check
+    registers the document, so the first copy seen becomes the primary and later
+    copies resolve to its source ID.
+
+    A duplicate reuses its primary's record: wait_for() returns the record once the primary
+    has one and otherwise holds the duplicate until record_result() releases it. If the
+    primary fails, record_failure() unregisters it and hands back its held duplicates, which
+    are left for the next run. Only primaries with a saved record are persisted to `path`.
+    """
+
+    def __init__(self, threshold=NEAR_DUP_THRESHOLD, path=None):
+        self.threshold = threshold
+        self.path = path
+        self._lock = threading.Lock()
+        self._bytes = {}
+        self._texts = {}
+        self._signatures = {}
+        self._buckets = defaultdict(list)
+        # source ID -> its byte and text digests, for persisting or unregistering it
+        self._keys = defaultdict(dict)
+        self._results = {}
+        self._held = defaultdict(list)
+        self.stats = {"exact_bytes": 0, "exact_text": 0, "near": 0, "unique": 0}
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS primaries ("
+                "source_id TEXT PRIMARY KEY, bytes_digest TEXT, text_digest TEXT, signature TEXT, record TEXT NOT NULL)"
+            )
+            self._conn.commit()
+            for source_id, bytes_digest, text_digest, signature, record in self._conn.execute(
+                "SELECT source_id, bytes_digest, text_digest, signature, record FROM primaries"
+            ):
+                self._register(source_id, bytes_digest, text_digest, json.loads(signature) if signature else None)
+                self._results[source_id] = json.loads(record)
+
+    def _register(self, source_id, bytes_digest=None, text_digest=None, signature=None):
+        if bytes_digest:
+            self._bytes.setdefault(bytes_digest, source_id)
+            self._keys[source_id]["bytes"] = bytes_digest
+        if text_digest:
+            self._texts.setdefault(text_digest, source_id)
+            self._keys[source_id]["text"] = text_digest
+        if signature:
+            signature = tuple(signature)
+            self._signatures[source_id] = signature
+            for i in range(BANDS):
+                bucket = self._buckets[(i, signature[i * ROWS:(i + 1) * ROWS])]
+                if source_id not in bucket:
+                    bucket.append(source_id)
+
+    def check_bytes(self, source_id, data):
+        """Return the primary source ID if these exact bytes were already seen, else register them."""
+        return self._check_digest(source_id, hashlib.sha256(data).hexdigest())
+
+    def check_stream(self, source_id, stream, chunk_size=1024 * 1024):
+        """Like check_bytes for a seekable binary stream, hashed in chunks and rewound afterwards."""
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: stream.read(chunk_size), b""):
+            digest.update(chunk)
+        stream.seek(0)
+        return self._check_digest(source_id, digest.hexdigest())
+
+    def _check_digest(self, source_id, digest):
+        with self._lock:
+            primary = self._bytes.setdefault(digest, source_id)
+            if primary != source_id:
+                self.stats["exact_bytes"] += 1
+                return primary
+            self._keys[source_id]["bytes"] = digest
+        return None
+
+    def check_text(self, source_id, text):
+        """Return the primary source ID for an exact or near-duplicate text, else register it."""
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        with self._lock:
+            primary = self._texts.setdefault(digest, source_id)
+            if primary != source_id:
+                self.stats["exact_text"] += 1
+                return primary
+            self._keys[source_id]["text"] = digest
+
+        signature = minhash(shingles(text))
+        bands = [(i, signature[i * ROWS:(i + 1) * ROWS]) for i in range(BANDS)]
+        with self._lock:
+            candidates = {other for band in bands for other in self._buckets.get(band, ())}
+            for other in candidates:
+                if other != source_id and estimated_jaccard(signature, self._signatures[other]) >= self.threshold:
+                    self.stats["near"] += 1
+                    return other
+            self._register(source_id, signature=signature)
+            self.stats["unique"] += 1
+        return None
+
+    def wait_for(self, primary_id, item):
+        """The primary's record if it has one; otherwise hold `item` until it does and return None."""
+        with self._lock:
+            record = self._results.get(primary_id)
+            if record is None:
+                self._held[primary_id].append(item)
+            return record
+
+    def record_result(self, source_id, record):
+        """Save a primary's record; returns the duplicates held for it, which can now use it."""
+        with self._lock:
+            self._results[source_id] = record
+            if self._conn is not None:
+                keys = self._keys.get(source_id, {})
+                signature = self._signatures.get(source_id)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO primaries (source_id, bytes_digest, text_digest, signature, record) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (source_id, keys.get("bytes"), keys.get("text"),
+                     json.dumps(signature) if signature else None, json.dumps(record, default=str)),
+                )
+                self._conn.commit()
+            return self._held.pop(source_id, [])
+
+    def record_failure(self, source_id):
+        """Unregister a primary that produced no record so a later copy can take its place.
+
+        Returns the duplicates that were held for it; they get no record this run.
+        """
+        with self._lock:
+            if source_id in self._results:
+                return self._held.pop(source_id, [])
+            keys = self._keys.pop(source_id, {})
+            if self._bytes.get(keys.get("bytes")) == source_id:
+                del self._bytes[keys["bytes"]]
+            if self._texts.get(keys.get("text")) == source_id:
+                del self._texts[keys["text"]]
+            signature = self._signatures.pop(source_id, None)
+            if signature is not None:
+                for i in range(BANDS):
+                    bucket = self._buckets.get((i, signature[i * ROWS:(i + 1) * ROWS]), [])
+                    if source_id in bucket:
+                        bucket.remove(source_id)
+            return self._held.pop(source_id, [])
+
+    def held_count(self):
+        with self._lock:
+            return sum(len(items) for items in self._held.values())
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def summary(self):
+        s = self.stats
+        duplicates = s["exact_bytes"] + s["exact_text"] + s["near"]
+        return (
+            f"Dedup: {duplicates} duplicates resolved ({s['exact_bytes']} identical files, "
+            f"{s['exact_text']} identical text, {s['near']} near-duplicates), {s['unique']} unique."
+        )
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+
+from sqlite_cache import content_hash
+
+try:
+    import zstandard
+except ImportError:  # Optional: falls back to zlib, which compresses CV JSON about 20% worse
+    zstandard = None
+
+DEFAULT_DOC_STORE_PATH = os.getenv("DOC_STORE_PATH", "candidate_docs.sqlite")
+ZSTD_LEVEL = 9
+ZLIB_LEVEL = 6
+
+
+class CandidateDocStore:
+    """Full candidate records in SQLite, compressed and keyed by candidate ID.
+
+    The vector index only carries small filter fields; anything that needs the whole
+    record (search results, UIs, re-ranking) fetches it from here in bulk. Rows record
+    their codec, so a store written with zlib stays readable after zstandard is installed.
+    Unchanged records are detected by content hash and not rewritten.
+    """
+
+    def __init__(self, path=DEFAULT_DOC_STORE_PATH):
+        self.path = path
+        self.codec = "zstd" if zstandard is not None else "zlib"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "candidate_id TEXT PRIMARY KEY, codec TEXT NOT NULL, data BLOB NOT NULL, "
+            "content_hash TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        # zstandard (de)compressors aren't safe to share between threads; all use is under _lock
+        if zstandard is not None:
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+            self._decompressor = zstandard.ZstdDecompressor()
+
+    def _compress(self, data):
+        if self.codec == "zstd":
+            return self._compressor.compress(data)
+        return zlib.compress(data, ZLIB_LEVEL)
+
+    def _decompress(self, codec, data):
+        if codec == "zlib":
+            return zlib.decompress(data)
+        if zstandard is None:
+            raise RuntimeError("zstandard is needed to read documents stored with zstd")
+        return self._decompressor.decompress(data)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def get(self, candidate_id):
+        return self.get_many([candidate_id]).get(candidate_id)
+
+    def get_many(self, candidate_ids):
+        """Return {candidate_id: record} for the IDs that are stored."""
+        candidate_ids = list(dict.fromkeys(candidate_ids))
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(candidate_ids), 500):
+                chunk = candidate_ids[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT candidate_id, codec, data FROM documents WHERE candidate_id IN ({placeholders})", chunk
+                ).fetchall()
+                for candidate_id, codec, data in rows:
+                    found[candidate_id] = json.loads(self._decompress(codec, data))
+        return found
+
+    def put(self, candidate_id, record):
+        return self.put_many({candidate_id: record})
+
+    def put_many(self, records):
+        """Store {candidate_id: record}; returns how many were new or changed."""
+        if not records:
+            return 0
+        encoded = {
+            candidate_id: json.dumps(record, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+            for candidate_id, record in records.items()
+        }
+        hashes = {candidate_id: content_hash(data.decode("utf-8")) for candidate_id, data in encoded.items()}
+        with self._lock:
+            current = {}
+            keys = list(encoded)
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                current.update(self._conn.execute(
+                    f"SELECT candidate_id, content_hash FROM documents WHERE candidate_id IN ({placeholders})", chunk
+                ).fetchall())
+            now = time.time()
+            rows = [
+                (candidate_id, self.codec, self._compress(data), hashes[candidate_id], now)
+                for candidate_id, data in encoded.items() if current.get(candidate_id) != hashes[candidate_id]
+            ]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents (candidate_id, codec, data, content_hash, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def delete_many(self, candidate_ids):
+        with self._lock:
+            self._conn.executemany("DELETE FROM documents WHERE candidate_id = ?",
+                                   [(candidate_id,) for candidate_id in candidate_ids])
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,196 @@
+import io
+import os
+import abc
+import tempfile
+import threading
+
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from googleapiclient.http import MediaIoBaseDownload
+
+from extractors import GOOGLE_DOC_MIME
+from metrics import get_logger, metrics
+
+try:
+    import httplib2
+    from google_auth_httplib2 import AuthorizedHttp
+except ImportError:  # Optional: without them Drive downloads share the service's http object
+    AuthorizedHttp = None
+
+logger = get_logger("sources")
+
+GOOGLE_APPS_PREFIX = "application/vnd.google-apps."
+
+# Drive/S3 ranged requests of 8 MiB instead of the client defaults (100 MiB for Drive,
+# which means one huge response held in memory per file)
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "8"))
+# Total bytes of downloaded-but-not-yet-parsed documents across all download threads
+DOWNLOAD_BUDGET_BYTES = int(os.getenv("DOWNLOAD_BUDGET_BYTES", str(256 * 1024 * 1024)))
+# Files larger than this are downloaded to an anonymous temp file instead of memory
+SPILL_TO_DISK_BYTES = int(os.getenv("SPILL_TO_DISK_BYTES", str(16 * 1024 * 1024)))
+# Concurrent ranged GETs per large S3 object
+S3_PART_CONCURRENCY = 4
+
+
+class ByteBudget:
+    """Caps how many downloaded bytes are in flight, so parallel downloads can't exhaust memory.
+
+    A download reserves its expected size before starting and the reservation is released
+    once the document has been parsed. A file bigger than the whole budget waits until it
+    is the only one in flight rather than blocking forever.
+    """
+
+    def __init__(self, limit=DOWNLOAD_BUDGET_BYTES):
+        self.limit = limit
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, size):
+        """Block until `size` bytes fit in the budget; returns the amount to release later."""
+        size = min(max(size, 1), self.limit)
+        with self._condition:
+            while self.in_flight and self.in_flight + size > self.limit:
+                self._condition.wait()
+            self.in_flight += size
+        return size
+
+    def release(self, size):
+        with self._condition:
+            self.in_flight -= size
+            self._condition.notify_all()
+
+
+def download_buffer(size):
+    """Where a download of `size` bytes goes: memory for small files, a temp file for large ones."""
+    if size and size > SPILL_TO_DISK_BYTES:
+        metrics.inc("downloads_spilled_total")
+        return tempfile.TemporaryFile()
+    return io.BytesIO()
+
+
+class DocumentSource(abc.ABC):
+    """Where documents are downloaded from.
+
+    Documents are the source's own listing dicts (Drive files, S3 objects); the methods below
+    give the pipelines a uniform view of them. Downloads return a seekable binary stream
+    positioned at the start, or None on failure; the content type is sniffed from it later.
+    """
+
+    name = "source"
+
+    def declared_mime(self, document):
+        """MIME type from the listing, used only to recognise plain text; None if unknown."""
+        return None
+
+    def size(self, document):
+        """Size in bytes from the listing, or 0 if the source doesn't report it."""
+        return 0
+
+    def is_supported(self, document):
+        """Cheap pre-download filter for entries that can never be extracted (e.g. folders)."""
+        return True
+
+    @abc.abstractmethod
+    def open(self, document):
+        """Download the document; returns a binary stream, or None if the download failed."""
+
+
+class DriveSource(DocumentSource):
+    """Files in a Google Drive folder. Google Docs are exported as plain text.
+
+    httplib2 connections aren't thread-safe, so each download thread gets its own
+    authorized http object built from the service's credentials.
+    """
+
+    name = "drive"
+
+    def __init__(self, drive_service, folder_id, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        self.drive_service = drive_service
+        self.folder_id = folder_id
+        self.chunk_size = chunk_size
+        self._local = threading.local()
+
+    def _thread_http(self):
+        """This thread's http object, or None to use the one the request was built with."""
+        credentials = getattr(getattr(self.drive_service, "_http", None), "credentials", None)
+        if AuthorizedHttp is None or credentials is None:
+            return None
+        if getattr(self._local, "http", None) is None:
+            self._local.http = AuthorizedHttp(credentials, http=httplib2.Http())
+        return self._local.http
+
+    def declared_mime(self, document):
+        return document.get('mimeType')
+
+    def size(self, document):
+        return int(document.get('size') or 0)
+
+    def is_supported(self, document):
+        # Folders, Sheets, Slides, shortcuts etc. have no bytes to download; only Docs export as text
+        mime = document.get('mimeType') or ""
+        return not mime.startswith(GOOGLE_APPS_PREFIX) or mime == GOOGLE_DOC_MIME
+
+    def open(self, document):
+        try:
+            files = self.drive_service.files()
+            if document.get('mimeType') == GOOGLE_DOC_MIME:
+                request = files.export_media(fileId=document['id'], mimeType="text/plain")
+            else:
+                request = files.get_media(fileId=document['id'])
+            http = self._thread_http()
+            if http is not None:
+                request.http = http
+            file_stream = download_buffer(self.size(document))
+            downloader = MediaIoBaseDownload(file_stream, request, chunksize=self.chunk_size)
+            done = False
+            while not done:
+                _, done = downloader.next_chunk()
+            metrics.inc("download_bytes_total", file_stream.tell(), source=self.name)
+            file_stream.seek(0)
+            return file_stream
+        except Exception as e:
+            logger.error(f"Error downloading {document.get('name', document['id'])}: {e}")
+            return None
+
+
+class S3Source(DocumentSource):
+    """Objects under a prefix of an S3 bucket.
+
+    Objects over one chunk are fetched as concurrent ranged GETs; the client should be
+    created with max_pool_connections covering every download thread (see s3_client_config).
+    """
+
+    name = "s3"
+
+    def __init__(self, s3_client, bucket_name, prefix="", chunk_size=DOWNLOAD_CHUNK_SIZE,
+                 part_concurrency=S3_PART_CONCURRENCY):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.transfer_config = TransferConfig(multipart_threshold=chunk_size, multipart_chunksize=chunk_size,
+                                              max_concurrency=part_concurrency)
+
+    def size(self, document):
+        return int(document.get('Size') or 0)
+
+    def is_supported(self, document):
+        # Zero-byte "directory" placeholder keys
+        return not document['Key'].endswith("/")
+
+    def open(self, document):
+        try:
+            file_stream = download_buffer(self.size(document))
+            self.s3_client.download_fileobj(self.bucket_name, document['Key'], file_stream,
+                                            Config=self.transfer_config)
+            metrics.inc("download_bytes_total", file_stream.tell(), source=self.name)
+            file_stream.seek(0)
+            return file_stream
+        except Exception as e:
+            logger.error(f"Error downloading {document['Key']}: {e}")
+            return None
+
+
+def s3_client_config(download_workers=DOWNLOAD_WORKERS, part_concurrency=S3_PART_CONCURRENCY):
+    """botocore Config whose connection pool fits every concurrent download and its ranged parts."""
+    return Config(max_pool_connections=max(10, download_workers * part_concurrency))
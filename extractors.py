@@ -0,0 +1,368 @@
+import io
+import re
+import mmap
+import shutil
+import zipfile
+import tempfile
+import subprocess
+from contextlib import contextmanager
+from xml.etree import ElementTree
+
+from metrics import get_logger, metrics
+from ocr import get_ocr_pool
+from pdf_text import DEFAULT_RASTER_OPTIONS, plan_ocr
+
+try:
+    import olefile
+except ImportError:  # Optional: without it .doc files need the antiword binary
+    olefile = None
+
+logger = get_logger("extractors")
+
+# Content types are sniffed from the leading bytes, never taken from the file extension
+PDF, DOCX, DOC, RTF, IMAGE, TEXT = "pdf", "docx", "doc", "rtf", "image", "text"
+
+SNIFF_BYTES = 512
+_OLE_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+# Directory entry name of the main stream of a Word file; other OLE2 files (xls, msg, ppt) lack it
+_WORD_STREAM_NAME = "WordDocument".encode("utf-16-le")
+_IMAGE_MAGICS = (b"\x89PNG\r\n\x1a\n", b"\xff\xd8\xff", b"II*\x00", b"MM\x00*", b"GIF87a", b"GIF89a", b"BM")
+
+# Declared MIME types that are plain text once downloaded (Google Docs are exported as text/plain)
+GOOGLE_DOC_MIME = "application/vnd.google-apps.document"
+TEXT_MIMES = ("text/plain", GOOGLE_DOC_MIME)
+
+
+class ExtractionContext:
+    """Shared state for extractors: the OCR pool, rasterization options and text-layer stats."""
+
+    def __init__(self, ocr_pool=None, raster_options=DEFAULT_RASTER_OPTIONS, fast_path_stats=None):
+        self._ocr_pool = ocr_pool
+        self.raster_options = raster_options
+        self.fast_path_stats = fast_path_stats
+
+    @property
+    def ocr_pool(self):
+        # The process-wide pool is only started once something actually needs OCR
+        if self._ocr_pool is None:
+            self._ocr_pool = get_ocr_pool()
+        return self._ocr_pool
+
+
+EXTRACTORS = {}
+
+
+def register_extractor(content_type):
+    """Register `fn(stream, context)` as the extractor for a sniffed content type.
+
+    Extractors return a list of parts in reading order: strings, or futures of strings
+    for work handed to the OCR pool, so callers can overlap OCR with other documents.
+    """
+    def decorator(fn):
+        EXTRACTORS[content_type] = fn
+        return fn
+    return decorator
+
+
+def _looks_like_text(head):
+    # The sniffed head may end mid-character, so a few replacement characters are tolerated
+    text = head.decode("utf-8", errors="replace")
+    readable = sum(ch in "\r\n\t" or (ch.isprintable() and ch != "\ufffd") for ch in text)
+    return bool(text) and readable / len(text) > 0.95
+
+
+def _is_word_ole(stream):
+    """Whether an OLE2 compound file is a Word document rather than e.g. a spreadsheet or email."""
+    try:
+        if olefile is not None:
+            with olefile.OleFileIO(stream) as ole:
+                return ole.exists("WordDocument")
+        # Without olefile, look for the stream's UTF-16 name in the directory sectors
+        with document_bytes(stream) as data:
+            return data.find(_WORD_STREAM_NAME) != -1
+    except Exception:
+        return False
+    finally:
+        stream.seek(0)
+
+
+def sniff_content_type(stream, declared_mime=None):
+    """Content type of a seekable binary stream from its magic bytes, or None if unsupported."""
+    head = stream.read(SNIFF_BYTES)
+    stream.seek(0)
+    if head.startswith(b"%PDF-"):
+        return PDF
+    if head.startswith(b"PK\x03\x04"):
+        try:
+            with zipfile.ZipFile(stream) as archive:
+                is_docx = "word/document.xml" in archive.namelist()
+        except zipfile.BadZipFile:
+            is_docx = False
+        finally:
+            stream.seek(0)
+        return DOCX if is_docx else None
+    if head.startswith(_OLE_MAGIC):
+        return DOC if _is_word_ole(stream) else None
+    if head.startswith(b"{\\rtf"):
+        return RTF
+    if head.startswith(_IMAGE_MAGICS) or (head[:4] == b"RIFF" and head[8:12] == b"WEBP"):
+        return IMAGE
+    if declared_mime in TEXT_MIMES or _looks_like_text(head):
+        return TEXT
+    return None
+
+
+def start_extraction(stream, context, declared_mime=None):
+    """Sniff a document and start extracting it. Returns (content_type, parts).
+
+    content_type is None for unsupported documents; parts may include OCR futures (see
+    resolve_parts).
+    """
+    content_type = sniff_content_type(stream, declared_mime)
+    metrics.inc("documents_sniffed_total", content_type=content_type or "unsupported")
+    if content_type is None:
+        return None, []
+    with metrics.timer("text_extraction", content_type=content_type):
+        return content_type, EXTRACTORS[content_type](stream, context)
+
+
+def resolve_parts(parts):
+    """Wait for any OCR futures and join the parts into the document text."""
+    return " ".join(part if isinstance(part, str) else part.result() for part in parts).strip()
+
+
+def extract_text(stream, context, declared_mime=None):
+    """Sniff and fully extract a document. Returns (content_type, text); text is "" on failure."""
+    try:
+        content_type, parts = start_extraction(stream, context, declared_mime)
+        return content_type, resolve_parts(parts)
+    except Exception as e:
+        stream.seek(0)
+        content_type = sniff_content_type(stream, declared_mime)
+        logger.error(f"Error extracting {content_type} text: {e}")
+        return content_type, ""
+
+
+@contextmanager
+def document_bytes(stream):
+    """The whole document as a bytes-like object; files spilled to disk are memory-mapped, not read.
+
+    The mapping is closed when the block exits, so nothing may keep a reference to it.
+    """
+    mapped = None
+    if not isinstance(stream, io.BytesIO):
+        try:
+            mapped = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            pass
+    if mapped is None:
+        yield stream.read()
+        return
+    with mapped:
+        yield mapped
+
+
+@register_extractor(PDF)
+def extract_pdf(stream, context):
+    """Embedded text layer where it's usable; the remaining pages are OCR'd in the pool."""
+    # submit_pdf_pages copies the PDF to a temporary file, so the mapping can be closed before OCR runs
+    with document_bytes(stream) as pdf_data:
+        page_texts, ocr_pages, page_count = plan_ocr(pdf_data, context.raster_options, context.fast_path_stats)
+        futures = dict(zip(ocr_pages, context.ocr_pool.submit_pdf_pages(pdf_data, ocr_pages,
+                                                                        context.raster_options)))
+    return [page_texts.get(number) or futures.get(number) or "" for number in range(1, page_count + 1)]
+
+
+@register_extractor(IMAGE)
+def extract_image(stream, context):
+    """Scanned CVs sent as photos or TIFFs: every frame is OCR'd in the pool."""
+    return [context.ocr_pool.submit_image_bytes(stream.read(), context.raster_options)]
+
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_DOCX_PART = re.compile(r"word/(header|document|footer)\d*\.xml$")
+
+
+def _docx_part_text(member):
+    """Text of one WordprocessingML part, parsed incrementally from the zip member stream."""
+    paragraphs, runs = [], []
+    for _, element in ElementTree.iterparse(member, events=("end",)):
+        tag = element.tag
+        if tag == _W + "t":
+            runs.append(element.text or "")
+        elif tag == _W + "tab":
+            runs.append("\t")
+        elif tag in (_W + "br", _W + "cr"):
+            runs.append("\n")
+        elif tag == _W + "p":
+            paragraphs.append("".join(runs))
+            runs = []
+            # Finished paragraphs are dropped so memory doesn't grow with the document
+            element.clear()
+    return "\n".join(paragraphs)
+
+
+@register_extractor(DOCX)
+def extract_docx(stream, context):
+    """Headers, body and footers (in that order, like docx2txt) without rendering images."""
+    order = {"header": 0, "document": 1, "footer": 2}
+    with zipfile.ZipFile(stream) as archive:
+        names = sorted((name for name in archive.namelist() if _DOCX_PART.match(name)),
+                       key=lambda name: (order[_DOCX_PART.match(name).group(1)], name))
+        texts = []
+        for name in names:
+            with archive.open(name) as member:
+                texts.append(_docx_part_text(member))
+    return [text for text in texts if text.strip()]
+
+
+_DOC_CONTROL = str.maketrans({"\r": "\n", "\x0b": "\n", "\x0c": "\n", "\x07": "\t", "\x1e": "-", "\x1f": ""})
+_DOC_FIELD = re.compile(r"\x13[^\x13\x14\x15]*(?:\x14([^\x13\x14\x15]*))?\x15")
+
+
+def _clean_doc_text(text):
+    # Replace fields by their displayed result (innermost first), then map Word control characters
+    previous = None
+    while previous != text:
+        previous, text = text, _DOC_FIELD.sub(lambda m: m.group(1) or "", text)
+    return text.replace("\x13", "").replace("\x14", "").replace("\x15", "").translate(_DOC_CONTROL)
+
+
+def _doc_text_olefile(stream):
+    """Text of a Word 97-2003 file read directly from its piece table."""
+    with olefile.OleFileIO(stream) as ole:
+        word = ole.openstream("WordDocument").read()
+        if int.from_bytes(word[0:2], "little") != 0xA5EC:
+            raise ValueError("not a Word 97-2003 document")
+        table_name = "1Table" if int.from_bytes(word[10:12], "little") & 0x0200 else "0Table"
+        table = ole.openstream(table_name).read()
+
+    # FIB: FibBase (32 bytes), then csw 16-bit words, cslw 32-bit longs and the fc/lcb pairs
+    offset = 32
+    csw = int.from_bytes(word[offset:offset + 2], "little")
+    offset += 2 + csw * 2
+    cslw = int.from_bytes(word[offset:offset + 2], "little")
+    offset += 2 + cslw * 4 + 2
+    # fcClx/lcbClx is pair 33 of FibRgFcLcb97
+    fc_clx = int.from_bytes(word[offset + 33 * 8:offset + 33 * 8 + 4], "little")
+    lcb_clx = int.from_bytes(word[offset + 33 * 8 + 4:offset + 33 * 8 + 8], "little")
+    clx = table[fc_clx:fc_clx + lcb_clx]
+
+    # Skip Prc entries (property modifiers) to reach the Pcdt piece table
+    position = 0
+    while position < len(clx) and clx[position] == 0x01:
+        position += 3 + int.from_bytes(clx[position + 1:position + 3], "little")
+    if position >= len(clx) or clx[position] != 0x02:
+        raise ValueError("piece table not found")
+    lcb = int.from_bytes(clx[position + 1:position + 5], "little")
+    plc = clx[position + 5:position + 5 + lcb]
+    pieces = (lcb - 4) // 12
+    cps = [int.from_bytes(plc[i * 4:i * 4 + 4], "little") for i in range(pieces + 1)]
+
+    texts = []
+    for i in range(pieces):
+        pcd = plc[(pieces + 1) * 4 + i * 8:(pieces + 1) * 4 + (i + 1) * 8]
+        fc = int.from_bytes(pcd[2:6], "little")
+        length = cps[i + 1] - cps[i]
+        if fc & 0x40000000:
+            start = (fc & ~0x40000000) // 2
+            texts.append(word[start:start + length].decode("cp1252", errors="replace"))
+        else:
+            texts.append(word[fc:fc + 2 * length].decode("utf-16-le", errors="replace"))
+    return _clean_doc_text("".join(texts))
+
+
+def _doc_text_antiword(stream):
+    with tempfile.NamedTemporaryFile(suffix=".doc") as f:
+        shutil.copyfileobj(stream, f)
+        f.flush()
+        result = subprocess.run(["antiword", f.name], capture_output=True, check=True)
+    return result.stdout.decode("utf-8", errors="replace")
+
+
+@register_extractor(DOC)
+def extract_doc(stream, context):
+    """Legacy Word files: parsed in-process with olefile, else (or if that fails) via the antiword binary."""
+    has_antiword = shutil.which("antiword") is not None
+    if olefile is not None:
+        try:
+            return [_doc_text_olefile(stream)]
+        except Exception as e:
+            # Fast-saved and pre-97 files have layouts the piece-table reader doesn't handle
+            if not has_antiword:
+                raise
+            logger.warning(f"olefile could not parse the document ({e}); falling back to antiword.")
+            stream.seek(0)
+    if has_antiword:
+        return [_doc_text_antiword(stream)]
+    raise RuntimeError(".doc extraction needs the olefile package or the antiword binary")
+
+
+# RTF destinations whose content is not document text (a field's result is kept, its instruction isn't)
+_RTF_SKIP = {
+    "fonttbl", "colortbl", "stylesheet", "info", "pict", "object", "listtable", "listoverridetable",
+    "revtbl", "rsidtbl", "generator", "xmlnstbl", "themedata", "colorschememapping", "latentstyles",
+    "datastore", "filetbl", "bkmkstart", "bkmkend", "fldinst",
+}
+_RTF_TOKEN = re.compile(r"\\([a-z]{1,32})(-?\d{1,10})? ?|\\'([0-9a-f]{2})|\\([^a-z])|([{}])|[\r\n]+|([^\\{}\r\n]+)", re.I)
+_RTF_CHARS = {"par": "\n", "line": "\n", "sect": "\n", "page": "\n", "tab": "\t", "cell": "\t", "row": "\n",
+              "emdash": "\u2014", "endash": "\u2013", "bullet": "\u2022", "lquote": "\u2018", "rquote": "\u2019",
+              "ldblquote": "\u201c", "rdblquote": "\u201d"}
+
+
+def rtf_to_text(rtf):
+    """Plain text of an RTF document: skips non-text destinations and decodes escapes."""
+    out = []
+    stack = []
+    skip = False
+    unicode_skip, pending_skip = 1, 0
+    for match in _RTF_TOKEN.finditer(rtf):
+        word, argument, hex_char, symbol, brace, text = match.groups()
+        if brace == "{":
+            stack.append((skip, unicode_skip))
+        elif brace == "}":
+            if stack:
+                skip, unicode_skip = stack.pop()
+        elif word:
+            if pending_skip:
+                # A control word stands in for one fallback character of the preceding \u
+                pending_skip -= 1
+            elif word in _RTF_SKIP:
+                skip = True
+            elif word == "uc":
+                unicode_skip = int(argument or 1)
+            elif word == "u" and not skip:
+                out.append(chr(int(argument) % 65536))
+                pending_skip = unicode_skip
+            elif word in _RTF_CHARS and not skip:
+                out.append(_RTF_CHARS[word])
+        elif hex_char:
+            if pending_skip:
+                pending_skip -= 1
+            elif not skip:
+                out.append(bytes([int(hex_char, 16)]).decode("cp1252", errors="replace"))
+        elif symbol:
+            if symbol == "*":
+                skip = True
+            elif symbol in "\\{}" and not skip:
+                out.append(symbol)
+            elif symbol == "~" and not skip:
+                out.append("\u00a0")
+        elif text and not skip:
+            if pending_skip:
+                dropped = min(pending_skip, len(text))
+                text, pending_skip = text[dropped:], pending_skip - dropped
+            out.append(text)
+    return "".join(out)
+
+
+@register_extractor(RTF)
+def extract_rtf(stream, context):
+    # RTF is 7-bit ASCII with escapes, so latin-1 decoding is lossless here
+    return [rtf_to_text(stream.read().decode("latin-1"))]
+
+
+@register_extractor(TEXT)
+def extract_plain_text(stream, context):
+    """Plain text files and Google Docs exported as text/plain."""
+    return [stream.read().decode("utf-8-sig", errors="replace")]
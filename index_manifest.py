@@ -0,0 +1,95 @@
+import os
+import time
+import sqlite3
+import threading
+
+DEFAULT_INDEX_MANIFEST_PATH = os.getenv("INDEX_MANIFEST_PATH", "index_manifest.sqlite")
+
+
+class IndexManifest:
+    """Local record of what is in a vector index: vector ID -> candidate ID and content hash.
+
+    Entries are kept per `index_name`, which should be the vector store's `location`
+    (backend plus index name or path), so switching stores never reuses another's state.
+    The loader diffs each run against it, so unchanged vectors are neither re-embedded
+    nor re-upserted, stale chunks of a changed candidate are deleted, and (on a full
+    ingest) candidates missing from the input are removed from the index.
+    """
+
+    def __init__(self, index_name, path=DEFAULT_INDEX_MANIFEST_PATH):
+        self.index_name = index_name
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            "index_name TEXT NOT NULL, vector_id TEXT NOT NULL, candidate_id TEXT NOT NULL, "
+            "content_hash TEXT NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (index_name, vector_id))"
+        )
+        self._conn.commit()
+        self._hashes = {}
+        self._candidate_of = {}
+        self._vectors_of = {}
+        for vector_id, candidate_id, content_hash in self._conn.execute(
+            "SELECT vector_id, candidate_id, content_hash FROM vectors WHERE index_name = ?", (index_name,)
+        ):
+            self._remember(vector_id, candidate_id, content_hash)
+
+    def _remember(self, vector_id, candidate_id, content_hash):
+        self._hashes[vector_id] = content_hash
+        self._candidate_of[vector_id] = candidate_id
+        self._vectors_of.setdefault(candidate_id, set()).add(vector_id)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._hashes)
+
+    def is_current(self, vector_id, content_hash):
+        with self._lock:
+            return self._hashes.get(vector_id) == content_hash
+
+    def vectors_of(self, candidate_id):
+        """Vector IDs recorded for a candidate (a copy, safe to use while other jobs write)."""
+        with self._lock:
+            return set(self._vectors_of.get(candidate_id, ()))
+
+    def vectors_by_candidate(self):
+        """Snapshot of candidate ID -> recorded vector IDs."""
+        with self._lock:
+            return {candidate_id: set(vector_ids) for candidate_id, vector_ids in self._vectors_of.items()}
+
+    def record(self, entries):
+        """Record successfully upserted (vector_id, candidate_id, content_hash) entries."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vectors (index_name, vector_id, candidate_id, content_hash, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(self.index_name, vector_id, candidate_id, content_hash, now)
+                 for vector_id, candidate_id, content_hash in entries],
+            )
+            self._conn.commit()
+            for vector_id, candidate_id, content_hash in entries:
+                self._remember(vector_id, candidate_id, content_hash)
+
+    def forget(self, vector_ids):
+        """Drop deleted vectors from the manifest."""
+        vector_ids = list(vector_ids)
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM vectors WHERE index_name = ? AND vector_id = ?",
+                [(self.index_name, vector_id) for vector_id in vector_ids],
+            )
+            self._conn.commit()
+            for vector_id in vector_ids:
+                self._hashes.pop(vector_id, None)
+                candidate_id = self._candidate_of.pop(vector_id, None)
+                remaining = self._vectors_of.get(candidate_id)
+                if remaining is not None:
+                    remaining.discard(vector_id)
+                    if not remaining:
+                        del self._vectors_of[candidate_id]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
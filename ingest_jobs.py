@@ -0,0 +1,288 @@
+import os
+import time
+import uuid
+import sqlite3
+import threading
+
+from json_stream import count_records
+from metrics import DEFAULT_METRICS_PATH, get_logger
+
+DEFAULT_JOBS_PATH = os.getenv("INGEST_JOBS_PATH", "ingest_jobs.sqlite")
+DEFAULT_INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+# Progress is written at most this often per job, so large ingests don't hammer SQLite
+PROGRESS_INTERVAL = 1.0
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+logger = get_logger("ingest_jobs")
+
+_COLUMNS = (
+    "id", "name", "file_path", "index_name", "status", "total", "processed", "upserted", "unchanged",
+    "deleted", "errors", "error", "worker_pid", "remove_file", "full_ingest", "created_at", "started_at",
+    "updated_at", "finished_at",
+)
+
+
+def job_metrics_path(metrics_path, job_id):
+    """`metrics_path` with the job ID before its extension, e.g. metrics.<job_id>.prom."""
+    if not metrics_path:
+        return None
+    root, extension = os.path.splitext(metrics_path)
+    return f"{root}.{job_id}{extension}"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """Ingest jobs persisted in SQLite, so they survive page refreshes and can be resumed.
+
+    Each job is one uploaded file to index. Several processes may share the database:
+    jobs are claimed in an IMMEDIATE transaction, and jobs left `running` by a process
+    that has since died are put back in the queue by `recover()`.
+    """
+
+    def __init__(self, path=DEFAULT_JOBS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # Autocommit, with explicit transactions where a read-then-write must be atomic
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, name TEXT, file_path TEXT NOT NULL, index_name TEXT NOT NULL, "
+            "status TEXT NOT NULL, total INTEGER, processed INTEGER NOT NULL DEFAULT 0, "
+            "upserted INTEGER NOT NULL DEFAULT 0, unchanged INTEGER NOT NULL DEFAULT 0, "
+            "deleted INTEGER NOT NULL DEFAULT 0, errors INTEGER NOT NULL DEFAULT 0, error TEXT, worker_pid INTEGER, "
+            "remove_file INTEGER NOT NULL DEFAULT 0, full_ingest INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL NOT NULL, started_at REAL, "
+            "updated_at REAL, finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created_at)")
+        # Databases created before these columns existed
+        existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column in ("errors", "full_ingest"):
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+
+    def submit(self, file_path, index_name, name=None, remove_file=False, full_ingest=False):
+        """Queue a file for indexing and return the job ID.
+
+        With remove_file the file is deleted once the job succeeds (e.g. a staged upload).
+        full_ingest marks the file as the complete candidate set, so candidates missing from
+        it are removed from the index (PineconeLoader's delete_missing).
+        """
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, name, file_path, index_name, status, remove_file, full_ingest, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, name or os.path.basename(file_path), file_path, index_name, QUEUED,
+                 int(remove_file), int(full_ingest), time.time()),
+            )
+        return job_id
+
+    def claim(self):
+        """Atomically mark the oldest queued job as running in this process and return it."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    now = time.time()
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, worker_pid = ?, started_at = ?, updated_at = ? WHERE id = ?",
+                        (RUNNING, os.getpid(), now, now, row["id"]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(row["id"]) if row is not None else None
+
+    def update(self, job_id, **fields):
+        """Set progress fields (total, processed, upserted, ...) on a job."""
+        unknown = set(fields) - set(_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {', '.join(sorted(unknown))}")
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def finish(self, job_id, error=None, **fields):
+        now = time.time()
+        self.update(job_id, status=FAILED if error else DONE, error=error, finished_at=now, **fields)
+
+    def cancel(self, job_id):
+        """Cancel a job that hasn't started yet. Returns False if it was already claimed."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, QUEUED),
+            )
+        return cursor.rowcount > 0
+
+    def retry(self, job_id):
+        """Put a failed or cancelled job back in the queue from the start."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, processed = 0, upserted = 0, unchanged = 0, deleted = 0, errors = 0, "
+                "error = NULL, worker_pid = NULL, started_at = NULL, finished_at = NULL "
+                "WHERE id = ? AND status IN (?, ?)",
+                (QUEUED, job_id, FAILED, CANCELLED),
+            )
+        return cursor.rowcount > 0
+
+    def recover(self):
+        """Requeue running jobs whose worker process no longer exists. Returns how many."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, worker_pid FROM jobs WHERE status = ?", (RUNNING,)
+            ).fetchall()
+            orphaned = [(row["id"],) for row in rows
+                        if row["worker_pid"] is None or not _pid_alive(row["worker_pid"])]
+            self._conn.executemany(
+                f"UPDATE jobs SET status = '{QUEUED}', worker_pid = NULL, processed = 0 WHERE id = ?", orphaned
+            )
+        return len(orphaned)
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._with_rates(dict(row)) if row is not None else None
+
+    def list(self, limit=50, statuses=None):
+        """Most recent jobs first, optionally only those in `statuses`."""
+        query, params = "SELECT * FROM jobs", []
+        if statuses:
+            query += f" WHERE status IN ({','.join('?' * len(statuses))})"
+            params.extend(statuses)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(query, (*params, limit)).fetchall()
+        return [self._with_rates(dict(row)) for row in rows]
+
+    @staticmethod
+    def _with_rates(job):
+        """Add elapsed seconds, candidates/sec and the completed fraction to a job row."""
+        if job["started_at"]:
+            end = job["finished_at"] or (time.time() if job["status"] == RUNNING else job["updated_at"])
+            job["elapsed"] = max(end - job["started_at"], 0.0)
+        else:
+            job["elapsed"] = 0.0
+        job["rate"] = job["processed"] / job["elapsed"] if job["elapsed"] else 0.0
+        job["fraction"] = min(job["processed"] / job["total"], 1.0) if job["total"] else None
+        return job
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class IngestWorkerPool:
+    """Background threads that run queued ingest jobs off the Streamlit request thread.
+
+    `make_loader(job)` returns the PineconeLoader for a job; build it around shared
+    vector store, manifest and embedding cache objects so concurrent jobs reuse one
+    index client. `workers` bounds how many files are indexed at once; further uploads
+    wait in the queue. Each job's metrics are exported next to `metrics_path` under a
+    per-job name (see job_metrics_path), so concurrent jobs don't overwrite each other.
+    """
+
+    def __init__(self, queue, make_loader, workers=DEFAULT_INGEST_WORKERS, poll_interval=2.0,
+                 metrics_path=DEFAULT_METRICS_PATH):
+        self.queue = queue
+        self.make_loader = make_loader
+        self.metrics_path = metrics_path
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        recovered = self.queue.recover()
+        if recovered:
+            logger.info(f"Requeued {recovered} interrupted ingest jobs.")
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"ingest-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def submit(self, file_path, index_name, name=None, remove_file=False, full_ingest=False):
+        job_id = self.queue.submit(file_path, index_name, name=name, remove_file=remove_file,
+                                   full_ingest=full_ingest)
+        self._wake.set()
+        return job_id
+
+    def retry(self, job_id):
+        retried = self.queue.retry(job_id)
+        if retried:
+            self._wake.set()
+        return retried
+
+    def stop(self, wait=True):
+        """Stop after the running jobs finish."""
+        self._stop.set()
+        self._wake.set()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _work(self):
+        while not self._stop.is_set():
+            job = self.queue.claim()
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self.run_job(job)
+
+    def run_job(self, job):
+        job_id = job["id"]
+        logger.info(f"Ingest job {job_id} started: {job['name']} -> {job['index_name']}")
+        try:
+            self.queue.update(job_id, total=count_records(job["file_path"]))
+            loader = self.make_loader(job)
+            state = {"done": 0, "last_update": 0.0}
+
+            def progress(done, stats):
+                state["done"] = done
+                now = time.monotonic()
+                if now - state["last_update"] >= PROGRESS_INTERVAL:
+                    state["last_update"] = now
+                    self.queue.update(job_id, processed=done, **stats)
+
+            loader.load_and_index(metrics_path=job_metrics_path(self.metrics_path, job_id), progress=progress)
+        except Exception as e:
+            logger.exception(f"Ingest job {job_id} failed")
+            self.queue.finish(job_id, error=f"{type(e).__name__}: {e}")
+            return
+        # The loader logs and counts per-batch failures instead of raising; any of them
+        # fails the job and keeps the file so it can be retried
+        if loader.stats["errors"]:
+            logger.error(f"Ingest job {job_id} had {loader.stats['errors']} errors: {loader.stats}")
+            self.queue.finish(job_id, error=f"{loader.stats['errors']} errors while indexing; see the log",
+                              processed=state["done"], **loader.stats)
+            return
+        self.queue.finish(job_id, processed=state["done"], **loader.stats)
+        logger.info(f"Ingest job {job_id} finished: {loader.stats}")
+        if job["remove_file"]:
+            try:
+                os.remove(job["file_path"])
+            except OSError:
+                pass
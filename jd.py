@@ -1,17 +1,23 @@
 import os
-import io
-import re
 import json
-import requests
-from pdf2image import convert_from_bytes
-import pytesseract
-import docx2txt
+import time
 import boto3
+import contextvars
 from botocore.exceptions import NoCredentialsError, PartialCredentialsError
-from pydantic import BaseModel, ValidationError
+from pydantic import BaseModel
 from typing import List, Optional
 from dotenv import load_dotenv
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from llm_client import ExtractionError, get_extraction_client
+from json_stream import merge_records
+from jsonl_store import JsonlWriter, is_jsonl_path
+from source_sync import SyncManifest, changed_s3_objects, iter_s3_objects, s3_object_version
+from sqlite_cache import get_llm_cache
+from pdf_text import FastPathStats
+from document_sources import DOWNLOAD_BUDGET_BYTES, ByteBudget, S3Source, s3_client_config
+from extractors import ExtractionContext, extract_text
+from structured_output import repair_payload, response_format_for, validate_json
+from metrics import DEFAULT_METRICS_PATH, get_logger, metrics
 
 # Load environment variables
 load_dotenv()
@@ -21,6 +27,13 @@ AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+logger = get_logger("jd")
+
+# How often the PDF text layer let us skip OCR during this run
+fast_path_stats = FastPathStats()
+# Scanned pages and images are OCR'd in the shared process pool
+extraction_context = ExtractionContext(fast_path_stats=fast_path_stats)
+
 # Pydantic model for Job Description
 class JobDescription(BaseModel):
     role: Optional[str] = None
@@ -31,71 +44,36 @@ class JobDescription(BaseModel):
     qualifications: Optional[List[str]] = []
     skills: Optional[List[str]] = []
 
+JD_RESPONSE_FORMAT = response_format_for(JobDescription)
+
 # Authenticate to S3
 def authenticate_to_s3():
     try:
         s3_client = boto3.client(
             's3',
             aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY
+            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+            # Room for every download thread plus its ranged part requests (the default pool is 10)
+            config=s3_client_config()
         )
-        print("✅ Authenticated to S3.")
+        logger.info("Authenticated to S3.")
         return s3_client
     except (NoCredentialsError, PartialCredentialsError) as e:
-        print(f"❌ Authentication failed: {e}")
+        logger.error(f"Authentication failed: {e}")
         raise
 
-# List files in an S3 bucket
-def list_files_in_bucket(s3_client, bucket_name, prefix=""):
+# List files in an S3 bucket, or only new/changed ones when a sync manifest is given
+def list_files_in_bucket(s3_client, bucket_name, prefix="", manifest=None):
     try:
-        response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
-        return response.get('Contents', []) if 'Contents' in response else []
+        if manifest:
+            return list(changed_s3_objects(s3_client, bucket_name, prefix, manifest))
+        return list(iter_s3_objects(s3_client, bucket_name, prefix))
     except Exception as e:
-        print(f"❌ Error listing files: {e}")
+        logger.error(f"Error listing files: {e}")
         return []
 
-# Download a file from S3 as bytes
-def download_file_as_bytes(s3_client, bucket_name, file_key):
-    try:
-        file_stream = io.BytesIO()
-        s3_client.download_fileobj(bucket_name, file_key, file_stream)
-        file_stream.seek(0)
-        return file_stream
-    except Exception as e:
-        print(f"❌ Error downloading file: {e}")
-        return None
-
-# Extract text from a PDF file
-def extract_text_from_pdf(pdf_bytes):
-    try:
-        images = convert_from_bytes(pdf_bytes.read())
-        extracted_text = " ".join([pytesseract.image_to_string(image) for image in images if image])
-        return extracted_text.strip()
-    except Exception as e:
-        print(f"❌ Error extracting text from PDF: {e}")
-        return ""
-
-# Extract text from a Word document
-def extract_text_from_word(doc_bytes):
-    try:
-        text = docx2txt.process(io.BytesIO(doc_bytes.read()))
-        return text.strip()
-    except Exception as e:
-        print(f"❌ Error extracting text from Word: {e}")
-        return ""
-
-# Clean OpenAI JSON response
-def clean_json_response(response_text):
-    match = re.search(r"```json\n(.*?)\n```", response_text, re.DOTALL)
-    return match.group(1) if match else response_text.strip()
-
 # Process extracted text with OpenAI
 def process_text_with_openai(extracted_text):
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OPENAI_API_KEY}"
-    }
-
     schema = {
         "role": "string or null",
         "experience": "string or null",
@@ -119,40 +97,40 @@ def process_text_with_openai(extracted_text):
             },
             {"role": "user", "content": extracted_text}
         ],
-        "max_tokens": 2000
+        "max_tokens": 2000,
+        # Constrain the response to the JobDescription schema so it is always plain JSON
+        "response_format": JD_RESPONSE_FORMAT
     }
 
+    # Identical text under the same model and prompt/schema always extracts the same way
+    llm_cache = get_llm_cache()
+    system_prompt = payload["messages"][0]["content"]
+    cached_result = llm_cache.get_result(payload["model"], system_prompt, extracted_text)
+    if cached_result is not None:
+        metrics.inc("llm_cache_total", pipeline="jd", result="hit")
+        return cached_result
+    metrics.inc("llm_cache_total", pipeline="jd", result="miss")
+
     try:
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
-        
-        if response.status_code != 200:
-            print(f"❌ Error: {response.status_code} - {response.text}")
-            return None
-        
-        response_json = response.json()
-        if "choices" not in response_json or not response_json["choices"]:
-            print("❌ OpenAI API returned an empty response.")
-            return None
-        
-        content = response_json["choices"][0]["message"]["content"].strip()
-        cleaned_json = clean_json_response(content)
-        
-        return json.loads(cleaned_json)
+        client = get_extraction_client(OPENAI_API_KEY)
+        content = client.chat_content(payload)
 
-    except json.JSONDecodeError:
-        print("❌ Error: Unable to parse JSON response.")
-        print("Raw Response:", content)
-        return None
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Network error: {e}")
-        return None
+        # A malformed response gets a short repair request instead of being dropped
+        def repair(bad_content, error):
+            metrics.inc("llm_repairs_total", pipeline="jd")
+            logger.warning(f"Repairing invalid JD response: {error.splitlines()[0]}")
+            return client.chat_content(repair_payload(payload, bad_content, error))
 
-# Validate and map JD data to the Pydantic model
-def validate_and_map_jd_data(jd_data):
-    try:
-        return JobDescription(**jd_data).dict()
-    except ValidationError as e:
-        print(f"❌ Validation error: {e}")
+        jd = validate_json(JobDescription, content, repair=repair)
+        if jd is None:
+            logger.error(f"Raw Response: {content}")
+            return None
+        jd_data = jd.model_dump()
+        llm_cache.put_result(payload["model"], system_prompt, extracted_text, jd_data)
+        return jd_data
+
+    except ExtractionError as e:
+        logger.error(f"Error: {e}")
         return None
 
 # Save JSON data to a local file
@@ -163,46 +141,123 @@ def save_json_to_local(json_data, output_file_path):
             os.remove(output_file_path)
         with open(output_file_path, "w", encoding="utf-8") as json_file:
             json.dump(json_data, json_file, indent=4)
-        print(f"✅ JSON data successfully saved to: {output_file_path}")
+        logger.info(f"JSON data successfully saved to: {output_file_path}")
     except Exception as e:
-        print(f"❌ Error saving JSON to local file: {e}")
+        logger.error(f"Error saving JSON to local file: {e}")
 
-# Process a single file
-def process_file(s3_client, bucket_name, file):
+# Process a single file; its type (PDF, DOCX, DOC, RTF, image, text) is sniffed from the bytes
+# The download budget is held from download until the text is extracted.
+def process_file(source, file, download_budget=None):
     file_key = file['Key']
-    print(f"🔍 Processing: {file_key}")
-    file_stream = download_file_as_bytes(s3_client, bucket_name, file_key)
-    if not file_stream:
-        return None
+    logger.info(f"Processing: {file_key}")
+    reserved = download_budget.acquire(source.size(file)) if download_budget else 0
+    try:
+        with metrics.timer("download", pipeline="jd"):
+            file_stream = source.open(file)
+        if not file_stream:
+            metrics.inc("documents_total", pipeline="jd", outcome="failed")
+            return None
+        with metrics.timer("extract_text", pipeline="jd"):
+            content_type, extracted_text = extract_text(file_stream, extraction_context, source.declared_mime(file))
+        file_stream.close()
+    finally:
+        if download_budget:
+            download_budget.release(reserved)
 
-    if file_key.endswith('.pdf'):
-        extracted_text = extract_text_from_pdf(file_stream)
-    elif file_key.endswith('.docx') or file_key.endswith('.doc'):
-        extracted_text = extract_text_from_word(file_stream)
-    else:
+    if content_type is None:
+        metrics.inc("documents_total", pipeline="jd", outcome="unsupported")
+        logger.info(f"Skipping {file_key}: unsupported content.")
         return None
 
     if not extracted_text:
-        print(f"⏩ Skipping {file_key} due to empty extracted text.")
+        metrics.inc("documents_total", pipeline="jd", outcome="empty")
+        logger.info(f"Skipping {file_key} due to empty extracted text.")
         return None
 
-    jd_data = process_text_with_openai(extracted_text)
-    validated_jd = validate_and_map_jd_data(jd_data) if jd_data else None
+    # process_text_with_openai returns JobDescription-validated data (or a cached copy of it)
+    with metrics.timer("extract", pipeline="jd"):
+        validated_jd = process_text_with_openai(extracted_text)
 
+    metrics.inc("documents_total", pipeline="jd", outcome="extracted" if validated_jd else "failed")
     return validated_jd
 
-# Process JDs from S3 and save JSON to local drive
-def process_jds_to_local(s3_client, bucket_name, prefix, output_file_path):
-    files = list_files_in_bucket(s3_client, bucket_name, prefix)
+# Process JDs from S3 and save JSON to local drive.
+# A .jsonl output path streams each JD as it is validated and skips keys finished by a previous run.
+# With a manifest_path only objects that are new or whose ETag changed since the last run are processed;
+# a .json output is merged with the existing file so it still holds every JD.
+# Stage timings and counters for this run are logged at the end and exported to metrics_path (JSON, or Prometheus text for .prom).
+# At most download_budget_bytes of downloaded objects wait for text extraction; large ones are spilled to disk.
+@metrics.scoped
+def process_jds_to_local(s3_client, bucket_name, prefix, output_file_path, concurrency=None, manifest_path=None,
+                         metrics_path=DEFAULT_METRICS_PATH, download_budget_bytes=DOWNLOAD_BUDGET_BYTES):
+    start_time = time.time()
+    manifest = SyncManifest(manifest_path, source=f"s3:{bucket_name}/{prefix}") if manifest_path else None
+    source = S3Source(s3_client, bucket_name, prefix)
+    files = [file for file in list_files_in_bucket(s3_client, bucket_name, prefix, manifest) if source.is_supported(file)]
     aggregated_data = {"job_descriptions": []}
 
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        future_to_file = {executor.submit(process_file, s3_client, bucket_name, file): file for file in files}
-        
-        for future in as_completed(future_to_file):
-            validated_jd = future.result()
-            if validated_jd:
-                aggregated_data["job_descriptions"].append(validated_jd)
+    writer = JsonlWriter(output_file_path) if is_jsonl_path(output_file_path) else None
+    # The sync manifest is version-aware, so it supersedes the per-file checkpoint
+    if writer and not manifest:
+        pending_files = [file for file in files if not writer.is_done(file['Key'])]
+        logger.info(f"Resuming: {len(files) - len(pending_files)} files already processed.")
+        files = pending_files
+
+    # The shared LLM client enforces rate limits, so workers only need to keep it busy
+    max_workers = concurrency or get_extraction_client(OPENAI_API_KEY).concurrency
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            download_budget = ByteBudget(download_budget_bytes)
+            # Workers run in a copy of this context so their metrics land in this run's scope
+            future_to_file = {
+                executor.submit(contextvars.copy_context().run, process_file, source, file, download_budget): file
+                for file in files
+            }
+
+            for future in as_completed(future_to_file):
+                file = future_to_file[future]
+                try:
+                    validated_jd = future.result()
+                except Exception as e:
+                    # One bad document must not abort the rest of the run
+                    metrics.inc("documents_total", pipeline="jd", outcome="failed")
+                    logger.error(f"Error processing {file['Key']}: {e}")
+                    continue
+                if not validated_jd:
+                    continue
+                if writer:
+                    writer.write(validated_jd, source_id=file['Key'])
+                else:
+                    aggregated_data["job_descriptions"].append({**validated_jd, "source_id": file['Key']})
+                if manifest:
+                    manifest.mark_synced(file['Key'], s3_object_version(file))
+    finally:
+        if writer:
+            writer.close()
+        if manifest:
+            manifest.close()
+
+    logger.info(fast_path_stats.summary())
+    cache_stats = get_llm_cache().stats()
+    logger.info(f"LLM cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                f"({cache_stats['hit_rate']:.0%} hit rate).")
+    logger.info(f"Stage timings:\n{metrics.current().stage_summary()}")
+    logger.info(f"Processed {len(files)} files in {time.time() - start_time:.2f} seconds.")
+    if metrics_path:
+        metrics.current().export(metrics_path)
+
+    if writer:
+        logger.info(f"Job descriptions streamed to: {output_file_path}")
+        return
+
+    if manifest:
+        try:
+            aggregated_data["job_descriptions"] = merge_records(
+                output_file_path, aggregated_data["job_descriptions"], key="job_descriptions")
+        except Exception as e:
+            # Writing just the changes would drop every unchanged JD from the file
+            logger.error(f"Error merging with the existing {output_file_path}, not saving: {e}")
+            return
 
     # Save JSON to local file
     save_json_to_local(aggregated_data, output_file_path)
@@ -219,4 +274,4 @@ if __name__ == "__main__":
         # Process JDs and save JSON to local drive
         process_jds_to_local(s3_client, bucket_name, prefix, output_file_path)
     except Exception as e:
-        print(f"❌ Error in main execution: {e}")
\ No newline at end of file
+        logger.error(f"Error in main execution: {e}")
\ No newline at end of file
@@ -0,0 +1,166 @@
+import os
+import json
+from itertools import islice
+
+from jsonl_store import is_jsonl_path
+from metrics import get_logger
+
+try:
+    import ijson
+except ImportError:  # Optional: the built-in incremental parser below is used instead
+    ijson = None
+
+logger = get_logger("json_stream")
+
+CHUNK_SIZE = 64 * 1024
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",:]}"
+
+
+class _Buffer:
+    """Sliding text buffer over a file that refills on demand."""
+
+    def __init__(self, file, chunk_size=CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        if self.eof:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop what has already been consumed so memory stays bounded
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, or '' at end of file."""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos}, found '{self.peek()}'")
+        self.pos += 1
+
+    def decode(self, decoder):
+        """Decode one complete JSON value at the current position, reading more input as needed."""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.text, self.pos)
+                # A number cut off by the chunk boundary ("1." of "1.5") must see more input
+                if self.eof or (end < len(self.text) and self.text[end] in _DELIMITERS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self.fill():
+                value, end = decoder.raw_decode(self.text, self.pos)
+                self.pos = end
+                return value
+
+
+def _iter_array_under_key(file, key):
+    """Yield the elements of the top-level `key` array of a JSON object one at a time."""
+    decoder = json.JSONDecoder()
+    buffer = _Buffer(file)
+    buffer.expect("{")
+    if buffer.peek() == "}":
+        return
+    while True:
+        name = buffer.decode(decoder)
+        buffer.expect(":")
+        if name == key:
+            buffer.expect("[")
+            if buffer.peek() == "]":
+                buffer.pos += 1
+            else:
+                while True:
+                    yield buffer.decode(decoder)
+                    if buffer.peek() == ",":
+                        buffer.pos += 1
+                        continue
+                    buffer.expect("]")
+                    break
+        else:
+            buffer.decode(decoder)
+        if buffer.peek() == ",":
+            buffer.pos += 1
+            continue
+        buffer.expect("}")
+        return
+
+
+def iter_jsonl(file_path, on_error=None):
+    """Yield one record per non-empty line of a JSON Lines file.
+
+    Malformed lines are skipped; `on_error(line_number, error)` is called for each.
+    """
+    with open(file_path, "r", encoding="utf-8") as file:
+        for line_number, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                logger.warning(f"Skipping malformed line {line_number} in {file_path}: {e}")
+                if on_error is not None:
+                    on_error(line_number, e)
+
+
+def iter_records(file_path, key="candidates", on_error=None):
+    """Lazily yield records from a JSON Lines file or the `key` array of a nested JSON file.
+
+    `on_error` is passed to iter_jsonl; errors in nested JSON raise.
+    """
+    if is_jsonl_path(file_path):
+        yield from iter_jsonl(file_path, on_error)
+        return
+    if ijson is not None:
+        with open(file_path, "rb") as file:
+            # use_float keeps numbers as floats instead of Decimal so they stay JSON-serialisable
+            yield from ijson.items(file, f"{key}.item", use_float=True)
+        return
+    with open(file_path, "r", encoding="utf-8") as file:
+        yield from _iter_array_under_key(file, key)
+
+
+def merge_records(file_path, records, key="candidates"):
+    """Records of an earlier output at `file_path` updated with `records` by source_id.
+
+    Incremental runs only produce the documents that changed; merging keeps the output a
+    full set, so loading it never looks like the unchanged candidates were removed.
+    Earlier records re-produced by this run (same source_id) are replaced.
+    """
+    if not os.path.exists(file_path):
+        return list(records)
+    replaced = {record.get("source_id") for record in records if record.get("source_id")}
+    kept = [record for record in iter_records(file_path, key) if record.get("source_id") not in replaced]
+    return kept + list(records)
+
+
+def preview_records(file_path, limit=20, key="candidates"):
+    """First `limit` records of a file, for display without parsing the whole thing."""
+    return list(islice(iter_records(file_path, key), limit))
+
+
+def count_records(file_path, key="candidates"):
+    """Number of records in a file, counted in one streaming pass (JSON Lines just counts lines)."""
+    if is_jsonl_path(file_path):
+        with open(file_path, "rb") as file:
+            return sum(1 for line in file if line.strip())
+    return sum(1 for _ in iter_records(file_path, key))
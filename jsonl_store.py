@@ -0,0 +1,84 @@
+import os
+import json
+import threading
+
+from metrics import get_logger
+
+logger = get_logger("jsonl_store")
+
+
+def is_jsonl_path(path):
+    return str(path).endswith((".jsonl", ".ndjson"))
+
+
+class JsonlWriter:
+    """Append-only JSON Lines output with a checkpoint of finished source files.
+
+    Every record is written and flushed as soon as it is produced, tagged with the
+    `source_id` of the file it came from. Source IDs that finish without a record
+    (duplicates, unreadable files) go to a `<path>.done` sidecar. On restart both are
+    read back so already processed files can be skipped, and a half-written last line
+    left by a crash is truncated.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.checkpoint_path = f"{path}.done"
+        self.done_ids = set()
+        self._lock = threading.Lock()
+        self._recover()
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._checkpoint = open(self.checkpoint_path, "a", encoding="utf-8")
+
+    def _recover(self):
+        if os.path.exists(self.path):
+            good_offset = 0
+            with open(self.path, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    good_offset += len(line)
+                    if isinstance(record, dict) and record.get("source_id"):
+                        self.done_ids.add(record["source_id"])
+            if good_offset < os.path.getsize(self.path):
+                logger.warning(f"Truncating incomplete record at the end of {self.path}")
+                with open(self.path, "r+b") as f:
+                    f.truncate(good_offset)
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                self.done_ids.update(line.strip() for line in f if line.strip())
+
+    def is_done(self, source_id):
+        return source_id in self.done_ids
+
+    def write(self, record, source_id=None):
+        """Append one record and flush it to disk."""
+        if source_id is not None:
+            record = {**record, "source_id": source_id}
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            if source_id is not None:
+                self.done_ids.add(source_id)
+
+    def mark_done(self, source_id):
+        """Record a source file as finished without writing a record for it."""
+        with self._lock:
+            self._checkpoint.write(f"{source_id}\n")
+            self._checkpoint.flush()
+            self.done_ids.add(source_id)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+            self._checkpoint.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
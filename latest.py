@@ -1,18 +1,25 @@
 import os
-import io
 import json
 import time
-from datetime import datetime
-from pdf2image import convert_from_bytes
-import pytesseract
-import requests
-from pydantic import ValidationError
+import logging
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
 from google.oauth2.service_account import Credentials
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional
 from dotenv import load_dotenv
+from llm_client import get_extraction_client
+from metrics import DEFAULT_METRICS_PATH, get_logger, metrics
+from ocr import OCRPool
+from dedup import DEFAULT_DEDUP_PATH, Deduplicator
+from document_sources import DOWNLOAD_BUDGET_BYTES, DOWNLOAD_WORKERS, ByteBudget, DriveSource
+from extractors import ExtractionContext, resolve_parts, start_extraction
+from json_stream import merge_records
+from jsonl_store import JsonlWriter, is_jsonl_path
+from pdf_text import DEFAULT_RASTER_OPTIONS, FastPathStats
+from pipeline import TokenBatcher, run_pipeline
+from sqlite_cache import get_llm_cache
+from structured_output import repair_json, repair_payload, response_format_for, validate_json
+from source_sync import SyncManifest, changed_drive_files, drive_file_version, iter_drive_files
 
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -69,13 +76,50 @@ class Candidate(BaseModel):
 class AggregatedData(BaseModel):
     candidates: List[Candidate] = []
 
-def log_message(message, start_time=None):
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+class RelevantExperience(BaseModel):
+    title: str
+    years: float
+
+class CandidateExtraction(Candidate):
+    """What the LLM returns: a Candidate whose relevant_experience is a typed list.
+
+    Strict structured outputs can't describe a free-form dict, so the title -> years map
+    is requested as [{title, years}] and turned back into a dict by to_candidate().
+    """
+    relevant_experience: Optional[List[RelevantExperience]] = None
+
+    @field_validator("relevant_experience", mode="before")
+    @classmethod
+    def _from_mapping(cls, value):
+        # Responses that still use the {title: years} form
+        if isinstance(value, dict):
+            return [{"title": title, "years": years} for title, years in value.items()]
+        return value
+
+    def to_candidate(self):
+        data = self.model_dump()
+        if self.relevant_experience is not None:
+            data["relevant_experience"] = {entry.title: entry.years for entry in self.relevant_experience}
+        return data
+
+class BatchEntry(BaseModel):
+    id: str
+    candidate: Optional[CandidateExtraction] = None
+
+class CandidateBatch(BaseModel):
+    results: List[BatchEntry] = []
+
+# Strict schema-constrained output generated from the models, so responses are plain JSON
+CANDIDATE_RESPONSE_FORMAT = response_format_for(CandidateExtraction, name="Candidate")
+CANDIDATE_BATCH_RESPONSE_FORMAT = response_format_for(CandidateBatch)
+
+logger = get_logger("latest")
+
+def log_message(message, start_time=None, level=logging.INFO):
+    """Log a message; pass `start_time` only when reporting the end of the work it timed."""
     if start_time:
-        time_taken = time.time() - start_time
-        print(f"[{current_time}] {message} (Time taken: {time_taken:.2f} seconds)")
-    else:
-        print(f"[{current_time}] {message}")
+        message = f"{message} (elapsed: {time.time() - start_time:.2f} seconds)"
+    logger.log(level, message)
 
 def authenticate_to_drive(credentials_path):
     """Authenticate to Google Drive using service account credentials."""
@@ -85,155 +129,116 @@ def authenticate_to_drive(credentials_path):
         log_message("Successfully authenticated to Google Drive.")
         return drive_service
     except Exception as e:
-        log_message(f"Authentication failed: {e}")
+        log_message(f"Authentication failed: {e}", level=logging.ERROR)
         raise
 
-def list_files_in_folder(drive_service, folder_id):
-    """List all files in a Google Drive folder."""
-    print(f"📂 Fetching files from Google Drive Folder: {folder_id}")
+def list_files_in_folder(drive_service, folder_id, manifest=None):
+    """List all files in a Google Drive folder, or only new/changed ones when a sync manifest is given."""
+    log_message(f"Fetching files from Google Drive folder: {folder_id}")
 
     try:
-        query = f"'{folder_id}' in parents and trashed=false"
-        response = drive_service.files().list(q=query, fields="files(id, name, mimeType)").execute()
-        files = response.get('files', [])
-        print(f"🔍 Found {len(files)} files in the folder.")
+        if manifest:
+            files = list(changed_drive_files(drive_service, folder_id, manifest))
+        else:
+            files = list(iter_drive_files(drive_service, folder_id))
+        log_message(f"Found {len(files)} files in the folder.")
         for file in files:
-            print(f"📄 {file['name']} (ID: {file['id']})")  
+            log_message(f"{file['name']} (ID: {file['id']})", level=logging.DEBUG)
         return files
     except Exception as e:
-        print(f"❌ Error listing files: {e}")
+        log_message(f"Error listing files: {e}", level=logging.ERROR)
         return []
 
-def download_file_as_bytes(drive_service, file_id):
-    """Download a file from Google Drive as bytes."""
-    try:
-        request = drive_service.files().get_media(fileId=file_id)
-        file_stream = io.BytesIO()
-        downloader = MediaIoBaseDownload(file_stream, request)
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-            log_message(f"Processing: {int(status.progress() * 100)}%")
-        file_stream.seek(0)  
-        return file_stream
-    except Exception as e:
-        log_message(f"Error downloading file: {e}")
-        return None
-
-def pdf_bytes_to_images(pdf_bytes):
-    start_time = time.time()
-    log_message("Converting PDF bytes to images.", start_time)
-    try:
-        images = convert_from_bytes(pdf_bytes.read())
-        log_message("Conversion completed.", start_time)
-        return images
-    except Exception as e:
-        log_message(f"Error converting PDF bytes to images: {e}", start_time)
-        return []
-
-def extract_text_from_image(image):
-    start_time = time.time()
-    log_message("Extracting text from image.", start_time)
-    try:
-        text = pytesseract.image_to_string(image)
-        log_message("Text extraction completed.", start_time)
-        return text
-    except Exception as e:
-        error_message = f"Error extracting text: {str(e)}"
-        log_message(error_message, start_time)
-        return error_message
+RESUME_SCHEMA = {
+    "personal_info": {
+        "name": "string or null",
+        "email": "string or null",
+        "phone": "string or null",
+        "address": "string or null",
+        "linkedin": "string or null",
+        "github": "string or null"
+    },
+    "career_objective": "string or null",
+    "skills": ["string"],
+    "experience": [
+        {
+            "job_title": "string or null",
+            "company": "string or null",
+            "location": "string or null",
+            "duration": "string or null",
+            "responsibilities": ["string"]
+        }
+    ],
+    "education": [
+        {
+            "degree": "string or null",
+            "institution": "string or null",
+            "duration": "string or null"
+        }
+    ],
+    "projects": [
+        {
+            "title": "string or null",
+            "description": "string or null",
+            "technologies_used": ["string"]
+        }
+    ],
+    "certifications": [
+        {
+            "title": "string or null",
+            "issuing_organization": "string or null",
+            "date_issued": "string or null"
+        }
+    ],
+    "achievements": [
+        {
+            "title": "string or null",
+            "description": "string or null"
+        }
+    ],
+    "total_experience": "float or null",
+    "relevant_experience": [
+        {
+            "title": "string",
+            "years": "float"
+        }
+    ]
+}
+
+RESUME_PROMPT = (
+    "You are a structured JSON generator. Convert the provided resume text into a JSON object "
+    f"matching the following schema: {json.dumps(RESUME_SCHEMA, indent=2)}. "
+    "### Instructions:\n"
+    "1. **Strict Schema Adherence**: Ensure all fields are correctly structured. Use `null` for missing values.\n"
+    "2. **Education Extraction**: Only include the highest pursued degree with both full and short form (e.g., 'Master of Science (M.Sc)').\n"
+    "3. **Experience Handling**:\n"
+    "   - Capture all details, ensuring exact company location (if provided).\n"
+    "   - Convert all experience durations into a structured format.\n"
+    "   - Handle formats like 'Jan 2020 - Present', 'April 2019 - Nov 2021', '5 months'.\n"
+    "   - Convert months to years where applicable (e.g., '2 years 3 months' → 2.25 years).\n"
+    "   - If the end date is 'present', 'till, 'current', 'now', 'ongoing', 'on-going', 'till now' calculate experience up to today's date (17/03/2025).\n"
+    "4. **Total Experience Calculation**:\n"
+    "   - Ensure no double counting of overlapping job durations.\n"
+    "   - Accurately compute total experience as a numeric value.\n"
+    "5. **Relevant Experience Calculation**:\n"
+    "   - Compute the total duration per job title as `relevant_experience` entries.\n"
+    "   - Example:\n"
+    "     ```json\n"
+    "     \"total_experience\": 4.8,\n"
+    "     \"relevant_experience\": [\n"
+    "         {\"title\": \"Sr. Technical Lead\", \"years\": 0.1},\n"
+    "         {\"title\": \"Senior Python Developer\", \"years\": 1.1},\n"
+    "         {\"title\": \"Software Developer\", \"years\": 3.6}\n"
+    "     ]\n"
+    "     ```\n"
+    "6. **Ensure Data Integrity**:\n"
+    "   - Extract all resume details without omitting any relevant information.\n"
+    "   - Maintain correct company addresses, ensuring JSON validity.\n"
+    "   - Avoid unnecessary formatting errors or hallucinations.\n"
+)
 
 def process_text_with_openai(api_key, extracted_text):
-    start_time = time.time()
-    log_message("Processing text with OpenAI API.", start_time)
-
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
-
-    schema = {
-        "personal_info": {
-            "name": "string or null",
-            "email": "string or null",
-            "phone": "string or null",
-            "address": "string or null",
-            "linkedin": "string or null",
-            "github": "string or null"
-        },
-        "career_objective": "string or null",
-        "skills": ["string"],
-        "experience": [
-            {
-                "job_title": "string or null",
-                "company": "string or null",
-                "location": "string or null",
-                "duration": "string or null",
-                "responsibilities": ["string"]
-            }
-        ],
-        "education": [
-            {
-                "degree": "string or null",
-                "institution": "string or null",
-                "duration": "string or null"
-            }
-        ],
-        "projects": [
-            {
-                "title": "string or null",
-                "description": "string or null",
-                "technologies_used": ["string"]
-            }
-        ],
-        "certifications": [
-            {
-                "title": "string or null",
-                "issuing_organization": "string or null",
-                "date_issued": "string or null"
-            }
-        ],
-        "achievements": [
-            {
-                "title": "string or null",
-                "description": "string or null"
-            }
-        ],
-        "total_experience": "float or null",
-        "relevant_experience": "dict or null"
-    }
-
-    prompt_content = (
-        "You are a structured JSON generator. Convert the provided resume text into a JSON object "
-        f"matching the following schema: {json.dumps(schema, indent=2)}. "
-        "### Instructions:\n"
-        "1. **Strict Schema Adherence**: Ensure all fields are correctly structured. Use `null` for missing values.\n"
-        "2. **Education Extraction**: Only include the highest pursued degree with both full and short form (e.g., 'Master of Science (M.Sc)').\n"
-        "3. **Experience Handling**:\n"
-        "   - Capture all details, ensuring exact company location (if provided).\n"
-        "   - Convert all experience durations into a structured format.\n"
-        "   - Handle formats like 'Jan 2020 - Present', 'April 2019 - Nov 2021', '5 months'.\n"
-        "   - Convert months to years where applicable (e.g., '2 years 3 months' → 2.25 years).\n"
-        "   - If the end date is 'present', 'till, 'current', 'now', 'ongoing', 'on-going', 'till now' calculate experience up to today's date (17/03/2025).\n"
-        "4. **Total Experience Calculation**:\n"
-        "   - Ensure no double counting of overlapping job durations.\n"
-        "   - Accurately compute total experience as a numeric value.\n"
-        "5. **Relevant Experience Calculation**:\n"
-        "   - Compute and map total duration per job title into `relevant_experience`.\n"
-        "   - Example:\n"
-        "     ```json\n"
-        "     \"total_experience\": 4.8,\n"
-        "     \"relevant_experience\": {\n"
-        "         \"Sr. Technical Lead\": 0.1,\n"
-        "         \"Senior Python Developer\": 1.1,\n"
-        "         \"Software Developer\": 3.6\n"
-        "     }\n"
-        "     ```\n"
-        "6. **Ensure Data Integrity**:\n"
-        "   - Extract all resume details without omitting any relevant information.\n"
-        "   - Maintain correct company addresses, ensuring JSON validity.\n"
-        "   - Avoid unnecessary formatting errors or hallucinations.\n"
-    )
+    prompt_content = RESUME_PROMPT
 
     payload = {
         "model": "gpt-4o-mini",
@@ -241,60 +246,373 @@ def process_text_with_openai(api_key, extracted_text):
             {"role": "system", "content": prompt_content},
             {"role": "user", "content": f"Here is the extracted text from the resume:\n\n{extracted_text}"}
         ],
-        "max_tokens": 2000
+        "max_tokens": 2000,
+        "response_format": CANDIDATE_RESPONSE_FORMAT
     }
 
+    # Identical text under the same model and prompt/schema always extracts the same way
+    llm_cache = get_llm_cache()
+    cached_result = llm_cache.get_result(payload["model"], prompt_content, extracted_text)
+    if cached_result is not None:
+        metrics.inc("llm_cache_total", pipeline="cv", result="hit")
+        log_message("Using cached extraction result.", level=logging.DEBUG)
+        return cached_result
+    metrics.inc("llm_cache_total", pipeline="cv", result="miss")
+
     try:
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
-        
-        if response.status_code != 200:
-            log_message(f"Error: {response.status_code} - {response.text}")
-            return None
+        client = get_extraction_client(api_key)
+        content = client.chat_content(payload)
 
-        content = response.json()["choices"][0]["message"]["content"]
-        cleaned_content = content.strip("```json").strip("```").strip()
-        processed_data = json.loads(cleaned_content)
+        # A malformed response costs one short repair request instead of a full re-extraction
+        def repair(bad_content, error):
+            metrics.inc("llm_repairs_total", pipeline="cv")
+            log_message(f"Repairing invalid extraction response: {error.splitlines()[0]}", level=logging.WARNING)
+            return client.chat_content(repair_payload(payload, bad_content, error))
 
-        try:
-            candidate = Candidate(**processed_data)
-            return candidate.dict()
-        except ValidationError as e:
-            log_message(f"Validation error: {str(e)}")
+        candidate = validate_json(CandidateExtraction, content, repair=repair)
+        if candidate is None:
             return None
+        candidate = candidate.to_candidate()
+        llm_cache.put_result(payload["model"], prompt_content, extracted_text, candidate)
+        return candidate
 
     except Exception as e:
-        log_message(f"Error during OpenAI API call: {str(e)}")
+        log_message(f"Error during OpenAI API call: {str(e)}", level=logging.ERROR)
         return None
 
-def process_pdfs_to_nested_json(drive_service, folder_id, output_file):
-    start_time = time.time()
-    log_message("Processing PDFs in Google Drive folder.", start_time)
-    files = list_files_in_folder(drive_service, folder_id)
+# Batched mode: short CVs share one request (and one copy of the long system prompt)
+BATCH_TOKEN_BUDGET = 6000
+BATCH_MAX_DOCUMENTS = 8
+SHORT_DOCUMENT_TOKENS = 1500
+BATCH_OUTPUT_TOKENS_PER_DOCUMENT = 2000
+# gpt-4o-mini's completion limit
+MAX_OUTPUT_TOKENS = 16000
+
+BATCH_PROMPT = RESUME_PROMPT + (
+    "\n### Multiple Resumes:\n"
+    "The user message contains several resumes, each starting with a line `=== DOCUMENT <id> ===`.\n"
+    "Extract each resume independently and respond with a single JSON object of the form\n"
+    "{\"results\": [{\"id\": \"<id>\", \"candidate\": <resume JSON in the format above>}]}\n"
+    "with exactly one entry per document, using the ids exactly as given.\n"
+)
+
+
+def estimate_text_tokens(text):
+    """Rough token count (~4 characters per token) used to pack batches."""
+    return len(text) // 4 + 1
+
+
+def process_texts_with_openai_batched(api_key, documents):
+    """Extract several resumes in one request.
+
+    `documents` maps an ID to extracted text; returns {id: candidate dict or None}. Results
+    are cached per document under the single-document prompt, so batched and unbatched
+    runs share cache entries. Documents missing from the response or failing validation
+    are retried one at a time with process_text_with_openai.
+    """
+    model = "gpt-4o-mini"
+    llm_cache = get_llm_cache()
+    results = {}
+    pending = {}
+    for doc_id, text in documents.items():
+        cached_result = llm_cache.get_result(model, RESUME_PROMPT, text)
+        if cached_result is not None:
+            metrics.inc("llm_cache_total", pipeline="cv", result="hit")
+            results[doc_id] = cached_result
+        else:
+            pending[doc_id] = text
+
+    if len(pending) == 1:
+        doc_id, text = next(iter(pending.items()))
+        results[doc_id] = process_text_with_openai(api_key, text)
+        return results
+    if not pending:
+        return results
+
+    metrics.inc("llm_cache_total", len(pending), pipeline="cv", result="miss")
+    metrics.inc("llm_batches_total", pipeline="cv")
+    metrics.inc("llm_batched_documents_total", len(pending), pipeline="cv")
+    log_message(f"Processing a batch of {len(pending)} resumes with OpenAI API.", level=logging.DEBUG)
+    user_content = "Here is the extracted text from the resumes:\n\n" + "\n\n".join(
+        f"=== DOCUMENT {doc_id} ===\n{text}" for doc_id, text in pending.items()
+    )
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": BATCH_PROMPT},
+            {"role": "user", "content": user_content}
+        ],
+        "max_tokens": min(BATCH_OUTPUT_TOKENS_PER_DOCUMENT * len(pending), MAX_OUTPUT_TOKENS),
+        "response_format": CANDIDATE_BATCH_RESPONSE_FORMAT
+    }
+
+    entries = []
+    try:
+        content = get_extraction_client(api_key).chat_content(payload)
+        batch = validate_json(CandidateBatch, content)
+        if batch is not None:
+            entries = [(entry.id, entry.candidate) for entry in batch.results]
+        else:
+            # Salvage the entries that do validate; the rest are retried individually below
+            data = json.loads(repair_json(content))
+            entries = [(str(entry.get("id")), entry.get("candidate"))
+                       for entry in data.get("results") or [] if isinstance(entry, dict)]
+    except Exception as e:
+        log_message(f"Error during batched OpenAI API call: {str(e)}", level=logging.ERROR)
 
-    if not files:
-        log_message("No PDF files found in the folder.", start_time)
+    for doc_id, candidate in entries:
+        if doc_id not in pending or doc_id in results or candidate is None:
+            continue
+        try:
+            if not isinstance(candidate, CandidateExtraction):
+                candidate = CandidateExtraction.model_validate(candidate)
+        except ValueError as e:
+            log_message(f"Validation error for document {doc_id} in batch: {str(e)}", level=logging.WARNING)
+            continue
+        candidate = candidate.to_candidate()
+        llm_cache.put_result(model, RESUME_PROMPT, pending[doc_id], candidate)
+        results[doc_id] = candidate
+
+    retries = [doc_id for doc_id in pending if doc_id not in results]
+    if retries:
+        metrics.inc("llm_batch_retries_total", len(retries), pipeline="cv")
+        log_message(f"Retrying {len(retries)} of {len(pending)} batched resumes individually.")
+    for doc_id in retries:
+        results[doc_id] = process_text_with_openai(api_key, pending[doc_id])
+    return results
+
+@metrics.scoped
+def process_pdfs_to_nested_json(drive_service, folder_id, output_file, ocr_workers=None, llm_workers=None, queue_size=8,
+                                manifest_path=None, batch_llm=False, batch_token_budget=BATCH_TOKEN_BUDGET,
+                                batch_max_documents=BATCH_MAX_DOCUMENTS, metrics_path=DEFAULT_METRICS_PATH,
+                                raster_options=DEFAULT_RASTER_OPTIONS, download_workers=DOWNLOAD_WORKERS,
+                                download_budget_bytes=DOWNLOAD_BUDGET_BYTES, dedup_path=DEFAULT_DEDUP_PATH):
+    """Download, parse, OCR and extract every CV in the folder as overlapping pipeline stages.
+
+    Any document type in the extractors registry is processed (PDF, DOCX, DOC, RTF, images,
+    plain text and Google Docs); the type is sniffed from the downloaded bytes, and
+    documents of any other type are counted as unsupported and skipped. OCR runs
+    page-by-page in a process pool of `ocr_workers` (defaults to all cores) and LLM
+    extraction in `llm_workers` threads (defaults to the shared LLM client's concurrency).
+    Stages are connected by queues of `queue_size` so downloads never run far ahead of OCR.
+    `download_workers` threads fetch files in parallel, each with its own Drive connection,
+    while at most `download_budget_bytes` of downloaded files wait to be parsed; files over
+    SPILL_TO_DISK_BYTES are downloaded to a temp file and memory-mapped instead of read into RAM.
+    Each OCR worker rasterizes its own page at `raster_options` DPI/grayscale, so page images
+    never pile up in memory; pages outside its page range or cap are not OCR'd.
+
+    When `output_file` ends in .jsonl each candidate is appended as soon as it is extracted,
+    and a restarted run skips the Drive files that already finished.
+
+    With a `manifest_path`, only files that are new or changed since they were last processed
+    are downloaded; a .json output is merged with the existing file by source_id, so it
+    still holds every candidate.
+
+    Identical files (by bytes or normalized text) and near-duplicate CVs (MinHash/LSH) are
+    resolved to the first copy seen before OCR/LLM extraction and get a copy of its record
+    under their own source_id once it is saved. A duplicate is only checkpointed with that
+    record, so if the first copy fails the duplicate is retried by the next run. Copies whose
+    records were saved are kept in `dedup_path` (None to disable) for later runs.
+
+    With `batch_llm`, CVs under SHORT_DOCUMENT_TOKENS are packed into shared extraction
+    requests of up to `batch_max_documents` documents and `batch_token_budget` tokens;
+    longer CVs are still extracted one per request.
+
+    Every stage is timed and documents, pages, tokens, retries and cache hits are counted
+    in the shared metrics registry and in this run's own scope; the run's per-stage summary is
+    logged at the end and, with a `metrics_path` (default $METRICS_PATH), written as JSON or
+    Prometheus text (.prom).
+    """
+    start_time = time.time()
+    log_message("Processing CVs in Google Drive folder.")
+    source = DriveSource(drive_service, folder_id)
+    manifest = SyncManifest(manifest_path, source=f"drive:{folder_id}") if manifest_path else None
+    files = list_files_in_folder(drive_service, folder_id, manifest)
+    documents = [file for file in files if source.is_supported(file)]
+
+    if not documents:
+        log_message("No supported documents found in the folder.")
         return
 
+    writer = JsonlWriter(output_file) if is_jsonl_path(output_file) else None
+    # The sync manifest is version-aware, so it supersedes the per-file checkpoint
+    if writer and not manifest:
+        pending_files = [file for file in documents if not writer.is_done(file['id'])]
+        log_message(f"Resuming: {len(documents) - len(pending_files)} files already processed.")
+        documents = pending_files
+
     aggregated_data = {"candidates": []}
+    llm_workers = llm_workers or get_extraction_client(OPENAI_API_KEY).concurrency
+    fast_path_stats = FastPathStats()
+    deduplicator = Deduplicator(path=dedup_path)
+    batcher = TokenBatcher(batch_token_budget, batch_max_documents) if batch_llm else None
+    download_budget = ByteBudget(download_budget_bytes)
+
+    def release_duplicates(file):
+        # Duplicates held for a file that produced no record stay unsynced for the next run
+        waiting = deduplicator.record_failure(file['id'])
+        while waiting:
+            duplicate = waiting.pop()
+            log_message(f"Leaving {duplicate['name']} for the next run: its first copy {file['name']} failed.",
+                        level=logging.WARNING)
+            waiting.extend(deduplicator.record_failure(duplicate['id']))
+
+    def record_failure(file):
+        metrics.inc("documents_total", pipeline="cv", outcome="failed")
+        log_message(f"No candidate extracted from {file['name']}.", level=logging.WARNING)
+        release_duplicates(file)
+
+    def record_unsupported(file):
+        metrics.inc("documents_total", pipeline="cv", outcome="unsupported")
+        log_message(f"Skipping {file['name']}: unsupported content ({file.get('mimeType')}).", level=logging.WARNING)
+        release_duplicates(file)
+
+    def record_duplicate(file, primary_id):
+        metrics.inc("documents_total", pipeline="cv", outcome="duplicate")
+        candidate_data = deduplicator.wait_for(primary_id, file)
+        if candidate_data is None:
+            log_message(f"Holding {file['name']}: duplicate of file {primary_id}, which is still in progress.")
+            return
+        log_message(f"Reusing the record of file {primary_id} for duplicate {file['name']}.")
+        write_record(file, candidate_data)
+
+    def write_record(file, candidate_data):
+        # Called from the consumer and from worker threads (duplicates); the writer and manifest lock
+        if writer:
+            writer.write(candidate_data, source_id=file['id'])
+        else:
+            aggregated_data["candidates"].append({**candidate_data, "source_id": file['id']})
+        if manifest:
+            manifest.mark_synced(file['id'], drive_file_version(file), file['name'])
+        # Duplicates held for this file (or for a duplicate of it) get the same record
+        for duplicate in deduplicator.record_result(file['id'], candidate_data):
+            log_message(f"Reusing the record of file {file['id']} for duplicate {duplicate['name']}.")
+            write_record(duplicate, candidate_data)
 
-    for file in files:
-        if file['mimeType'] == 'application/pdf':
-            log_message(f"Processing PDF: {file['name']}", start_time)
-            file_stream = download_file_as_bytes(drive_service, file['id'])
-            if file_stream:
-                images = pdf_bytes_to_images(file_stream)
-                if images:
-                    extracted_text = " ".join([extract_text_from_image(image) for image in images])
-                    candidate_data = process_text_with_openai(OPENAI_API_KEY, extracted_text)
-                    if candidate_data:
-                        aggregated_data["candidates"].append(candidate_data)
+    try:
+        with OCRPool(ocr_workers) as ocr_pool:
+            extraction_context = ExtractionContext(ocr_pool, raster_options, fast_path_stats)
+
+            def download(file):
+                log_message(f"Processing: {file['name']}")
+                # Google Docs exports report no size, so they reserve one chunk
+                reserved = download_budget.acquire(source.size(file) or source.chunk_size)
+                file_stream = source.open(file)
+                if not file_stream:
+                    download_budget.release(reserved)
+                    record_failure(file)
+                    return None
+                return file, file_stream, reserved
+
+            def parse(item):
+                # Text layers, DOCX, DOC, RTF and plain text are extracted here; scanned PDF
+                # pages and images are queued on the OCR pool and resolved in the next stage
+                file, file_stream, reserved = item
+                try:
+                    primary_id = deduplicator.check_stream(file['id'], file_stream)
+                    if primary_id:
+                        record_duplicate(file, primary_id)
+                        return None
+                    content_type, parts = start_extraction(file_stream, extraction_context, source.declared_mime(file))
+                except Exception as e:
+                    log_message(f"Error extracting text from {file['name']}: {e}", level=logging.ERROR)
+                    record_failure(file)
+                    return None
+                finally:
+                    # Everything needed from the download is now in text, OCR futures or their temp files
+                    file_stream.close()
+                    download_budget.release(reserved)
+                if content_type is None:
+                    record_unsupported(file)
+                    return None
+                return file, parts
+
+            def ocr(item):
+                file, parts = item
+                extracted_text = resolve_parts(parts)
+                if not extracted_text:
+                    record_failure(file)
+                    return None
+                return file, extracted_text
+
+            def extract(item):
+                file, extracted_text = item
+                primary_id = deduplicator.check_text(file['id'], extracted_text)
+                if primary_id:
+                    record_duplicate(file, primary_id)
+                    return None
+                if batcher:
+                    tokens = estimate_text_tokens(extracted_text)
+                    if tokens <= SHORT_DOCUMENT_TOKENS:
+                        batch = batcher.add((file, extracted_text), tokens)
+                        return extract_batch(batch) if batch else None
+                candidate_data = process_text_with_openai(OPENAI_API_KEY, extracted_text)
+                if not candidate_data:
+                    record_failure(file)
+                    return None
+                return [(file, candidate_data)]
+
+            def extract_batch(batch):
+                results = process_texts_with_openai_batched(
+                    OPENAI_API_KEY, {file['id']: text for file, text in batch}
+                )
+                for file, _ in batch:
+                    if not results.get(file['id']):
+                        record_failure(file)
+                return [(file, results[file['id']]) for file, _ in batch if results.get(file['id'])]
+
+            def save(file, candidate_data):
+                metrics.inc("documents_total", pipeline="cv", outcome="extracted")
+                write_record(file, candidate_data)
+
+            stages = [
+                ("download", download, download_workers),
+                ("parse", parse, 2),
+                ("ocr", ocr, 2),
+                ("extract", extract, llm_workers),
+            ]
+            for extracted in run_pipeline(documents, stages, queue_size=queue_size, metrics=metrics):
+                for file, candidate_data in extracted:
+                    save(file, candidate_data)
+            # Short CVs still waiting for a batch to fill once the input ran out
+            remaining = batcher.flush() if batcher else []
+            if remaining:
+                with metrics.timer("extract"):
+                    extracted = extract_batch(remaining)
+                for file, candidate_data in extracted:
+                    save(file, candidate_data)
+    finally:
+        if writer:
+            writer.close()
+        if manifest:
+            manifest.close()
+        held = deduplicator.held_count()
+        if held:
+            log_message(f"{held} duplicates are left for the next run: their first copy was not extracted.",
+                        level=logging.WARNING)
+        deduplicator.close()
+
+    log_message(fast_path_stats.summary())
+    log_message(deduplicator.summary())
+    cache_stats = get_llm_cache().stats()
+    log_message(f"LLM cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                f"({cache_stats['hit_rate']:.0%} hit rate).")
+    log_message(f"Stage timings:\n{metrics.current().stage_summary()}")
+    if metrics_path:
+        metrics.current().export(metrics_path)
+        log_message(f"Metrics written to {metrics_path}.")
+    if writer:
+        log_message(f"Candidates streamed to {output_file}.", start_time)
+        return
 
     try:
+        if manifest:
+            aggregated_data["candidates"] = merge_records(output_file, aggregated_data["candidates"])
         with open(output_file, 'w') as json_file:
             json.dump(aggregated_data, json_file, indent=4)
         log_message(f"Aggregated data saved to {output_file}.", start_time)
     except Exception as e:
-        log_message(f"Error saving aggregated data: {str(e)}", start_time)
+        log_message(f"Error saving aggregated data: {str(e)}", level=logging.ERROR)
 
 if __name__ == "__main__":
     credentials_path = "/Users/vinayaksharma/Documents/CV-Testing/securitykey.json"
@@ -305,4 +623,4 @@ if __name__ == "__main__":
         drive_service = authenticate_to_drive(credentials_path)
         process_pdfs_to_nested_json(drive_service, drive_folder_id, output_file_path)
     except Exception as e:
-        log_message(f"Error in main execution: {str(e)}")
+        log_message(f"Error in main execution: {str(e)}", level=logging.ERROR)
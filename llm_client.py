@@ -0,0 +1,220 @@
+import os
+import time
+import random
+import asyncio
+import threading
+
+import aiohttp
+
+from metrics import metrics
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+
+# Defaults sized for gpt-4o-mini on a tier-1 key; override through the environment
+DEFAULT_RPM = int(os.getenv("OPENAI_RPM", "500"))
+DEFAULT_TPM = int(os.getenv("OPENAI_TPM", "200000"))
+DEFAULT_CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", "10"))
+
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class ExtractionError(Exception):
+    """Raised when a chat completion fails after all retries."""
+
+
+def estimate_request_tokens(payload):
+    """Rough token cost of a chat request: prompt characters / 4 plus the completion budget."""
+    prompt_chars = sum(len(str(message.get("content", ""))) for message in payload.get("messages", []))
+    return prompt_chars // 4 + payload.get("max_tokens", 0)
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at `per_minute` units per minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount=1):
+        # A single request larger than the bucket would wait forever; clamp it to a full bucket
+        amount = min(float(amount), self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class ExtractionClient:
+    """Async chat-completions client with a pooled connection, rate limits and retries.
+
+    Requests are limited by a requests/min and a tokens/min bucket and by `concurrency`
+    in-flight requests. 429/5xx responses and network errors are retried with jittered
+    exponential backoff, honouring Retry-After when the server sends it. `base_url` can
+    point at a local mock server for testing.
+    """
+
+    def __init__(self, api_key, base_url=OPENAI_BASE_URL, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM,
+                 concurrency=DEFAULT_CONCURRENCY, max_retries=5, timeout=120, backoff_base=1.0, backoff_max=60.0):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.rpm = rpm
+        self.tpm = tpm
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retries = 0
+        self._session = None
+        self._semaphore = None
+        self._request_bucket = None
+        self._token_bucket = None
+
+    def _ensure_session(self):
+        # Created lazily so everything binds to the loop the client is first used on
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"},
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._request_bucket = TokenBucket(self.rpm)
+            self._token_bucket = TokenBucket(self.tpm)
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            try:
+                return float(retry_after) + random.uniform(0, 1)
+            except ValueError:
+                pass
+        # Full jitter: sleep anywhere between 0 and the exponential cap
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def chat(self, payload):
+        """POST a chat completion and return the decoded JSON response."""
+        self._ensure_session()
+        url = f"{self.base_url}/chat/completions"
+        cost = estimate_request_tokens(payload)
+        started = time.perf_counter()
+        try:
+            return await self._post_with_retries(url, payload, cost)
+        finally:
+            metrics.observe("llm_request_seconds", time.perf_counter() - started, model=payload.get("model"))
+
+    @staticmethod
+    def _record_usage(model, usage):
+        metrics.inc("llm_requests_total", model=model)
+        metrics.inc("llm_prompt_tokens_total", usage.get("prompt_tokens", 0), model=model)
+        metrics.inc("llm_completion_tokens_total", usage.get("completion_tokens", 0), model=model)
+
+    async def _post_with_retries(self, url, payload, cost):
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            await self._request_bucket.acquire(1)
+            await self._token_bucket.acquire(cost)
+            retry_after = None
+            try:
+                async with self._semaphore:
+                    async with self._session.post(url, json=payload) as response:
+                        if response.status == 200:
+                            data = await response.json()
+                            self._record_usage(payload.get("model"), data.get("usage") or {})
+                            return data
+                        body = await response.text()
+                        last_error = ExtractionError(f"{response.status} - {body[:500]}")
+                        if response.status not in RETRYABLE_STATUSES:
+                            raise last_error
+                        retry_after = response.headers.get("Retry-After")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_error = ExtractionError(f"Network error: {e}")
+
+            if attempt < self.max_retries:
+                self.retries += 1
+                metrics.inc("llm_retries_total")
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+
+        raise last_error
+
+    async def chat_content(self, payload):
+        """Return the first choice's message content of a chat completion.
+
+        A structured-output refusal or a choice without content (e.g. filtered) raises
+        ExtractionError like any other failed extraction.
+        """
+        response = await self.chat(payload)
+        choices = response.get("choices") or []
+        if not choices:
+            raise ExtractionError("OpenAI API returned an empty response.")
+        message = choices[0].get("message") or {}
+        if message.get("refusal"):
+            metrics.inc("llm_refusals_total")
+            raise ExtractionError(f"Model refused the request: {message['refusal']}")
+        if message.get("content") is None:
+            raise ExtractionError(f"OpenAI API returned no content (finish_reason={choices[0].get('finish_reason')}).")
+        return message["content"]
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class ThreadedExtractionClient:
+    """Runs an ExtractionClient on a background event loop so threaded pipelines can share it."""
+
+    def __init__(self, client):
+        self.client = client
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-client", daemon=True)
+        self._thread.start()
+
+    @property
+    def concurrency(self):
+        return self.client.concurrency
+
+    def submit(self, payload):
+        """Schedule a chat completion and return a concurrent.futures.Future of its content.
+
+        Its request and token counts are recorded in the caller's run scope as well.
+        """
+        return asyncio.run_coroutine_threadsafe(metrics.bind_scope(self.client.chat_content(payload)), self._loop)
+
+    def chat_content(self, payload):
+        """Blocking call that returns the completion's message content."""
+        return self.submit(payload).result()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.client.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_extraction_client(api_key, **kwargs):
+    """Shared threaded client per API key, so every pipeline thread uses one connection pool."""
+    with _clients_lock:
+        if api_key not in _clients:
+            _clients[api_key] = ThreadedExtractionClient(ExtractionClient(api_key, **kwargs))
+        return _clients[api_key]
+
+
+def close_extraction_clients():
+    """Close every shared client's connection pool and event loop (e.g. before exit)."""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
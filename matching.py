@@ -0,0 +1,186 @@
+import re
+import json
+import time
+import argparse
+
+import numpy as np
+
+from json_stream import iter_records
+from process_embeddings import PineconeLoader, embed_texts, location_tokens
+from skill_index import SkillVocabulary
+from candidate_ids import stable_candidate_id
+from sqlite_cache import EmbeddingCache
+from metrics import get_logger
+
+logger = get_logger("matching")
+
+# Weight of the skill-overlap ratio added to the cosine similarity when ranking
+SKILL_WEIGHT = 0.2
+# JDs scored per matrix multiply; bounds the (jds x candidates) score block in memory
+JD_BLOCK_SIZE = 256
+
+
+def parse_min_experience(text):
+    """Minimum years from a JD experience string like '3-5 years', '5+ yrs' or 'minimum 2 years'."""
+    if not text:
+        return 0.0
+    numbers = re.findall(r"\d+(?:\.\d+)?", str(text))
+    return float(numbers[0]) if numbers else 0.0
+
+
+# Shared alias table, so "py" in a JD matches "Python" on a CV
+normalize_skill = SkillVocabulary().normalize
+
+
+def jd_to_text(jd):
+    """Text embedded for a JD, built like the candidate text so both live in one space."""
+    return PineconeLoader.combine_all_sections({
+        "skills": jd.get("skills") or [],
+        "experience": [{"job_title": jd.get("role"), "responsibilities": jd.get("key_responsibilities") or []}],
+        "education": jd.get("qualifications") or [],
+        "total_experience": jd.get("experience"),
+    }) + f"job_description: {jd.get('job_description') or ''}\n"
+
+
+def _normalized(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class CandidateMatrix:
+    """Candidate embeddings plus precomputed filter columns for vectorized matching.
+
+    Holds a row-normalized (n x d) float32 embedding matrix, a total_experience column
+    (NaN where the CV doesn't state it), lowercased addresses for location filters, and a skill -> candidate-rows posting
+    list so skill overlap for a JD is one bincount.
+    """
+
+    def __init__(self, ids, embeddings, experience, addresses, skills):
+        self.ids = ids
+        self.embeddings = _normalized(embeddings)
+        self.experience = np.asarray(experience, dtype=np.float32)
+        self.addresses = addresses
+        self.skill_rows = {}
+        for row, candidate_skills in enumerate(skills):
+            for skill in candidate_skills:
+                self.skill_rows.setdefault(skill, []).append(row)
+        self.skill_rows = {skill: np.asarray(rows, dtype=np.int64) for skill, rows in self.skill_rows.items()}
+        self._location_masks = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_candidates(cls, candidates, embedding_model="text-embedding-3-small", cache=None):
+        ids, texts, experience, addresses, skills = [], [], [], [], []
+        for candidate in candidates:
+            ids.append(stable_candidate_id(candidate))
+            texts.append(PineconeLoader.combine_all_sections(candidate))
+            total_experience = candidate.get("total_experience")
+            experience.append(np.nan if total_experience is None else total_experience)
+            addresses.append(((candidate.get("personal_info") or {}).get("address") or "").lower())
+            skills.append({normalize_skill(s) for s in candidate.get("skills") or []})
+        # Candidates embedded during ingest come straight from the embedding cache
+        embeddings = embed_texts(texts, embedding_model, cache) if texts else np.zeros((0, 1536))
+        return cls(ids, embeddings, experience, addresses, skills)
+
+    def skill_overlap(self, jd_skills):
+        """Number of the JD's skills each candidate has."""
+        rows = [self.skill_rows[s] for s in jd_skills if s in self.skill_rows]
+        if not rows:
+            return np.zeros(len(self), dtype=np.int64)
+        return np.bincount(np.concatenate(rows), minlength=len(self))
+
+    def location_mask(self, tokens):
+        key = frozenset(tokens)
+        if key not in self._location_masks:
+            self._location_masks[key] = np.fromiter(
+                (any(token in address for token in tokens) for address in self.addresses),
+                dtype=bool, count=len(self),
+            )
+        return self._location_masks[key]
+
+
+def match_jds(jds, candidate_matrix, jd_embeddings, top_k=50, min_skill_overlap=0,
+              require_location=False, experience_slack=0.0):
+    """Rank candidates for every JD.
+
+    Similarity for a block of JDs is a single (jds x d) @ (d x candidates) product. The
+    experience, skill and location filters are boolean masks over precomputed columns,
+    and the final score is cosine similarity plus SKILL_WEIGHT times the fraction of
+    the JD's skills the candidate has. Candidates with unknown experience pass the
+    experience filter rather than being treated as having none.
+    """
+    jd_matrix = _normalized(jd_embeddings)
+    results = []
+    for start in range(0, len(jds), JD_BLOCK_SIZE):
+        block = jds[start:start + JD_BLOCK_SIZE]
+        similarities = jd_matrix[start:start + JD_BLOCK_SIZE] @ candidate_matrix.embeddings.T
+        for jd, similarity in zip(block, similarities):
+            jd_skills = {normalize_skill(s) for s in jd.get("skills") or []}
+            overlap = candidate_matrix.skill_overlap(jd_skills)
+            min_experience = parse_min_experience(jd.get("experience")) - experience_slack
+            mask = np.isnan(candidate_matrix.experience) | (candidate_matrix.experience >= min_experience)
+            if min_skill_overlap:
+                mask &= overlap >= min_skill_overlap
+            tokens = location_tokens(jd.get("location"))
+            if require_location and tokens:
+                mask &= candidate_matrix.location_mask(tokens)
+
+            scores = similarity + SKILL_WEIGHT * overlap / max(len(jd_skills), 1)
+            scores = np.where(mask, scores, -np.inf)
+            k = min(top_k, int(mask.sum()))
+            top = np.argpartition(-scores, k - 1)[:k] if k else np.array([], dtype=np.int64)
+            top = top[np.argsort(-scores[top])]
+            results.append({
+                "role": jd.get("role"),
+                "location": jd.get("location"),
+                "shortlist": [
+                    {
+                        "candidate_id": candidate_matrix.ids[row],
+                        "score": round(float(scores[row]), 4),
+                        "similarity": round(float(similarity[row]), 4),
+                        "skill_overlap": int(overlap[row]),
+                        "total_experience": (None if np.isnan(candidate_matrix.experience[row])
+                                             else float(candidate_matrix.experience[row])),
+                    }
+                    for row in top
+                ],
+            })
+    return results
+
+
+def run_matching(jd_path, candidates_path, output_path, top_k=50, embedding_model="text-embedding-3-small", **filters):
+    """Embed every JD once, score it against all candidates and write a ranked shortlist per JD."""
+    start_time = time.time()
+    cache = EmbeddingCache()
+    jds = list(iter_records(jd_path, key="job_descriptions"))
+    candidate_matrix = CandidateMatrix.from_candidates(iter_records(candidates_path, key="candidates"),
+                                                       embedding_model, cache)
+    jd_embeddings = embed_texts([jd_to_text(jd) for jd in jds], embedding_model, cache) if jds else []
+    results = match_jds(jds, candidate_matrix, jd_embeddings, top_k=top_k, **filters) if jds else []
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump({"matches": results}, f, indent=4)
+    logger.info(f"Matched {len(jds)} JDs against {len(candidate_matrix)} candidates "
+                f"in {time.time() - start_time:.2f} seconds; saved to {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rank candidates for every job description.")
+    parser.add_argument("jd_path", help="JD JSON/JSONL file produced by jd.py")
+    parser.add_argument("candidates_path", help="Candidate JSON/JSONL file produced by latest.py")
+    parser.add_argument("-o", "--output", default="shortlists.json")
+    parser.add_argument("--top-k", type=int, default=50)
+    parser.add_argument("--min-skill-overlap", type=int, default=0)
+    parser.add_argument("--require-location", action="store_true")
+    parser.add_argument("--experience-slack", type=float, default=0.0,
+                        help="Years below the JD minimum that are still accepted")
+    args = parser.parse_args()
+
+    run_matching(
+        args.jd_path, args.candidates_path, args.output, top_k=args.top_k,
+        min_skill_overlap=args.min_skill_overlap, require_location=args.require_location,
+        experience_slack=args.experience_slack,
+    )
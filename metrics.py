@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import bisect
+import logging
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+DEFAULT_METRICS_PATH = os.getenv("METRICS_PATH")
+# Latency buckets in seconds, from a cache hit to a slow OCR'd multi-page CV
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+LOG_FORMAT = "[%(asctime)s] %(message)s"
+LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Run registries that also receive what the process-wide registry records in this context (see Metrics.scope)
+_scopes = contextvars.ContextVar("metrics_scopes", default=())
+
+
+def get_logger(name=None):
+    """Pipeline logger writing timestamped lines to stderr (level from LOG_LEVEL, default INFO).
+
+    All module loggers are children of one "cv_automation" logger, configured on first use.
+    """
+    root = logging.getLogger("cv_automation")
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT))
+        root.addHandler(handler)
+        root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+        root.propagate = False
+    return root.getChild(name) if name else root
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus layout."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate a quantile by linear interpolation inside the bucket it falls in.
+
+        The estimate is clamped to the observed min and max, so a coarse bucket never reports
+        a latency no call actually had.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        estimate = self.max
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                estimate = lower + (upper - lower) * (rank - seen) / bucket_count
+                break
+            seen += bucket_count
+        return min(max(estimate, self.min), self.max)
+
+
+class Metrics:
+    """Thread-safe counters and latency histograms, keyed by name and labels.
+
+    Pipelines count documents, pages, tokens, retries and cache hits with inc(), and time
+    each stage with timer(stage); the result can be exported as JSON or Prometheus text.
+    With `forward_to_scopes` everything recorded is also copied into the run scopes active
+    in the caller's context, so one run's summary isn't mixed with other runs in the process.
+    """
+
+    def __init__(self, forward_to_scopes=False):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.started = time.time()
+        self._forward = forward_to_scopes
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        if self._forward:
+            for scope in _scopes.get():
+                scope.inc(name, value, **labels)
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+        if self._forward:
+            for scope in _scopes.get():
+                scope.observe(name, value, **labels)
+
+    @contextmanager
+    def timer(self, stage, **labels):
+        """Time a block as one call of `stage`; failed calls are also counted as errors."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("stage_errors_total", stage=stage, **labels)
+            raise
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, stage=stage, **labels)
+
+    def counter(self, name, **labels):
+        return self.counters.get((name, _label_key(labels)), 0)
+
+    @contextmanager
+    def scope(self):
+        """Collect what is recorded in this context into a fresh registry for one run or job.
+
+        Threads only take part if they run in a copy of the caller's context
+        (contextvars.copy_context().run); coroutines on another loop via bind_scope().
+        """
+        run_metrics = Metrics()
+        token = _scopes.set(_scopes.get() + (run_metrics,))
+        try:
+            yield run_metrics
+        finally:
+            _scopes.reset(token)
+
+    def scoped(self, func):
+        """Decorator giving every call of `func` its own run scope; see current()."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.scope():
+                return func(*args, **kwargs)
+        return wrapper
+
+    def current(self):
+        """The innermost run scope in this context, or this registry outside any run."""
+        scopes = _scopes.get()
+        return scopes[-1] if scopes else self
+
+    def bind_scope(self, coro):
+        """Wrap `coro` so it records into the caller's run scopes when it runs on another thread's loop."""
+        scopes = _scopes.get()
+
+        async def run():
+            # A task runs in its own copy of the context, so this doesn't leak to other tasks
+            _scopes.set(scopes)
+            return await coro
+        return run()
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "uptime_seconds": time.time() - self.started,
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "histograms": [
+                    {
+                        "name": name, "labels": dict(labels), "count": h.count, "sum": h.sum,
+                        "p50": h.quantile(0.5), "p90": h.quantile(0.9), "p99": h.quantile(0.99),
+                    }
+                    for (name, labels), h in sorted(self.histograms.items())
+                ],
+            }
+
+    def to_prometheus(self):
+        """Render the metrics in the Prometheus text exposition format."""
+        def render_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{str(v)}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{render_labels(labels)} {value}")
+            for (name, labels), h in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, bucket_count in zip(list(h.buckets) + ["+Inf"], h.counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{render_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{render_labels(labels)} {h.sum}")
+                lines.append(f"{name}_count{render_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """Write the metrics to `path`: Prometheus text for .prom/.txt, JSON otherwise."""
+        content = (self.to_prometheus() if path.endswith((".prom", ".txt"))
+                   else json.dumps(self.snapshot(), indent=2))
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def stage_summary(self):
+        """One line per timed stage: calls, total seconds and p50/p99 latency."""
+        lines = []
+        for entry in self.snapshot()["histograms"]:
+            if entry["name"] != "stage_seconds":
+                continue
+            labels = dict(entry["labels"])
+            stage = labels.pop("stage", None)
+            if labels:
+                stage = f"{stage} ({', '.join(f'{k}={v}' for k, v in sorted(labels.items()))})"
+            lines.append(
+                f"{stage}: {entry['count']} calls, {entry['sum']:.2f}s total, "
+                f"p50 {entry['p50']:.3f}s, p99 {entry['p99']:.3f}s"
+            )
+        return "\n".join(lines)
+
+
+# Process-wide registry shared by the CV, JD and indexing pipelines; each run also gets its own scope
+metrics = Metrics(forward_to_scopes=True)
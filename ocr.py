@@ -0,0 +1,129 @@
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pytesseract
+from PIL import Image, ImageSequence
+
+from metrics import get_logger
+from pdf_text import DEFAULT_RASTER_OPTIONS, rasterize_page_file
+
+try:
+    import tesserocr
+except ImportError:  # Optional: without it every page spawns a tesseract process via pytesseract
+    tesserocr = None
+
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+
+logger = get_logger("ocr")
+
+# Per-worker tesseract engine, loaded once by the pool initializer and reused for every page
+_engine = None
+
+
+def _init_worker(lang=OCR_LANG):
+    global _engine
+    if tesserocr is not None:
+        _engine = tesserocr.PyTessBaseAPI(lang=lang)
+
+
+def ocr_image(image):
+    """Run tesseract on a single page image. Module-level so worker processes can unpickle it."""
+    try:
+        if _engine is not None:
+            _engine.SetImage(image)
+            return _engine.GetUTF8Text()
+        return pytesseract.image_to_string(image, lang=OCR_LANG)
+    except Exception as e:
+        logger.error(f"Error extracting text from page: {e}")
+        return ""
+
+
+def ocr_image_bytes(data, options=DEFAULT_RASTER_OPTIONS):
+    """Decode and OCR an image file inside the worker; every frame of a multi-page TIFF is read."""
+    try:
+        image = Image.open(io.BytesIO(data))
+        texts = []
+        for frame in ImageSequence.Iterator(image):
+            texts.append(ocr_image(frame.convert("L") if options.grayscale else frame.convert("RGB")))
+        return " ".join(texts)
+    except Exception as e:
+        logger.error(f"Error reading image: {e}")
+        return ""
+
+
+def ocr_pdf_page(pdf_path, page_number, options=DEFAULT_RASTER_OPTIONS):
+    """Rasterize and OCR one page inside the worker, so page images never cross processes."""
+    try:
+        image = rasterize_page_file(pdf_path, page_number, options)
+    except Exception as e:
+        logger.error(f"Error rasterizing page {page_number}: {e}")
+        return ""
+    return ocr_image(image) if image is not None else ""
+
+
+class OCRPool:
+    """Process pool that spreads page-level OCR across all cores.
+
+    Workers live for the whole run. With tesserocr installed each worker keeps one
+    tesseract engine loaded instead of spawning a tesseract process per page.
+    """
+
+    def __init__(self, workers=None, lang=OCR_LANG):
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(lang,))
+
+    def submit_image_bytes(self, data, options=DEFAULT_RASTER_OPTIONS):
+        """Queue an image file (PNG, JPEG, TIFF, ...) for OCR and return its future."""
+        return self._executor.submit(ocr_image_bytes, data, options)
+
+    def submit_pdf_pages(self, pdf_data, page_numbers, options=DEFAULT_RASTER_OPTIONS):
+        """Queue pages of a PDF for rasterization + OCR and return the futures in page order.
+
+        The PDF is written once to a temporary file that workers rasterize from one page
+        at a time (first_page/last_page), so memory holds at most one page image per
+        worker; the file is removed when the last page finishes.
+        """
+        if not page_numbers:
+            return []
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+            f.write(pdf_data)
+            path = f.name
+        remaining = [len(page_numbers)]
+        lock = threading.Lock()
+
+        def page_done(_):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                os.remove(path)
+
+        futures = [self._executor.submit(ocr_pdf_page, path, number, options) for number in page_numbers]
+        for future in futures:
+            future.add_done_callback(page_done)
+        return futures
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_ocr_pool():
+    """Process-wide OCR pool for callers without their own (e.g. the JD worker threads)."""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = OCRPool()
+        return _shared_pool
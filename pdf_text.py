@@ -0,0 +1,183 @@
+import io
+import os
+import threading
+
+from pdf2image import convert_from_bytes, convert_from_path, pdfinfo_from_bytes
+
+from metrics import get_logger, metrics
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # Optional: without pypdf every page goes through OCR
+    PdfReader = None
+
+logger = get_logger("pdf_text")
+
+# A page's embedded text is used instead of OCR when it has at least this many
+# characters and most of them are readable
+MIN_PAGE_CHARS = 40
+MIN_READABLE_RATIO = 0.85
+
+# Rasterization for OCR: 200 DPI grayscale is plenty for tesseract on CV-sized text, and
+# pages beyond OCR_MAX_PAGES (e.g. the image pages of a 30-page portfolio) are skipped
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "1") != "0"
+OCR_MAX_PAGES = int(os.getenv("OCR_MAX_PAGES", "20"))
+
+
+def is_usable_text(text, min_chars=MIN_PAGE_CHARS):
+    """Heuristic check that a page's text layer is real text, not empty or garbled glyphs."""
+    stripped = text.strip()
+    if len(stripped) < min_chars:
+        return False
+    readable = sum(1 for ch in stripped if ch.isprintable() and ch != "�")
+    alnum = sum(1 for ch in stripped if ch.isalnum())
+    return readable / len(stripped) >= MIN_READABLE_RATIO and alnum / len(stripped) >= 0.5
+
+
+def probe_text_layer(pdf_data):
+    """Return the embedded text of every page, or None if the PDF can't be read without OCR."""
+    if PdfReader is None:
+        return None
+    try:
+        # A memory-mapped file is read in place rather than copied into a BytesIO
+        reader = PdfReader(pdf_data if hasattr(pdf_data, "read") else io.BytesIO(pdf_data))
+        return [page.extract_text() or "" for page in reader.pages]
+    except Exception as e:
+        logger.warning(f"Could not read PDF text layer, falling back to OCR: {e}")
+        return None
+
+
+def split_text_layer(pdf_data, stats=None):
+    """Split a PDF into pages with a usable text layer and pages that need OCR.
+
+    Returns (page_texts, ocr_pages, page_count): page_texts maps 1-based page numbers
+    to embedded text and ocr_pages lists the page numbers left for OCR. page_count is
+    None when the text layer could not be probed, in which case every page needs OCR.
+    """
+    texts = probe_text_layer(pdf_data)
+    if texts is None:
+        return {}, None, None
+
+    page_texts = {
+        number: text for number, text in enumerate(texts, start=1) if is_usable_text(text)
+    }
+    ocr_pages = [number for number in range(1, len(texts) + 1) if number not in page_texts]
+    if stats is not None:
+        stats.record(len(texts), len(page_texts))
+    return page_texts, ocr_pages, len(texts)
+
+
+def page_ranges(page_numbers):
+    """Collapse sorted page numbers into contiguous (first, last) ranges."""
+    ranges = []
+    for number in page_numbers:
+        if ranges and number == ranges[-1][1] + 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+    return [tuple(r) for r in ranges]
+
+
+class RasterOptions:
+    """How PDF pages are rasterized for OCR.
+
+    `dpi` and `grayscale` go straight to pdf2image (grayscale pages are a third of the
+    size of RGB ones). `first_page`/`last_page` restrict OCR to a page range and
+    `max_pages` caps how many pages of one document are OCR'd (0 means no cap).
+    """
+
+    def __init__(self, dpi=OCR_DPI, grayscale=OCR_GRAYSCALE, first_page=None, last_page=None,
+                 max_pages=OCR_MAX_PAGES):
+        self.dpi = dpi
+        self.grayscale = grayscale
+        self.first_page = first_page
+        self.last_page = last_page
+        self.max_pages = max_pages
+
+    def select(self, page_numbers):
+        """The page numbers that should actually be OCR'd."""
+        selected = [
+            number for number in page_numbers
+            if (self.first_page is None or number >= self.first_page)
+            and (self.last_page is None or number <= self.last_page)
+        ]
+        return selected[:self.max_pages] if self.max_pages else selected
+
+    def convert_kwargs(self):
+        return {"dpi": self.dpi, "grayscale": self.grayscale}
+
+
+DEFAULT_RASTER_OPTIONS = RasterOptions()
+
+
+def pdf_page_count(pdf_data):
+    """Number of pages according to poppler's pdfinfo, or None if the PDF can't be read."""
+    try:
+        return int(pdfinfo_from_bytes(pdf_data)["Pages"])
+    except Exception as e:
+        logger.warning(f"Could not read PDF page count: {e}")
+        return None
+
+
+def plan_ocr(pdf_data, options=DEFAULT_RASTER_OPTIONS, stats=None):
+    """Decide which pages come from the text layer and which need OCR.
+
+    Like split_text_layer, but the page count is always known (from pdfinfo when the text
+    layer can't be probed) and the OCR pages are filtered through `options`. Returns
+    (page_texts, ocr_pages, page_count); page_count is 0 for unreadable PDFs.
+    """
+    page_texts, ocr_pages, page_count = split_text_layer(pdf_data, stats)
+    if page_count is None:
+        page_count = pdf_page_count(pdf_data) or 0
+        ocr_pages = list(range(1, page_count + 1))
+    return page_texts, options.select(ocr_pages), page_count
+
+
+def rasterize_page_file(pdf_path, page_number, options=DEFAULT_RASTER_OPTIONS):
+    """Rasterize a single page of a PDF on disk (used inside OCR worker processes)."""
+    images = convert_from_path(pdf_path, first_page=page_number, last_page=page_number, **options.convert_kwargs())
+    return images[0] if images else None
+
+
+def rasterize_pages(pdf_data, page_numbers=None, options=None, **convert_kwargs):
+    """Rasterize only the given 1-based pages (all pages when page_numbers is None).
+
+    With `options`, its DPI/grayscale settings apply; extra convert_kwargs override them.
+    """
+    if options is not None:
+        convert_kwargs = {**options.convert_kwargs(), **convert_kwargs}
+    if page_numbers is None:
+        return convert_from_bytes(pdf_data, **convert_kwargs)
+    images = []
+    for first, last in page_ranges(page_numbers):
+        images.extend(convert_from_bytes(pdf_data, first_page=first, last_page=last, **convert_kwargs))
+    return images
+
+
+class FastPathStats:
+    """Thread-safe counters for how many pages were served from the text layer."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.documents = 0
+        self.documents_text_only = 0
+        self.pages = 0
+        self.text_layer_pages = 0
+
+    def record(self, pages, text_layer_pages):
+        with self._lock:
+            self.documents += 1
+            self.pages += pages
+            self.text_layer_pages += text_layer_pages
+            if pages and pages == text_layer_pages:
+                self.documents_text_only += 1
+        metrics.inc("pages_total", text_layer_pages, path="text_layer")
+        metrics.inc("pages_total", pages - text_layer_pages, path="ocr")
+
+    def summary(self):
+        page_rate = self.text_layer_pages / self.pages if self.pages else 0.0
+        return (
+            f"Text-layer fast path: {self.text_layer_pages}/{self.pages} pages ({page_rate:.0%}), "
+            f"{self.documents_text_only}/{self.documents} documents without OCR."
+        )
@@ -0,0 +1,114 @@
+import queue
+import threading
+import traceback
+import contextvars
+
+from metrics import get_logger
+
+logger = get_logger("pipeline")
+
+# Marks the end of the stream on a stage's input queue
+_DONE = object()
+
+
+def run_pipeline(items, stages, queue_size=8, metrics=None):
+    """Run items through overlapping stages connected by bounded queues.
+
+    `stages` is a list of (name, fn, workers). Each stage runs `workers` threads that call
+    fn(item) and pass the result downstream; returning None drops the item. Results of the
+    last stage are yielded as they are produced, so memory is bounded by the queue sizes
+    rather than the number of items.
+
+    With a `metrics` registry each call is timed as that stage (stage_seconds) and the items
+    a stage passes on or drops are counted (pipeline_items_total).
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+
+    def feed():
+        try:
+            for item in items:
+                queues[0].put(item)
+        except Exception as e:
+            logger.error(f"Error producing pipeline input: {e}")
+        finally:
+            queues[0].put(_DONE)
+
+    # Every thread runs in a copy of the caller's context, so metrics reach the caller's run scope
+    def start(target, name):
+        return threading.Thread(target=contextvars.copy_context().run, args=(target,), name=name, daemon=True)
+
+    threads = [start(feed, "pipeline-source")]
+    for position, (name, fn, workers) in enumerate(stages):
+        remaining = [workers]
+        lock = threading.Lock()
+
+        def work(name=name, fn=fn, inbox=queues[position], outbox=queues[position + 1],
+                 remaining=remaining, lock=lock):
+            while True:
+                item = inbox.get()
+                if item is _DONE:
+                    # Let sibling workers see the sentinel too; the last one out closes the next stage
+                    inbox.put(_DONE)
+                    with lock:
+                        remaining[0] -= 1
+                        last = remaining[0] == 0
+                    if last:
+                        outbox.put(_DONE)
+                    return
+                try:
+                    if metrics is not None:
+                        with metrics.timer(name):
+                            result = fn(item)
+                        metrics.inc("pipeline_items_total", stage=name,
+                                    outcome="dropped" if result is None else "passed")
+                    else:
+                        result = fn(item)
+                except Exception as e:
+                    logger.error(f"Error in pipeline stage '{name}': {e}\n{traceback.format_exc()}")
+                    continue
+                if result is not None:
+                    outbox.put(result)
+
+        for i in range(workers):
+            threads.append(start(work, f"pipeline-{name}-{i}"))
+
+    for thread in threads:
+        thread.start()
+
+    while True:
+        result = queues[-1].get()
+        if result is _DONE:
+            break
+        yield result
+
+    for thread in threads:
+        thread.join()
+
+
+class TokenBatcher:
+    """Thread-safe accumulator that releases a batch once it reaches a token or item budget."""
+
+    def __init__(self, token_budget, max_items):
+        self.token_budget = token_budget
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._items = []
+        self._tokens = 0
+
+    def add(self, item, tokens):
+        """Add an item; returns the full batch to process, or None if it is still filling."""
+        with self._lock:
+            batch = None
+            if self._items and self._tokens + tokens > self.token_budget:
+                batch, self._items, self._tokens = self._items, [], 0
+            self._items.append(item)
+            self._tokens += tokens
+            if batch is None and len(self._items) >= self.max_items:
+                batch, self._items, self._tokens = self._items, [], 0
+            return batch
+
+    def flush(self):
+        """Return whatever is left once the input is exhausted."""
+        with self._lock:
+            batch, self._items, self._tokens = self._items, [], 0
+            return batch
@@ -1,67 +1,464 @@
 import os
+import re
 import json
+import time
 import openai
-from pinecone import Pinecone, ServerlessSpec
 from dotenv import load_dotenv
+from sqlite_cache import EmbeddingCache, content_hash
+from json_stream import iter_records
+from vector_store import LocalVectorStore, PineconeVectorStore
+from skill_index import InvertedSkillIndex, SkillVocabulary
+from doc_store import CandidateDocStore
+from candidate_ids import stable_candidate_id
+from index_manifest import IndexManifest
+from metrics import DEFAULT_METRICS_PATH, get_logger, metrics
+
+try:
+    import tiktoken
+except ImportError:  # Optional: without it inputs are cut by a conservative character count
+    tiktoken = None
 
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI and Pinecone
+# Initialize OpenAI; the Pinecone client is created by PineconeVectorStore when it's used
 openai.api_key = os.getenv("OPENAI_API_KEY")
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+
+logger = get_logger("embeddings")
+
+# Batching limits for the embeddings endpoint and Pinecone upserts
+EMBEDDING_MAX_INPUTS = 2048
+EMBEDDING_MAX_TOKENS = 250000
+# Per-input limit of the text-embedding-3 models; longer inputs fail the whole request
+EMBEDDING_MAX_INPUT_TOKENS = 8191
+# Characters per token assumed when cutting without tiktoken (English prose averages about 4)
+SAFE_CHARS_PER_TOKEN = 3
+UPSERT_BATCH_SIZE = 100
+# Normalized skills kept in vector metadata for filtering; the full list is in the doc store
+METADATA_TOP_SKILLS = 20
+
+_skill_vocabulary = SkillVocabulary()
+
+
+def location_tokens(location):
+    """City/region tokens of a free-text location; empty for remote/unspecified."""
+    if not location:
+        return set()
+    tokens = {t.strip() for t in re.split(r"[,/|;()-]", str(location).lower()) if t.strip()}
+    return set() if tokens & {"remote", "anywhere", "any"} else tokens
+
+def estimate_tokens(text):
+    """Rough token count for batching (about 4 characters per token)."""
+    return len(text) // 4 + 1
+
+def truncate_for_embedding(text, model, max_tokens=EMBEDDING_MAX_INPUT_TOKENS):
+    """Cut text to the model's per-input token limit, exactly with tiktoken or by characters."""
+    if tiktoken is None:
+        limit = max_tokens * SAFE_CHARS_PER_TOKEN
+        return text if len(text) <= limit else text[:limit]
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+def _embed_request(inputs, model):
+    """Embeddings for one request's inputs, in order.
+
+    If the API still rejects an input as too long (the character estimate can undershoot
+    for dense text), the batch is bisected so only that input is shortened further and
+    the rest of the batch isn't failed with it.
+    """
+    try:
+        with metrics.timer("embed_request"):
+            response = openai.embeddings.create(input=inputs, model=model)
+    except openai.BadRequestError as e:
+        if "token" not in str(e).lower() or (len(inputs) == 1 and len(inputs[0]) < 2):
+            raise
+        if len(inputs) == 1:
+            logger.warning(f"Embedding input of {len(inputs[0])} characters is over the token limit; shortening it.")
+            return _embed_request([inputs[0][:len(inputs[0]) * 3 // 4]], model)
+        middle = len(inputs) // 2
+        return _embed_request(inputs[:middle], model) + _embed_request(inputs[middle:], model)
+    metrics.inc("embedding_tokens_total", getattr(response.usage, "total_tokens", 0) or 0, model=model)
+    embeddings = [None] * len(inputs)
+    for item in response.data:
+        embeddings[item.index] = item.embedding
+    return embeddings
+
+def embed_texts(texts, model, cache=None, max_tokens_per_request=EMBEDDING_MAX_TOKENS):
+    """Embed texts in token-bounded OpenAI requests, only sending texts that aren't cached.
+
+    Each input is cut to EMBEDDING_MAX_INPUT_TOKENS first, so one oversized CV can't fail
+    its batch on every run; results are still cached under the full text.
+    """
+    cached = cache.get_embeddings(model, texts) if cache else {}
+    missing = list(dict.fromkeys(text for text in texts if text not in cached))
+    metrics.inc("embedding_texts_total", len(texts) - len(missing), source="cache")
+    metrics.inc("embedding_texts_total", len(missing), source="api")
+    start = 0
+    while start < len(missing):
+        end, tokens = start, 0
+        while end < len(missing) and end - start < EMBEDDING_MAX_INPUTS:
+            tokens += min(estimate_tokens(missing[end]), EMBEDDING_MAX_INPUT_TOKENS)
+            if end > start and tokens > max_tokens_per_request:
+                break
+            end += 1
+        batch = missing[start:end]
+        embeddings = _embed_request([truncate_for_embedding(text, model) for text in batch], model)
+        fresh = dict(zip(batch, embeddings))
+        if cache:
+            cache.put_embeddings(model, fresh)
+        cached.update(fresh)
+        start = end
+    return [cached[text] for text in texts]
 
 class PineconeLoader:
-    def __init__(self, aggregated_json_path, index_name="cv-automation", embedding_model='text-embedding-3-small'):
+    def __init__(self, aggregated_json_path, index_name="cv-automation", embedding_model='text-embedding-3-small',
+                 batched=True, max_tokens_per_request=EMBEDDING_MAX_TOKENS, upsert_batch_size=UPSERT_BATCH_SIZE,
+                 embedding_cache=None, vector_store=None, skill_index_path=None, chunk_mode=False,
+                 manifest=None, delete_missing=False, doc_store=None):
         self.aggregated_json_path = aggregated_json_path
         self.index_name = index_name
         self.embedding_model = embedding_model
+        self.batched = batched
+        self.max_tokens_per_request = max_tokens_per_request
+        self.upsert_batch_size = upsert_batch_size
+        # One vector per section/experience/project instead of one per candidate
+        self.chunk_mode = chunk_mode
+        # Pass embedding_cache=False to always re-embed
+        self.embedding_cache = EmbeddingCache() if embedding_cache is None else embedding_cache
+        # Any VectorStore works here, e.g. LocalVectorStore for offline runs and benchmarks
+        self.vector_store = vector_store if vector_store is not None else PineconeVectorStore(self.index_name)
+        # Inverted skill index for hard skill filters (see skill_index.hybrid_search)
+        self.skill_index_path = skill_index_path
+        self.skill_index = InvertedSkillIndex.load_or_create(skill_index_path) if skill_index_path else None
+        # Vector ID -> content hash of what's in this vector store; pass manifest=False to always upsert.
+        # delete_missing removes candidates absent from the input, so only use it on full ingests.
+        self.manifest = (IndexManifest(self.vector_store.location) if manifest is None
+                         else (manifest if manifest is not False else None))
+        if self.manifest is not None and self.manifest.index_name != self.vector_store.location:
+            # A manifest describing another store would skip vectors this one has never seen
+            raise ValueError(f"Index manifest is for {self.manifest.index_name}, not {self.vector_store.location}")
+        self.delete_missing = delete_missing
+        # Full candidate records live here; vectors only carry filter fields (pass doc_store=False to skip)
+        self.doc_store = CandidateDocStore() if doc_store is None else (doc_store if doc_store is not False else None)
+        self._pending_docs = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Start a run's counts from zero. `errors` counts reads, vectors and records that failed."""
+        self.stats = {"upserted": 0, "unchanged": 0, "deleted": 0, "errors": 0}
+        # Candidates with a vector that failed to embed or upsert; their old vectors are kept
+        self._failed_candidates = set()
+
+    @metrics.scoped
+    def load_and_index(self, metrics_path=DEFAULT_METRICS_PATH, progress=None):
+        """Stream candidates from the aggregated JSON or JSON Lines file and index them into Pinecone.
+
+        This run's embedding and upsert timings are logged at the end and written to `metrics_path` if set.
+        `progress(candidates_done, stats)` is called after every candidate.
+        """
+        candidates = self.iter_candidates(self.aggregated_json_path)
+        if self.batched:
+            self.process_candidates_batched(candidates, progress)
+        else:
+            self.process_candidates(candidates, progress)
+        if self.skill_index is not None:
+            self.skill_index.save(self.skill_index_path)
+            logger.info(f"Saved skill index for {len(self.skill_index)} candidates to {self.skill_index_path}.")
+        logger.info(f"Stage timings:\n{metrics.current().stage_summary()}")
+        if metrics_path:
+            metrics.current().export(metrics_path)
+
+    def iter_candidates(self, file_path):
+        """Lazily yield candidates so memory use doesn't grow with file size.
+
+        Unreadable input and malformed records are counted in stats['errors'], which
+        keeps delete_missing from treating the candidates after them as removed.
+        """
+        def skip_line(line_number, error):
+            self.stats["errors"] += 1
+
+        try:
+            yield from iter_records(file_path, key="candidates", on_error=skip_line)
+        except Exception as e:
+            logger.error(f"Error reading candidates from {file_path}: {e}")
+            self.stats["errors"] += 1
+
+    def process_candidates(self, candidates, progress=None):
+        """Process all candidates from an iterable."""
+        self.reset_stats()
+        seen_candidates = set()
+        try:
+            for done, candidate in enumerate(candidates, start=1):
+                self.process_candidate(candidate, seen_candidates)
+                if progress is not None:
+                    progress(done, self.stats)
+            self.flush_documents()
+            if self.delete_missing:
+                self.delete_missing_candidates(seen_candidates)
+        except Exception as e:
+            logger.error(f"Error processing candidates: {e}")
+            self.stats["errors"] += 1
 
-        # Check if the index exists, and create it if it doesn't
-        index_names = [index['name'] for index in pc.list_indexes()]
-        if self.index_name not in index_names:
-            pc.create_index(
-                name=self.index_name,
-                dimension=1536,  # Dimension for text-embedding-3-small
-                metric="euclidean",
-                spec=ServerlessSpec(cloud="aws", region="us-east-1")
-            )
-            print(f"Successfully created the new index with name {self.index_name}")
-
-    def load_and_index(self):
-        """Load JSON data and index it into Pinecone."""
-        aggregated_data = self.load_json(self.aggregated_json_path)
-        if aggregated_data:
-            self.process_candidates(aggregated_data)
-
-    def load_json(self, file_path):
-        """Load JSON data from a file."""
+    def process_candidates_batched(self, candidates, progress=None):
+        """Embed new/changed vectors in token-bounded batches and upsert them in fixed-size chunks."""
+        start_time = time.time()
+        self.reset_stats()
+        seen_candidates = set()
+        pending = []
+        pending_tokens = 0
+        stale = []
         try:
-            with open(file_path, 'r') as file:
-                return json.load(file)
+            for done, candidate in enumerate(candidates, start=1):
+                metrics.inc("documents_total", pipeline="index")
+                for item in self.prepare_candidate(candidate, seen_candidates, stale):
+                    tokens = estimate_tokens(item[1])
+                    if pending and (pending_tokens + tokens > self.max_tokens_per_request
+                                    or len(pending) >= EMBEDDING_MAX_INPUTS):
+                        self.upsert_batch(pending)
+                        pending, pending_tokens = [], 0
+                    pending.append(item)
+                    pending_tokens += tokens
+                if len(stale) >= self.upsert_batch_size:
+                    stale = self.delete_stale(stale, waiting={item[2]['candidate_id'] for item in pending})
+                if progress is not None:
+                    progress(done, self.stats)
+            if pending:
+                self.upsert_batch(pending)
+            self.flush_documents()
+            self.delete_stale(stale)
+            if self.delete_missing:
+                self.delete_missing_candidates(seen_candidates)
         except Exception as e:
-            print(f"Error loading JSON file {file_path}: {e}")
-            return None
+            logger.error(f"Error processing candidates: {e}")
+            self.stats["errors"] += 1
+
+        elapsed = time.time() - start_time
+        upserted = self.stats["upserted"]
+        rate = upserted / elapsed if elapsed > 0 else 0.0
+        logger.info(f"Upserted {upserted} vectors in {elapsed:.2f} seconds ({rate:.1f} vectors/sec); "
+                    f"{self.stats['unchanged']} unchanged, {self.stats['deleted']} deleted, "
+                    f"{self.stats['errors']} errors.")
+        if self.embedding_cache:
+            stats = self.embedding_cache.stats()
+            logger.info(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate).")
+        return upserted
+
+    def prepare_candidate(self, candidate, seen_candidates, stale):
+        """Return the candidate's vector items that are new or changed since the last ingest.
+
+        (candidate_id, vector_id) pairs for vectors the candidate no longer produces (e.g. a
+        removed experience chunk) are appended to `stale`; see delete_stale.
+        """
+        candidate_id = stable_candidate_id(candidate)
+        seen_candidates.add(candidate_id)
+        if self.skill_index is not None:
+            self.skill_index.add_candidate(candidate_id, candidate.get("skills"))
+        if self.doc_store is not None:
+            self._pending_docs[candidate_id] = candidate
+            if len(self._pending_docs) >= self.upsert_batch_size:
+                self.flush_documents()
+        items = self.vector_items(candidate_id, candidate)
+        if self.manifest is None:
+            return items
+        current_ids = {vector_id for vector_id, _, _ in items}
+        stale.extend((candidate_id, vector_id)
+                     for vector_id in self.manifest.vectors_of(candidate_id) - current_ids)
+        changed = [item for item in items if not self.manifest.is_current(item[0], self.item_hash(item))]
+        self.stats["unchanged"] += len(items) - len(changed)
+        metrics.inc("vectors_total", len(items) - len(changed), outcome="unchanged")
+        return changed
+
+    def delete_missing_candidates(self, seen_candidates):
+        """Remove every indexed candidate that wasn't in this (full) ingest.
+
+        Skipped when anything failed this run: a partly read input or a failed upsert
+        would otherwise delete candidates that are still current.
+        """
+        if self.manifest is None:
+            return
+        if self.stats["errors"]:
+            logger.warning(f"Not deleting missing candidates: {self.stats['errors']} errors this run, "
+                           f"so {self.aggregated_json_path} may not have been fully indexed.")
+            return
+        indexed = self.manifest.vectors_by_candidate()
+        missing = [candidate_id for candidate_id in indexed if candidate_id not in seen_candidates]
+        stale = [vector_id for candidate_id in missing for vector_id in indexed[candidate_id]]
+        if self.skill_index is not None:
+            for candidate_id in missing:
+                self.skill_index.remove_candidate(candidate_id)
+        self.delete_vectors(stale)
+        if self.doc_store is not None:
+            self.doc_store.delete_many(missing)
 
-    def process_candidates(self, json_data):
-        """Process all candidates in the JSON data."""
+    def delete_stale(self, stale, waiting=()):
+        """Delete stale (candidate_id, vector_id) pairs once their candidate's new vectors are in.
+
+        Candidates in `waiting` still have vectors queued for upsert, so their pairs are
+        returned to try again later. Candidates whose upsert failed keep their old vectors
+        rather than being left with nothing; the next run retries them.
+        """
+        waiting = set(waiting)
+        ready = [vector_id for candidate_id, vector_id in stale
+                 if candidate_id not in waiting and candidate_id not in self._failed_candidates]
+        self.delete_vectors(ready)
+        return [(candidate_id, vector_id) for candidate_id, vector_id in stale if candidate_id in waiting]
+
+    def flush_documents(self):
+        """Write buffered candidate records to the doc store in one transaction."""
+        if not self._pending_docs:
+            return
+        documents, self._pending_docs = self._pending_docs, {}
         try:
-            candidates = json_data.get("candidates", [])
-            for candidate in candidates:
-                self.process_candidate(candidate)
+            with metrics.timer("doc_store_write"):
+                written = self.doc_store.put_many(documents)
+            metrics.inc("documents_stored_total", written)
         except Exception as e:
-            print(f"Error processing candidates: {e}")
+            logger.error(f"Error storing {len(documents)} candidate documents: {e}")
+            self.stats["errors"] += len(documents)
+
+    def item_hash(self, item):
+        """Hash of everything that ends up in a vector: model, embedded text and metadata."""
+        _, text, metadata = item
+        return content_hash(self.embedding_model, text, json.dumps(metadata, sort_keys=True, default=str))
+
+    def delete_vectors(self, vector_ids):
+        """Delete vectors from the index and the manifest."""
+        vector_ids = list(dict.fromkeys(vector_ids))
+        for i in range(0, len(vector_ids), self.upsert_batch_size):
+            chunk = vector_ids[i:i + self.upsert_batch_size]
+            try:
+                self.vector_store.delete(chunk)
+                if self.manifest is not None:
+                    self.manifest.forget(chunk)
+                self.stats["deleted"] += len(chunk)
+                metrics.inc("vectors_total", len(chunk), outcome="deleted")
+            except Exception as e:
+                logger.error(f"Error deleting {len(chunk)} vectors: {e}")
+                self.stats["errors"] += len(chunk)
+
+    def vector_items(self, candidate_id, candidate):
+        """(vector_id, text, metadata) for each vector a candidate is stored as."""
+        metadata = self.filter_metadata(candidate_id, candidate)
+        if not self.chunk_mode:
+            return [(candidate_id, self.combine_all_sections(candidate), metadata)]
+        return [
+            (f"{candidate_id}#{chunk_key}", text, {**metadata, 'section': section})
+            for chunk_key, section, text in self.candidate_chunks(candidate)
+        ]
+
+    @staticmethod
+    def filter_metadata(candidate_id, candidate):
+        """Small typed fields stored on every vector of a candidate, for metadata filters.
 
-    def process_candidate(self, candidate):
+        total_experience is a number (omitted when unknown, since Pinecone rejects nulls),
+        skills are the first METADATA_TOP_SKILLS normalized skills and location is the
+        address split into lowercase tokens, so filters look like
+        {"total_experience": {"$gte": 3}, "skills": {"$in": ["python"]}, "location": "pune"}.
+        The full record is in the doc store.
+        """
+        personal_info = candidate.get("personal_info") or {}
+        metadata = {'candidate_id': candidate_id, 'name': personal_info.get("name") or ""}
+        try:
+            metadata['total_experience'] = float(candidate["total_experience"])
+        except (KeyError, TypeError, ValueError):
+            pass
+        skills = dict.fromkeys(_skill_vocabulary.normalize(s) for s in candidate.get("skills") or [] if s)
+        if skills:
+            metadata['skills'] = list(skills)[:METADATA_TOP_SKILLS]
+        location = sorted(location_tokens(personal_info.get("address")))
+        if location:
+            metadata['location'] = location
+        return metadata
+
+    @staticmethod
+    def candidate_chunks(candidate):
+        """Split a candidate into (chunk_key, section, text) chunks.
+
+        Profile fields, skills, education, certifications and achievements are one chunk
+        each; every experience and project entry is its own chunk so long CVs aren't
+        diluted and editing one entry only re-embeds that entry. Empty sections are skipped.
+        """
+        to_text = PineconeLoader.json_to_text
+        chunks = []
+        profile = {
+            "personal_info": candidate.get("personal_info") or {},
+            "career_objective": candidate.get("career_objective"),
+            "total_experience": candidate.get("total_experience"),
+            "relevant_experience": candidate.get("relevant_experience") or {},
+        }
+        profile_text = "\n".join(f"{name}: {to_text(value)}" for name, value in profile.items() if value)
+        if profile_text:
+            chunks.append(("profile", "profile", profile_text))
+        for section in ("skills", "education", "certifications", "achievements"):
+            content = candidate.get(section) or []
+            if content:
+                chunks.append((section, section, f"{section}: {to_text(content)}"))
+        for section, label in (("experience", "experience"), ("projects", "project")):
+            for i, entry in enumerate(candidate.get(section) or []):
+                text = to_text(entry)
+                if text.strip():
+                    chunks.append((f"{label}-{i}", section, f"{label}: {text}"))
+        return chunks
+
+    def upsert_batch(self, items):
+        """Embed a batch of (vector_id, text, metadata) items with one request and upsert them."""
+        # Records go in first, so anything that finds a vector can fetch its candidate
+        self.flush_documents()
+        try:
+            with metrics.timer("embed"):
+                embeddings = self.generate_embeddings([text for _, text, _ in items])
+        except Exception as e:
+            logger.error(f"Error generating embeddings for batch of {len(items)} vectors: {e}")
+            self.stats["errors"] += len(items)
+            self._failed_candidates.update(metadata['candidate_id'] for _, _, metadata in items)
+            return 0
+
+        vectors = [
+            (vector_id, embedding, metadata)
+            for (vector_id, _, metadata), embedding in zip(items, embeddings)
+        ]
+        hashes = [self.item_hash(item) for item in items]
+        upserted = 0
+        for i in range(0, len(vectors), self.upsert_batch_size):
+            chunk = vectors[i:i + self.upsert_batch_size]
+            try:
+                with metrics.timer("upsert"):
+                    self.vector_store.upsert(chunk)
+                if self.manifest is not None:
+                    self.manifest.record([
+                        (vector_id, metadata['candidate_id'], item_hash)
+                        for (vector_id, _, metadata), item_hash in zip(chunk, hashes[i:i + self.upsert_batch_size])
+                    ])
+                upserted += len(chunk)
+            except Exception as e:
+                logger.error(f"Error upserting batch of {len(chunk)} vectors: {e}")
+                self.stats["errors"] += len(chunk)
+                self._failed_candidates.update(metadata['candidate_id'] for _, _, metadata in chunk)
+        logger.debug(f"Upserted batch of {upserted} vectors into {self.index_name}.")
+        metrics.inc("vectors_total", upserted, outcome="upserted")
+        self.stats["upserted"] += upserted
+        return upserted
+
+    def process_candidate(self, candidate, seen_candidates=None):
         """Process a single candidate."""
+        candidate_id = stable_candidate_id(candidate)
         try:
-            candidate_id = candidate.get("personal_info", {}).get("name", "null")
-            combined_text = self.combine_all_sections(candidate)
-            self.upsert_candidate(candidate_id, combined_text)
+            stale = []
+            items = self.prepare_candidate(candidate, set() if seen_candidates is None else seen_candidates, stale)
+            if items:
+                self.upsert_batch(items)
+            self.flush_documents()
+            self.delete_stale(stale)
         except Exception as e:
-            print(f"Error processing candidate {candidate_id}: {e}")
+            logger.error(f"Error processing candidate {candidate_id}: {e}")
+            self.stats["errors"] += 1
 
-    def combine_all_sections(self, candidate):
+    @staticmethod
+    def combine_all_sections(candidate):
         """Combine all sections of a candidate's data into a single text."""
         sections = {
             "personal_info": candidate.get("personal_info", {}),
@@ -76,43 +473,53 @@ class PineconeLoader:
         }
         combined_text = ""
         for section_name, section_content in sections.items():
-            combined_text += f"{section_name}: {self.json_to_text(section_content)}\n"
+            combined_text += f"{section_name}: {PineconeLoader.json_to_text(section_content)}\n"
         return combined_text
 
-    def json_to_text(self, json_data):
+    @staticmethod
+    def json_to_text(json_data):
         """Convert JSON data to a plain text string."""
         if isinstance(json_data, dict):
             return ' '.join([f"{key}: {value}" for key, value in json_data.items()])
         elif isinstance(json_data, list):
-            return ' '.join([self.json_to_text(item) for item in json_data])
+            return ' '.join([PineconeLoader.json_to_text(item) for item in json_data])
         else:
             return str(json_data)
 
     def generate_embedding(self, text):
         """Generate embeddings for the given text using OpenAI."""
-        response = openai.embeddings.create(input=text, model=self.embedding_model)
-        return response.data[0].embedding
+        return self.generate_embeddings([text])[0]
+
+    def generate_embeddings(self, texts):
+        """Generate embeddings for a list of texts, only calling OpenAI for texts not in the cache."""
+        return embed_texts(texts, self.embedding_model, self.embedding_cache, self.max_tokens_per_request)
+
+    def upsert_candidate(self, candidate):
+        """Upsert one candidate, bypassing the manifest diff.
 
-    def upsert_candidate(self, candidate_id, combined_text):
-        """Upsert a candidate's combined data into Pinecone."""
+        Stores the same record and vectors as the ingest paths, so the doc store never
+        holds a different shape depending on which path wrote last.
+        """
+        candidate_id = stable_candidate_id(candidate)
         try:
-            index = pc.Index(self.index_name)
-            embedding = self.generate_embedding(combined_text)
-            metadata = {
-                'candidate_id': candidate_id,
-                'content': combined_text
-            }
-            # Upsert the candidate's data as a single vector
-            index.upsert(vectors=[(candidate_id, embedding, metadata)])
-            print(f"Upserted candidate {candidate_id} into Pinecone.")
+            if self.doc_store is not None:
+                self._pending_docs[candidate_id] = candidate
+            if self.upsert_batch(self.vector_items(candidate_id, candidate)):
+                logger.info(f"Upserted candidate {candidate_id} into {self.index_name}.")
         except Exception as e:
-            print(f"Error upserting candidate {candidate_id}: {e}")
+            logger.error(f"Error upserting candidate {candidate_id}: {e}")
+            self.stats["errors"] += 1
 
 # Entry point
 def run_loader():
+    # Set LOCAL_VECTOR_STORE_PATH to index into an in-process store instead of Pinecone
+    local_path = os.getenv("LOCAL_VECTOR_STORE_PATH")
+    # aggregated_data.json is the full candidate set, so candidates missing from it are removed
     loader = PineconeLoader(
         aggregated_json_path="/Users/vinayaksharma/Documents/cv_automation/aggregated_data.json",
-        index_name="cv-index"
+        index_name="cv-index",
+        vector_store=LocalVectorStore(local_path) if local_path else None,
+        delete_missing=True
     )
     loader.load_and_index()
 
@@ -0,0 +1,320 @@
+import os
+import json
+import time
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from doc_store import DEFAULT_DOC_STORE_PATH, CandidateDocStore
+from json_stream import iter_records
+from matching import jd_to_text
+from metrics import get_logger, metrics
+from process_embeddings import embed_texts
+from skill_index import InvertedSkillIndex, hybrid_search
+from sqlite_cache import EmbeddingCache
+from vector_store import LocalVectorStore, PineconeVectorStore, aggregate_by_candidate
+
+logger = get_logger("search")
+
+QUERY_CACHE_SIZE = int(os.getenv("SEARCH_QUERY_CACHE_SIZE", "4096"))
+RESULT_CACHE_SIZE = int(os.getenv("SEARCH_RESULT_CACHE_SIZE", "1024"))
+# Results expire so newly indexed candidates show up; query embeddings only change with the model
+RESULT_TTL = float(os.getenv("SEARCH_RESULT_TTL", "300"))
+QUERY_TTL = float(os.getenv("SEARCH_QUERY_TTL", "86400"))
+# Concurrent vector queries for a batch when the store has no native multi-query
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", "8"))
+# Chunk-level indexes return several vectors per candidate, so fetch extra before aggregating
+CHUNK_OVERFETCH = 4
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe in-memory LRU cache whose entries also expire `ttl` seconds after being stored."""
+
+    def __init__(self, max_entries=1024, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and entry[1] < time.monotonic():
+                del self._entries[key]
+                entry = _MISSING
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries)}
+
+
+def query_text(query):
+    """Text embedded for a query: free text as is, a JobDescription dict like matching does."""
+    if isinstance(query, dict):
+        return jd_to_text(query)
+    return str(query)
+
+
+class CandidateSearch:
+    """Ranked candidate search over the index PineconeLoader writes.
+
+    Queries are free text or JobDescription dicts (as produced by jd.py) and are embedded
+    with the loader's model, so they land in the same space as the candidates. `filter` is
+    a Pinecone-style metadata filter over the fields PineconeLoader.filter_metadata
+    writes; `required_skills` restricts results to candidates with all those skills via
+    the inverted skill index, and is rejected with ValueError when there is none. Full candidate records are only
+    read from the doc store when asked for (include_documents).
+
+    Query embeddings and results are kept in in-memory LRU caches with a TTL, so repeated
+    searches are answered without touching OpenAI or the index. Results are shared between
+    callers and must be treated as read-only.
+    """
+
+    def __init__(self, vector_store, embedding_model="text-embedding-3-small", embedding_cache=None,
+                 skill_index=None, chunked=False, query_cache=None, result_cache=None, doc_store=None):
+        self.vector_store = vector_store
+        self.embedding_model = embedding_model
+        self.embedding_cache = embedding_cache
+        self.skill_index = skill_index
+        self.chunked = chunked
+        self.doc_store = doc_store
+        self.query_cache = query_cache if query_cache is not None else TTLCache(QUERY_CACHE_SIZE, QUERY_TTL)
+        self.result_cache = result_cache if result_cache is not None else TTLCache(RESULT_CACHE_SIZE, RESULT_TTL)
+
+    @classmethod
+    def from_loader(cls, loader, **kwargs):
+        """Search the index a PineconeLoader writes, with its model, embedding cache and skill index."""
+        return cls(loader.vector_store, embedding_model=loader.embedding_model,
+                   embedding_cache=loader.embedding_cache or None, skill_index=loader.skill_index,
+                   chunked=loader.chunk_mode, doc_store=loader.doc_store, **kwargs)
+
+    def embed_queries(self, texts):
+        """Embeddings for query texts; only ones missing from the cache are sent, in one batch."""
+        embeddings = {text: self.query_cache.get((self.embedding_model, text)) for text in set(texts)}
+        missing = [text for text, embedding in embeddings.items() if embedding is None]
+        metrics.inc("search_cache_total", len(embeddings) - len(missing), cache="query", outcome="hit")
+        metrics.inc("search_cache_total", len(missing), cache="query", outcome="miss")
+        if missing:
+            for text, embedding in zip(missing, embed_texts(missing, self.embedding_model, self.embedding_cache)):
+                self.query_cache.put((self.embedding_model, text), embedding)
+                embeddings[text] = embedding
+        return [embeddings[text] for text in texts]
+
+    def search(self, query, top_k=10, filter=None, required_skills=None, include_documents=False):
+        """Top candidates for one query, best first."""
+        return self.search_many([query], top_k=top_k, filter=filter, required_skills=required_skills,
+                                include_documents=include_documents)[0]
+
+    def search_many(self, queries, top_k=10, filter=None, required_skills=None, include_documents=False):
+        """Top candidates for each query; uncached queries are embedded and run as one batch.
+
+        Each result is {"id", "score", "metadata", "chunks"}, with one entry per candidate
+        (chunk-level matches are aggregated, best chunk first). With include_documents each
+        also gets the full candidate record under "document", read in one bulk lookup.
+        """
+        if required_skills and self.skill_index is None:
+            # Silently dropping a hard constraint would return candidates without the skills
+            raise ValueError("required_skills needs a skill index (PineconeLoader skill_index_path / --skill-index)")
+        with metrics.timer("search"):
+            texts = [query_text(query) for query in queries]
+            options = (top_k, json.dumps(filter, sort_keys=True), tuple(sorted(required_skills or ())))
+            keys = [(self.embedding_model, text, options) for text in texts]
+            results = [self.result_cache.get(key) for key in keys]
+            pending = list(dict.fromkeys(key for key, result in zip(keys, results) if result is None))
+            metrics.inc("search_cache_total", len(keys) - len(pending), cache="result", outcome="hit")
+            metrics.inc("search_cache_total", len(pending), cache="result", outcome="miss")
+            if pending:
+                embeddings = self.embed_queries([key[1] for key in pending])
+                fresh = dict(zip(pending, self._query(embeddings, top_k, filter, required_skills)))
+                for key, ranked in fresh.items():
+                    self.result_cache.put(key, ranked)
+                results = [result if result is not None else fresh[key] for key, result in zip(keys, results)]
+            if include_documents:
+                results = self.with_documents(results)
+            return results
+
+    def with_documents(self, results):
+        """Copies of the ranked lists with each candidate's full record added as "document"."""
+        if self.doc_store is None:
+            raise ValueError("include_documents needs a doc store")
+        with metrics.timer("doc_store_read"):
+            documents = self.doc_store.get_many(entry["id"] for ranked in results for entry in ranked)
+        return [[{**entry, "document": documents.get(entry["id"])} for entry in ranked] for ranked in results]
+
+    def _query(self, embeddings, top_k, filter, required_skills):
+        fetch_k = top_k * CHUNK_OVERFETCH if self.chunked else top_k
+        # Over-fetching chunks must stay within what one backend query accepts (1000 on Pinecone)
+        max_top_k = getattr(self.vector_store, "max_top_k", None)
+        if max_top_k is not None:
+            fetch_k = min(fetch_k, max_top_k)
+        if required_skills:
+            def run(embedding):
+                return hybrid_search(self.vector_store, embedding, self.skill_index, required_skills,
+                                     top_k=fetch_k, filter=filter)
+        elif hasattr(self.vector_store, "query_many"):
+            # One matrix product for the whole batch
+            batches = self.vector_store.query_many(embeddings, top_k=fetch_k, filter=filter)
+            return [self._rank(matches, top_k) for matches in batches]
+        else:
+            def run(embedding):
+                return self.vector_store.query(embedding, top_k=fetch_k, filter=filter)
+        if len(embeddings) == 1:
+            return [self._rank(run(embeddings[0]), top_k)]
+        with ThreadPoolExecutor(max_workers=min(SEARCH_CONCURRENCY, len(embeddings))) as executor:
+            return [self._rank(matches, top_k) for matches in executor.map(run, embeddings)]
+
+    def _rank(self, matches, top_k):
+        return aggregate_by_candidate(matches, self.vector_store.higher_is_better, top_k)
+
+    def invalidate(self):
+        """Drop cached results, e.g. after an ingest; query embeddings stay valid."""
+        self.result_cache.clear()
+
+    def stats(self):
+        return {"query_cache": self.query_cache.stats(), "result_cache": self.result_cache.stats()}
+
+
+def _search_request(searcher, request):
+    """Run a parsed HTTP/CLI request: {"query": text | JD} or {"queries": [...]}, plus options."""
+    options = {
+        "top_k": int(request.get("top_k", 10)),
+        "filter": request.get("filter"),
+        "required_skills": request.get("required_skills"),
+        "include_documents": bool(request.get("include_documents")),
+    }
+    if "queries" in request:
+        return {"results": searcher.search_many(request["queries"], **options)}
+    if "query" not in request:
+        raise ValueError("request needs a 'query' or 'queries' field")
+    return {"results": searcher.search(request["query"], **options)}
+
+
+def make_handler(searcher):
+    """HTTP handler: POST /search with a JSON body, GET /stats for cache statistics."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._send(200, searcher.stats())
+            else:
+                self._send(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/search":
+                self._send(404, {"error": f"Unknown path {self.path}"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                self._send(200, _search_request(searcher, json.loads(self.rfile.read(length) or b"{}")))
+            except (ValueError, TypeError) as e:
+                self._send(400, {"error": str(e)})
+            except Exception as e:
+                logger.error(f"Search failed: {e}")
+                self._send(500, {"error": str(e)})
+
+    return Handler
+
+
+def serve(searcher, host="127.0.0.1", port=8080):
+    server = ThreadingHTTPServer((host, port), make_handler(searcher))
+    server.daemon_threads = True
+    logger.info(f"Candidate search listening on http://{host}:{port}/search")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def default_searcher(index_name="cv-index", embedding_model="text-embedding-3-small", skill_index_path=None,
+                     chunked=False, doc_store_path=None):
+    """Searcher for the index run_loader writes (LOCAL_VECTOR_STORE_PATH selects a local store)."""
+    local_path = os.getenv("LOCAL_VECTOR_STORE_PATH")
+    vector_store = LocalVectorStore(local_path) if local_path else PineconeVectorStore(index_name)
+    skill_index = InvertedSkillIndex.load_or_create(skill_index_path) if skill_index_path else None
+    return CandidateSearch(vector_store, embedding_model=embedding_model, embedding_cache=EmbeddingCache(),
+                           skill_index=skill_index, chunked=chunked,
+                           doc_store=CandidateDocStore(doc_store_path or DEFAULT_DOC_STORE_PATH))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search indexed candidates by free text or job description.")
+    parser.add_argument("query", nargs="*", help="Free-text queries (one search each)")
+    parser.add_argument("--jd", help="JobDescription JSON/JSONL file; every JD in it is searched")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--filter", type=json.loads,
+                        help='Metadata filter, e.g. \'{"total_experience": {"$gte": 3}, "location": "pune"}\'')
+    parser.add_argument("--documents", action="store_true", help="Include full candidate records from the doc store")
+    parser.add_argument("--doc-store", help="Doc store path (default DOC_STORE_PATH or candidate_docs.sqlite)")
+    parser.add_argument("--skills", help="Comma-separated skills every result must have (needs --skill-index)")
+    parser.add_argument("--skill-index", help="Skill index written by PineconeLoader(skill_index_path=...)")
+    parser.add_argument("--index-name", default="cv-index")
+    parser.add_argument("--chunked", action="store_true", help="The index holds section-level chunks")
+    parser.add_argument("--serve", action="store_true", help="Run the HTTP endpoint instead of searching once")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    searcher = default_searcher(args.index_name, skill_index_path=args.skill_index, chunked=args.chunked,
+                                doc_store_path=args.doc_store)
+    if args.serve:
+        serve(searcher, args.host, args.port)
+    else:
+        queries = list(args.query)
+        if args.jd:
+            with open(args.jd, "r", encoding="utf-8") as f:
+                first = f.read(1)
+            if first == "{" and not args.jd.endswith((".jsonl", ".ndjson")):
+                with open(args.jd, "r", encoding="utf-8") as f:
+                    document = json.load(f)
+                queries.extend(document.get("job_descriptions") or [document])
+            else:
+                queries.extend(iter_records(args.jd, key="job_descriptions"))
+        if not queries:
+            parser.error("give a query or --jd")
+        skills = [s.strip() for s in args.skills.split(",") if s.strip()] if args.skills else None
+        results = searcher.search_many(queries, top_k=args.top_k, filter=args.filter, required_skills=skills,
+                                       include_documents=args.documents)
+        print(json.dumps([{"query": query if isinstance(query, str) else query.get("role"), "results": ranked}
+                          for query, ranked in zip(queries, results)], indent=2))
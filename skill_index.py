@@ -0,0 +1,265 @@
+import os
+import re
+import json
+import base64
+
+try:
+    from pyroaring import BitMap
+except ImportError:  # Optional: falls back to Python ints used as bitsets
+    BitMap = None
+
+# Common spellings and abbreviations mapped to one canonical skill name
+SKILL_ALIASES = {
+    "py": "python", "python3": "python", "python 3": "python",
+    "js": "javascript", "ecmascript": "javascript",
+    "ts": "typescript",
+    "node": "node.js", "nodejs": "node.js", "node js": "node.js",
+    "reactjs": "react", "react.js": "react", "react js": "react",
+    "vuejs": "vue", "vue.js": "vue",
+    "angularjs": "angular",
+    "golang": "go",
+    "cpp": "c++",
+    "csharp": "c#", "c sharp": "c#",
+    "dotnet": ".net", "dot net": ".net",
+    "postgres": "postgresql", "psql": "postgresql",
+    "mongo": "mongodb",
+    "k8s": "kubernetes",
+    "aws": "amazon web services", "amazon aws": "amazon web services",
+    "gcp": "google cloud platform", "google cloud": "google cloud platform",
+    "azure cloud": "azure", "microsoft azure": "azure",
+    "ml": "machine learning",
+    "dl": "deep learning",
+    "ai": "artificial intelligence",
+    "nlp": "natural language processing",
+    "computer vision (cv)": "computer vision",
+    "sklearn": "scikit-learn", "scikit learn": "scikit-learn",
+    "tf": "tensorflow",
+    "ms excel": "excel", "microsoft excel": "excel",
+    "restful apis": "rest api", "rest apis": "rest api", "restful api": "rest api", "rest": "rest api",
+    "ci/cd": "ci cd", "cicd": "ci cd",
+}
+# Aliases dropped from SKILL_ALIASES; removed from saved indexes on load.
+# "cv" mostly means a CV/resume in this corpus, not computer vision.
+RETIRED_ALIASES = {"cv": "computer vision"}
+
+
+class SkillVocabulary:
+    """Normalized skill names with stable integer IDs."""
+
+    def __init__(self, aliases=None):
+        self.aliases = dict(SKILL_ALIASES)
+        if aliases:
+            self.aliases.update({self._clean(k): self._clean(v) for k, v in aliases.items()})
+        self.ids = {}
+        self.names = []
+
+    @staticmethod
+    def _clean(skill):
+        return re.sub(r"\s+", " ", str(skill).strip().lower()).strip(" .,;:")
+
+    def normalize(self, skill):
+        cleaned = self._clean(skill)
+        return self.aliases.get(cleaned, cleaned)
+
+    def id_for(self, skill, create=False):
+        """Integer ID of a skill, or None if it is unknown and create is False."""
+        name = self.normalize(skill)
+        if not name:
+            return None
+        if name not in self.ids and create:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        return self.ids.get(name)
+
+
+class _IntBitmap:
+    """Minimal bitmap on a Python int for when pyroaring isn't installed."""
+
+    __slots__ = ("bits",)
+
+    def __init__(self, bits=0):
+        self.bits = bits
+
+    def add(self, value):
+        self.bits |= 1 << value
+
+    def discard(self, value):
+        self.bits &= ~(1 << value)
+
+    def __and__(self, other):
+        return _IntBitmap(self.bits & other.bits)
+
+    def __or__(self, other):
+        return _IntBitmap(self.bits | other.bits)
+
+    def __len__(self):
+        return self.bits.bit_count()
+
+    def __iter__(self):
+        bits, offset = self.bits, 0
+        while bits:
+            low = bits & -bits
+            position = low.bit_length() - 1
+            yield offset + position
+            bits >>= position + 1
+            offset += position + 1
+
+    def serialize(self):
+        return self.bits.to_bytes((self.bits.bit_length() + 7) // 8, "little")
+
+    @classmethod
+    def deserialize(cls, data):
+        return cls(int.from_bytes(data, "little"))
+
+
+def _new_bitmap():
+    return BitMap() if BitMap is not None else _IntBitmap()
+
+
+def _deserialize_bitmap(data):
+    return BitMap.deserialize(data) if BitMap is not None else _IntBitmap.deserialize(data)
+
+
+class InvertedSkillIndex:
+    """Skill ID -> compressed bitmap of candidate document numbers.
+
+    Required-skill queries are bitmap intersections, so they never touch the vectors.
+    Candidate IDs are mapped to dense document numbers in insertion order.
+    """
+
+    def __init__(self, vocabulary=None):
+        self.vocabulary = vocabulary or SkillVocabulary()
+        self.postings = {}
+        self.doc_ids = []
+        self.doc_of = {}
+        # Document number -> skill IDs, so updates only touch that candidate's postings
+        self.skills_of = {}
+
+    def __len__(self):
+        return len(self.doc_of)
+
+    def add_candidate(self, candidate_id, skills):
+        """Index a candidate's skills, replacing whatever was indexed for it before."""
+        doc = self.doc_of.get(candidate_id)
+        if doc is None:
+            doc = len(self.doc_ids)
+            self.doc_ids.append(candidate_id)
+            self.doc_of[candidate_id] = doc
+        skill_ids = {self.vocabulary.id_for(skill, create=True) for skill in skills or []} - {None}
+        previous = self.skills_of.get(doc, set())
+        for skill_id in previous - skill_ids:
+            self.postings[skill_id].discard(doc)
+        for skill_id in skill_ids - previous:
+            self.postings.setdefault(skill_id, _new_bitmap()).add(doc)
+        self.skills_of[doc] = skill_ids
+
+    def remove_candidate(self, candidate_id):
+        doc = self.doc_of.pop(candidate_id, None)
+        if doc is None:
+            return
+        for skill_id in self.skills_of.pop(doc, ()):
+            self.postings[skill_id].discard(doc)
+        self.doc_ids[doc] = None
+
+    def _bitmap_for_all(self, skills):
+        bitmaps = []
+        for skill in skills:
+            skill_id = self.vocabulary.id_for(skill)
+            if skill_id is None or skill_id not in self.postings:
+                return _new_bitmap()
+            bitmaps.append(self.postings[skill_id])
+        if not bitmaps:
+            return None
+        # Intersect smallest first so the running result shrinks fastest
+        bitmaps.sort(key=len)
+        result = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            result = result & bitmap
+        return result
+
+    def candidates_with_all(self, skills):
+        """Candidate IDs that have every one of the skills (None means no restriction)."""
+        bitmap = self._bitmap_for_all(skills)
+        if bitmap is None:
+            return None
+        return {self.doc_ids[doc] for doc in bitmap}
+
+    def candidates_with_any(self, skills):
+        result = _new_bitmap()
+        for skill in skills:
+            skill_id = self.vocabulary.id_for(skill)
+            if skill_id in self.postings:
+                result = result | self.postings[skill_id]
+        return {self.doc_ids[doc] for doc in result}
+
+    def save(self, path):
+        data = {
+            "aliases": self.vocabulary.aliases,
+            "skills": self.vocabulary.names,
+            "doc_ids": self.doc_ids,
+            "postings": {
+                str(skill_id): base64.b64encode(bitmap.serialize()).decode("ascii")
+                for skill_id, bitmap in self.postings.items()
+            },
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        vocabulary = SkillVocabulary()
+        vocabulary.aliases = {alias: skill for alias, skill in data["aliases"].items()
+                              if RETIRED_ALIASES.get(alias) != skill}
+        vocabulary.names = data["skills"]
+        vocabulary.ids = {name: i for i, name in enumerate(vocabulary.names)}
+        index = cls(vocabulary)
+        index.doc_ids = data["doc_ids"]
+        index.doc_of = {candidate_id: doc for doc, candidate_id in enumerate(index.doc_ids) if candidate_id is not None}
+        index.postings = {
+            int(skill_id): _deserialize_bitmap(base64.b64decode(encoded))
+            for skill_id, encoded in data["postings"].items()
+        }
+        for skill_id, bitmap in index.postings.items():
+            for doc in bitmap:
+                index.skills_of.setdefault(doc, set()).add(skill_id)
+        return index
+
+    @classmethod
+    def load_or_create(cls, path):
+        return cls.load(path) if path and os.path.exists(path) else cls()
+
+
+def hybrid_search(vector_store, query_vector, skill_index, required_skills, top_k=10,
+                  prefilter_limit=1000, filter=None):
+    """Vector search restricted to candidates that have all the required skills.
+
+    When the skill intersection is small enough the allowed candidates are fetched and
+    scored directly (prefilter, no vector scan); otherwise the vector query is widened
+    and its results filtered by the intersection (rerank). Widening stops at the backend's
+    max_top_k, so a rare skill combination may return fewer than top_k matches.
+    """
+    allowed = skill_index.candidates_with_all(required_skills) if required_skills else None
+    if allowed is None:
+        return vector_store.query(query_vector, top_k=top_k, filter=filter)
+    if not allowed:
+        return []
+
+    if len(allowed) <= prefilter_limit:
+        if hasattr(vector_store, "query_candidates"):
+            return vector_store.query_candidates(query_vector, allowed, top_k=top_k, filter=filter)
+        id_filter = {"candidate_id": {"$in": sorted(allowed)}}
+        combined = {"$and": [id_filter, filter]} if filter else id_filter
+        return vector_store.query(query_vector, top_k=top_k, filter=combined)
+
+    max_top_k = getattr(vector_store, "max_top_k", None)
+    fetch_k = top_k * 4 if max_top_k is None else min(top_k * 4, max_top_k)
+    while True:
+        results = vector_store.query(query_vector, top_k=fetch_k, filter=filter)
+        matches = [m for m in results if m["metadata"].get("candidate_id", m["id"]) in allowed]
+        if len(matches) >= top_k or len(results) < fetch_k or fetch_k == max_top_k:
+            return matches[:top_k]
+        fetch_k = fetch_k * 4 if max_top_k is None else min(fetch_k * 4, max_top_k)
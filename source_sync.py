@@ -0,0 +1,106 @@
+import time
+import sqlite3
+import threading
+
+from metrics import get_logger
+
+logger = get_logger("sync")
+
+DRIVE_FILE_FIELDS = "id, name, mimeType, modifiedTime, md5Checksum, size"
+
+
+def iter_drive_files(drive_service, folder_id, page_size=1000):
+    """Yield every file in a Drive folder, following nextPageToken across pages."""
+    query = f"'{folder_id}' in parents and trashed=false"
+    page_token = None
+    while True:
+        response = drive_service.files().list(
+            q=query,
+            fields=f"nextPageToken, files({DRIVE_FILE_FIELDS})",
+            pageSize=page_size,
+            pageToken=page_token,
+        ).execute()
+        yield from response.get('files', [])
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return
+
+
+def iter_s3_objects(s3_client, bucket_name, prefix=""):
+    """Yield every object under a prefix, following ContinuationToken across pages."""
+    kwargs = {"Bucket": bucket_name, "Prefix": prefix}
+    while True:
+        response = s3_client.list_objects_v2(**kwargs)
+        yield from response.get('Contents', [])
+        if not response.get('IsTruncated'):
+            return
+        kwargs["ContinuationToken"] = response["NextContinuationToken"]
+
+
+def drive_file_version(file):
+    """Content version of a Drive file: md5 for binary files, modifiedTime for Google Docs."""
+    return file.get('md5Checksum') or file.get('modifiedTime') or ""
+
+
+def s3_object_version(obj):
+    """Content version of an S3 object: its ETag (the MD5 for single-part uploads)."""
+    return (obj.get('ETag') or "").strip('"') or str(obj.get('LastModified', ""))
+
+
+class SyncManifest:
+    """Local record of which source documents were processed, at which version.
+
+    Only files whose ID is new or whose version (md5/modifiedTime/ETag) changed since
+    they were last marked synced are emitted, so a mostly static folder is just a
+    metadata listing. Files are marked synced only after their output is written, so
+    failures are retried on the next run.
+    """
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = source
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS manifest ("
+            "source TEXT NOT NULL, file_id TEXT NOT NULL, name TEXT, version TEXT NOT NULL, "
+            "synced_at REAL NOT NULL, PRIMARY KEY (source, file_id))"
+        )
+        self._conn.commit()
+        self.versions = dict(self._conn.execute(
+            "SELECT file_id, version FROM manifest WHERE source = ?", (source,)
+        ))
+
+    def changed(self, files, id_fn, version_fn):
+        """Yield the files that are new or changed since the last sync."""
+        seen = skipped = 0
+        for file in files:
+            seen += 1
+            if self.versions.get(id_fn(file)) == version_fn(file):
+                skipped += 1
+                continue
+            yield file
+        logger.info(f"Sync: {seen - skipped} new or changed of {seen} files ({skipped} unchanged).")
+
+    def mark_synced(self, file_id, version, name=None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO manifest (source, file_id, name, version, synced_at) VALUES (?, ?, ?, ?, ?)",
+                (self.source, file_id, name, version, time.time()),
+            )
+            self._conn.commit()
+            self.versions[file_id] = version
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def changed_drive_files(drive_service, folder_id, manifest):
+    """New or changed files in a Drive folder according to the manifest."""
+    return manifest.changed(iter_drive_files(drive_service, folder_id), lambda f: f['id'], drive_file_version)
+
+
+def changed_s3_objects(s3_client, bucket_name, prefix, manifest):
+    """New or changed objects under an S3 prefix according to the manifest."""
+    return manifest.changed(iter_s3_objects(s3_client, bucket_name, prefix), lambda o: o['Key'], s3_object_version)
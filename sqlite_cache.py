@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+
+DEFAULT_EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def content_hash(*parts):
+    """SHA-256 over the given string parts, separated so ('ab', 'c') != ('a', 'bc')."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SqliteLRUCache:
+    """Persistent key -> bytes cache in SQLite with least-recently-used eviction by total size."""
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, table="cache"):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_last_access ON {table}(last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table}").fetchone()[0]
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        """Return {key: value} for the keys that are cached and bump their access time."""
+        found = {}
+        keys = list(dict.fromkeys(keys))
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM {self.table} WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    f"UPDATE {self.table} SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put(self, key, value):
+        self.put_many({key: value})
+
+    def put_many(self, items):
+        """Store {key: bytes} and evict least-recently-used entries if over the size limit."""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            keys = list(items)
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                self._total_bytes -= self._conn.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM {self.table} WHERE key IN ({placeholders})", chunk
+                ).fetchone()[0]
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                [(key, value, len(value), now) for key, value in items.items()],
+            )
+            self._total_bytes += sum(len(value) for value in items.values())
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop oldest entries until the cache is back under 90% of its size limit."""
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute(f"SELECT key, size FROM {self.table} ORDER BY last_access ASC")
+        evicted = []
+        for key, size in rows:
+            if self._total_bytes <= target:
+                break
+            evicted.append((key,))
+            self._total_bytes -= size
+        self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", evicted)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "bytes": self._total_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class EmbeddingCache(SqliteLRUCache):
+    """Embedding vectors keyed by a hash of the embedding model and the embedded text."""
+
+    def __init__(self, path=DEFAULT_EMBEDDING_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__(path, max_bytes=max_bytes, table="embeddings")
+
+    @staticmethod
+    def key_for(model, text):
+        return content_hash(model, text)
+
+    def get_embeddings(self, model, texts):
+        """Return {text: embedding} for the texts already embedded with this model."""
+        keys = {self.key_for(model, text): text for text in texts}
+        cached = self.get_many(keys)
+        return {keys[key]: array("f", value).tolist() for key, value in cached.items()}
+
+    def put_embeddings(self, model, embeddings):
+        """Store {text: embedding} as packed float32 vectors."""
+        self.put_many({
+            self.key_for(model, text): array("f", embedding).tobytes()
+            for text, embedding in embeddings.items()
+        })
+
+
+DEFAULT_LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite")
+
+
+def normalize_document_text(text):
+    """Collapse whitespace so re-OCR'd text with different spacing still hits the cache."""
+    return " ".join(text.split())
+
+
+class LLMResultCache(SqliteLRUCache):
+    """Structured LLM extraction results keyed by document text, model and prompt version.
+
+    The prompt version is a hash of the system prompt (which embeds the JSON schema), so
+    changing the prompt or schema invalidates old entries while unrelated code changes
+    don't.
+    """
+
+    def __init__(self, path=DEFAULT_LLM_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__(path, max_bytes=max_bytes, table="llm_results")
+
+    @staticmethod
+    def key_for(model, system_prompt, text):
+        prompt_version = content_hash(system_prompt)
+        text_hash = content_hash(normalize_document_text(text))
+        return content_hash(model, prompt_version, text_hash)
+
+    def get_result(self, model, system_prompt, text):
+        value = self.get(self.key_for(model, system_prompt, text))
+        return json.loads(value) if value is not None else None
+
+    def put_result(self, model, system_prompt, text, result):
+        self.put(self.key_for(model, system_prompt, text), json.dumps(result).encode("utf-8"))
+
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """Process-wide LLM result cache shared by the JD and CV pipelines."""
+    global _llm_cache
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = LLMResultCache()
+        return _llm_cache
@@ -0,0 +1,182 @@
+import re
+import json
+
+from pydantic import ValidationError
+
+from metrics import get_logger
+
+logger = get_logger("structured_output")
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL)
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _is_open_object(schema):
+    return schema.get("type") == "object" and not schema.get("properties")
+
+
+def _strictify(schema, defs):
+    """Rewrite a Pydantic JSON schema in place for OpenAI structured outputs.
+
+    Every property becomes required (optional ones are already nullable), objects are
+    closed with additionalProperties: false, and defaults/titles are dropped. Returns
+    False if some object is free-form (e.g. a plain dict field), which strict mode can't
+    express.
+    """
+    strict = True
+    schema.pop("default", None)
+    schema.pop("title", None)
+    if "$ref" in schema:
+        return strict
+    if schema.get("type") == "object":
+        if _is_open_object(schema):
+            strict = False
+        else:
+            schema["required"] = list(schema["properties"])
+            schema["additionalProperties"] = False
+        for child in (schema.get("properties") or {}).values():
+            strict &= _strictify(child, defs)
+    if isinstance(schema.get("items"), dict):
+        strict &= _strictify(schema["items"], defs)
+    for key in ("anyOf", "allOf", "oneOf"):
+        for child in schema.get(key) or []:
+            strict &= _strictify(child, defs)
+    return strict
+
+
+def response_format_for(model, name=None):
+    """`response_format` that constrains a chat completion to the model's JSON schema.
+
+    Uses strict mode when the schema allows it; models with free-form dict fields fall
+    back to non-strict schema guidance.
+    """
+    schema = model.model_json_schema()
+    defs = schema.get("$defs") or {}
+    strict = _strictify(schema, defs)
+    for definition in defs.values():
+        strict &= _strictify(definition, defs)
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": name or model.__name__, "schema": schema, "strict": strict},
+    }
+
+
+def repair_json(text):
+    """Best-effort local fix-up of a model's JSON output.
+
+    Strips code fences and surrounding prose, drops trailing commas, and closes strings,
+    arrays and objects left open by a truncated response (cutting back to the last
+    complete member if the tail is unusable).
+    """
+    fenced = _FENCE_RE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return text.strip()
+    text = text[min(starts):]
+
+    out = []
+    stack = []
+    in_string = escaped = False
+    last_member = None
+    for char in text:
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(_CLOSERS[char])
+        elif char in "]}":
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            if not stack:
+                break
+            stack.pop()
+            out.append(char)
+            if not stack:
+                break
+            continue
+        elif char == ",":
+            last_member = (len(out), list(stack))
+        out.append(char)
+
+    if not stack and not in_string:
+        return "".join(out)
+
+    tail = "".join(out) + ('"' if in_string else "")
+    tail = tail.rstrip().rstrip(",")
+    if tail.endswith(":"):
+        tail += " null"
+    closed = tail + "".join(reversed(stack))
+    try:
+        json.loads(closed)
+        return closed
+    except ValueError:
+        if last_member is None:
+            return closed
+        cut, open_stack = last_member
+        return "".join(out[:cut]) + "".join(reversed(open_stack))
+
+
+def validate_json(model, content, repair=None):
+    """Parse and validate a response in one pass, repairing it if that fails.
+
+    Tries `model.model_validate_json` on the raw content, then on repair_json(content),
+    then, if a `repair(content, error)` callable is given (e.g. a cheap re-ask of the
+    LLM), on whatever it returns. Returns the model instance, or None if nothing
+    validates or there is no content (e.g. a refusal).
+    """
+    if not isinstance(content, str):
+        logger.error(f"No {model.__name__} content to validate (got {type(content).__name__}).")
+        return None
+    try:
+        return model.model_validate_json(content)
+    except ValidationError as e:
+        error = e
+
+    repaired = repair_json(content)
+    if repaired != content:
+        try:
+            return model.model_validate_json(repaired)
+        except ValidationError as e:
+            error = e
+
+    if repair is None:
+        logger.error(f"Unrepairable {model.__name__} response: {error}")
+        return None
+    try:
+        fixed = repair(content, str(error))
+        return model.model_validate_json(repair_json(fixed)) if fixed else None
+    except Exception as e:
+        logger.error(f"Repair of {model.__name__} response failed: {e}")
+        return None
+
+
+def repair_payload(payload, content, error, max_tokens=None):
+    """Chat payload asking the model to fix its own invalid JSON without resending the document."""
+    return {
+        "model": payload["model"],
+        "messages": [
+            {
+                "role": "system",
+                "content": (
+                    "The following JSON was produced by an extraction step but is invalid. "
+                    "Return the corrected JSON only, keeping every value that is present and "
+                    "changing nothing else."
+                )
+            },
+            {"role": "user", "content": f"Validation error:\n{error}\n\nJSON:\n{content}"}
+        ],
+        "max_tokens": max_tokens or payload.get("max_tokens", 2000),
+        **({"response_format": payload["response_format"]} if "response_format" in payload else {}),
+    }
@@ -0,0 +1,68 @@
+import io
+
+from dedup import Deduplicator
+
+CV_TEXT = (
+    "Jane Doe, senior data engineer with eight years of experience building streaming "
+    "pipelines in Python, Spark and Kafka on AWS. Led a team of five engineers and "
+    "migrated batch ETL jobs to real-time processing with exactly-once guarantees. "
+) + " ".join(f"Project {i}: owned ingestion service {i} and its on-call rotation." for i in range(40))
+
+
+def test_identical_bytes_and_near_duplicate_text_resolve_to_first_copy():
+    dedup = Deduplicator()
+    assert dedup.check_stream("a", io.BytesIO(b"same bytes")) is None
+    stream = io.BytesIO(b"same bytes")
+    assert dedup.check_stream("b", stream) == "a"
+    assert stream.tell() == 0
+
+    assert dedup.check_text("a", CV_TEXT) is None
+    assert dedup.check_text("c", CV_TEXT.upper() + "  ") == "a"
+    assert dedup.check_text("d", CV_TEXT.replace("five", "six")) == "a"
+    assert dedup.check_text("e", "A completely different CV about frontend work in React.") is None
+
+
+def test_duplicate_is_held_until_primary_record_is_saved():
+    dedup = Deduplicator()
+    dedup.check_bytes("a", b"cv")
+    assert dedup.check_bytes("b", b"cv") == "a"
+    assert dedup.wait_for("a", {"id": "b"}) is None
+    assert dedup.held_count() == 1
+
+    assert dedup.record_result("a", {"name": "Jane"}) == [{"id": "b"}]
+    assert dedup.held_count() == 0
+    # Copies seen after the primary was saved get its record right away
+    assert dedup.wait_for("a", {"id": "c"}) == {"name": "Jane"}
+
+
+def test_primary_failure_returns_held_duplicates_and_unregisters_it():
+    dedup = Deduplicator()
+    dedup.check_bytes("a", b"cv")
+    dedup.check_text("a", CV_TEXT)
+    dedup.check_bytes("b", b"cv")
+    dedup.wait_for("a", {"id": "b"})
+
+    assert dedup.record_failure("a") == [{"id": "b"}]
+    assert dedup.held_count() == 0
+    # The next copy becomes the primary instead of waiting on the failed one
+    assert dedup.check_bytes("b", b"cv") is None
+    assert dedup.check_text("b", CV_TEXT) is None
+
+
+def test_saved_primaries_resolve_duplicates_in_later_runs(tmp_path):
+    path = str(tmp_path / "dedup.sqlite")
+    first = Deduplicator(path=path)
+    first.check_bytes("a", b"cv")
+    first.check_text("a", CV_TEXT)
+    first.record_result("a", {"name": "Jane"})
+    first.check_bytes("failed", b"other cv")
+    first.close()
+
+    second = Deduplicator(path=path)
+    assert second.check_bytes("a", b"cv") is None
+    assert second.check_bytes("b", b"cv") == "a"
+    assert second.check_text("c", CV_TEXT + " Open to remote roles.") == "a"
+    assert second.wait_for("a", {"id": "b"}) == {"name": "Jane"}
+    # Primaries without a saved record are not remembered
+    assert second.check_bytes("retry", b"other cv") is None
+    second.close()
@@ -0,0 +1,144 @@
+import io
+import mmap
+import struct
+import zipfile
+
+import pytest
+
+import extractors
+from extractors import DOC, DOCX, IMAGE, PDF, RTF, TEXT, document_bytes, rtf_to_text, sniff_content_type
+
+_END_OF_CHAIN, _FREE, _NO_STREAM = 0xFFFFFFFE, 0xFFFFFFFF, 0xFFFFFFFF
+
+
+def _compound_file(streams):
+    """A minimal OLE2 (v3, 512-byte sector) file holding `streams`, a name -> bytes dict.
+
+    Every stream is padded to at least 4096 bytes so it lives in the regular FAT.
+    """
+    names = list(streams)
+    datas = [streams[name].ljust(max(4096, -(-len(streams[name]) // 512) * 512), b"\0") for name in names]
+    # Sector 0 is the FAT, sector 1 the directory, then each stream's sectors in order
+    fat, starts = [0xFFFFFFFD, _END_OF_CHAIN], []
+    for data in datas:
+        starts.append(len(fat))
+        count = len(data) // 512
+        fat.extend(list(range(len(fat) + 1, len(fat) + count)) + [_END_OF_CHAIN])
+    fat_sector = b"".join(struct.pack("<I", v) for v in fat).ljust(512, b"\xff")
+
+    def entry(name, kind, left=_NO_STREAM, child=_NO_STREAM, start=_END_OF_CHAIN, size=0):
+        encoded = (name + "\0").encode("utf-16-le") if name else b""
+        return (encoded.ljust(64, b"\0") + struct.pack("<HBB", len(encoded), kind, 1)
+                + struct.pack("<III", left, _NO_STREAM, child) + b"\0" * 36 + struct.pack("<III", start, size, 0))
+
+    # Root -> first stream; each stream hangs off the previous one as its left sibling
+    directory = entry("Root Entry", 5, child=1)
+    for i, (name, data) in enumerate(zip(names, datas)):
+        left = i + 2 if i + 1 < len(names) else _NO_STREAM
+        directory += entry(name, 2, left=left, start=starts[i], size=len(data))
+    directory = directory.ljust(512, b"\0")
+
+    header = (extractors._OLE_MAGIC + b"\0" * 16 + struct.pack("<HHHHH", 0x3E, 3, 0xFFFE, 9, 6) + b"\0" * 6
+              + struct.pack("<IIIIIIIII", 0, 1, 1, 0, 4096, _END_OF_CHAIN, 0, _END_OF_CHAIN, 0)
+              + struct.pack("<I", 0) + struct.pack("<I", _FREE) * 108)
+    return header + fat_sector + directory + b"".join(datas)
+
+
+def _word_document(pieces):
+    """A Word 97 file whose piece table holds `pieces`: (text, compressed) pairs in order."""
+    word = bytearray(8192)
+    word[0:2] = struct.pack("<H", 0xA5EC)
+    # FibRgW97 (14 words), FibRgLw97 (22 longs), then cbRgFcLcb and the fc/lcb pairs
+    struct.pack_into("<H", word, 32, 14)
+    struct.pack_into("<H", word, 62, 22)
+    struct.pack_into("<H", word, 152, 93)
+    fc_lcb = 154
+
+    cps, pcds, position, cp = [0], [], 1024, 0
+    for text, compressed in pieces:
+        data = text.encode("cp1252" if compressed else "utf-16-le")
+        word[position:position + len(data)] = data
+        fc = position * 2 | 0x40000000 if compressed else position
+        pcds.append(struct.pack("<HIH", 0, fc, 0))
+        cp += len(text)
+        cps.append(cp)
+        position += len(data) + 16
+    plc = b"".join(struct.pack("<I", c) for c in cps) + b"".join(pcds)
+    # One Prc (property modifier) before the Pcdt, which the reader must skip
+    clx = b"\x01" + struct.pack("<H", 2) + b"\x00\x00" + b"\x02" + struct.pack("<I", len(plc)) + plc
+    struct.pack_into("<II", word, fc_lcb + 33 * 8, 0, len(clx))
+    return _compound_file({"WordDocument": bytes(word), "0Table": clx})
+
+
+def _zip(names):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name in names:
+            archive.writestr(name, "<xml/>")
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("data, declared_mime, expected", [
+    (b"%PDF-1.7\n...", None, PDF),
+    (_zip(["[Content_Types].xml", "word/document.xml"]), None, DOCX),
+    (_zip(["xl/workbook.xml"]), None, None),
+    (b"PK\x03\x04 truncated archive", None, None),
+    (_compound_file({"WordDocument": b"\xec\xa5"}), None, DOC),
+    (_compound_file({"Workbook": b"\x09\x08"}), None, None),
+    (b"{\\rtf1\\ansi Jane Doe}", None, RTF),
+    (b"\x89PNG\r\n\x1a\n" + b"\0" * 32, None, IMAGE),
+    (b"RIFF\0\0\0\0WEBPVP8 ", None, IMAGE),
+    ("Jane Doe\nData engineer, Zürich\n".encode("utf-8"), None, TEXT),
+    (b"\x00\x01\x02\x03" * 16, None, None),
+    (b"\x00\x01\x02\x03" * 16, "application/vnd.google-apps.document", TEXT),
+])
+def test_sniff_content_type_uses_magic_bytes(data, declared_mime, expected):
+    stream = io.BytesIO(data)
+    assert sniff_content_type(stream, declared_mime) == expected
+    assert stream.tell() == 0
+
+
+def test_sniff_recognizes_word_files_without_olefile(monkeypatch):
+    monkeypatch.setattr(extractors, "olefile", None)
+    assert sniff_content_type(io.BytesIO(_compound_file({"WordDocument": b"\xec\xa5"}))) == DOC
+    assert sniff_content_type(io.BytesIO(_compound_file({"Workbook": b"\x09\x08"}))) is None
+
+
+def test_doc_text_is_read_from_the_piece_table():
+    pytest.importorskip("olefile")
+    document = _word_document([
+        ("Jane Doe\rData engineer\x0b", True),
+        ("Café – \x13 HYPERLINK \"https://example.com\" \x14portfolio\x15\r", False),
+    ])
+    text = extractors._doc_text_olefile(io.BytesIO(document))
+    assert text == "Jane Doe\nData engineer\nCafé – portfolio\n"
+
+
+def test_doc_text_rejects_files_that_are_not_word_97():
+    pytest.importorskip("olefile")
+    with pytest.raises(ValueError):
+        extractors._doc_text_olefile(io.BytesIO(_compound_file({"WordDocument": b"\0" * 64, "0Table": b""})))
+
+
+def test_rtf_to_text_skips_destinations_and_decodes_escapes():
+    rtf = (
+        r"{\rtf1\ansi\ansicpg1252{\fonttbl{\f0 Arial;}}{\colortbl;\red0\green0\blue0;}"
+        r"{\*\generator Writer;}\f0 Jane Doe\par "
+        r"Caf\'e9 \endash  \{senior\}\tab engineer\line "
+        r"{\field{\*\fldinst HYPERLINK https://example.com}{\fldrslt portfolio}}\par "
+        r"\uc1\u8364?50k\~net}"
+    )
+    assert rtf_to_text(rtf) == "Jane Doe\nCafé – {senior}\tengineer\nportfolio\n€50k\u00a0net"
+
+
+def test_document_bytes_maps_files_and_closes_the_mapping(tmp_path):
+    path = tmp_path / "cv.pdf"
+    path.write_bytes(b"%PDF-1.7 spilled to disk")
+    with open(path, "rb") as f:
+        with document_bytes(f) as data:
+            assert isinstance(data, mmap.mmap)
+            assert data[:5] == b"%PDF-"
+        assert data.closed
+
+    with document_bytes(io.BytesIO(b"%PDF-1.7 in memory")) as data:
+        assert data == b"%PDF-1.7 in memory"
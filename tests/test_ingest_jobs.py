@@ -0,0 +1,41 @@
+import json
+
+from ingest_jobs import DONE, IngestWorkerPool, JobQueue, job_metrics_path
+
+
+class RecordingLoader:
+    def __init__(self):
+        self.stats = {"upserted": 1, "unchanged": 0, "deleted": 0, "errors": 0}
+        self.metrics_paths = []
+
+    def load_and_index(self, metrics_path=None, progress=None):
+        self.metrics_paths.append(metrics_path)
+        progress(1, self.stats)
+
+
+def test_job_metrics_path_inserts_the_job_id():
+    assert job_metrics_path("/var/metrics/ingest.prom", "abc") == "/var/metrics/ingest.abc.prom"
+    assert job_metrics_path("metrics", "abc") == "metrics.abc"
+    assert job_metrics_path(None, "abc") is None
+
+
+def test_each_job_exports_metrics_to_its_own_path(tmp_path):
+    candidates = tmp_path / "candidates.jsonl"
+    candidates.write_text(json.dumps({"personal_info": {"name": "Jane"}}) + "\n")
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    loaders = []
+
+    def make_loader(job):
+        loaders.append(RecordingLoader())
+        return loaders[-1]
+
+    pool = IngestWorkerPool(queue, make_loader, metrics_path=str(tmp_path / "metrics.json"))
+    first, second = (pool.submit(str(candidates), "cv-index") for _ in range(2))
+    for _ in range(2):
+        pool.run_job(queue.claim())
+
+    assert [loader.metrics_paths for loader in loaders] == [
+        [str(tmp_path / f"metrics.{first}.json")], [str(tmp_path / f"metrics.{second}.json")],
+    ]
+    assert {queue.get(job_id)["status"] for job_id in (first, second)} == {DONE}
+    queue.close()
@@ -0,0 +1,180 @@
+import json
+import time
+import asyncio
+from functools import partial
+
+import pytest
+from aiohttp import web
+
+from metrics import metrics
+from llm_client import ExtractionClient, ExtractionError, ThreadedExtractionClient, TokenBucket, estimate_request_tokens
+
+PAYLOAD = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "x" * 400}], "max_tokens": 100}
+
+
+def _completion(message, finish_reason="stop"):
+    return {"choices": [{"message": message, "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 20}}
+
+
+def _run_against(responses, test, **client_kwargs):
+    """Serve `responses` and run `test(client, requests)` against the server.
+
+    `responses` are zero-argument factories of aiohttp responses, one per request in order;
+    the last one answers any further requests.
+    """
+    requests = []
+
+    async def handler(request):
+        requests.append(await request.json())
+        return responses[min(len(requests), len(responses)) - 1]()
+
+    async def main():
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        client = ExtractionClient("test-key", base_url=f"http://127.0.0.1:{port}/v1", **client_kwargs)
+        try:
+            return await test(client, requests)
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    return asyncio.run(main())
+
+
+def _no_sleep_backoff(client, calls):
+    """Record the client's backoff calls and skip the actual waiting."""
+    backoff = client._backoff
+
+    def record(attempt, retry_after=None):
+        calls.append((attempt, retry_after, backoff(attempt, retry_after)))
+        return 0
+    client._backoff = record
+
+
+def test_429_is_retried_honouring_retry_after():
+    calls = []
+
+    async def test(client, requests):
+        _no_sleep_backoff(client, calls)
+        content = await client.chat_content(PAYLOAD)
+        return content, len(requests), client.retries
+
+    responses = [
+        partial(web.Response, status=429, text="rate limited", headers={"Retry-After": "7"}),
+        partial(web.Response, status=503, text="overloaded"),
+        partial(web.json_response, _completion({"content": '{"name": "Jane"}'})),
+    ]
+    content, request_count, retries = _run_against(responses, test)
+
+    assert content == '{"name": "Jane"}'
+    assert (request_count, retries) == (3, 2)
+    (first_attempt, retry_after, first_delay), (second_attempt, no_header, _) = calls
+    assert (first_attempt, retry_after) == (0, "7")
+    assert 7 <= first_delay <= 8
+    assert (second_attempt, no_header) == (1, None)
+
+
+def test_client_errors_are_not_retried_and_retries_are_bounded():
+    async def bad_request(client, requests):
+        with pytest.raises(ExtractionError, match="400"):
+            await client.chat(PAYLOAD)
+        return len(requests)
+
+    assert _run_against([partial(web.Response, status=400, text="bad schema")], bad_request) == 1
+
+    async def always_busy(client, requests):
+        _no_sleep_backoff(client, [])
+        with pytest.raises(ExtractionError, match="502"):
+            await client.chat(PAYLOAD)
+        return len(requests), client.retries
+
+    assert _run_against([partial(web.Response, status=502, text="bad gateway")], always_busy, max_retries=3) == (4, 3)
+
+
+def test_backoff_is_full_jitter_capped_at_backoff_max():
+    client = ExtractionClient("test-key", backoff_base=1.0, backoff_max=10.0)
+    for attempt in range(8):
+        delays = [client._backoff(attempt) for _ in range(200)]
+        cap = min(10.0, 2 ** attempt)
+        assert all(0 <= delay <= cap for delay in delays)
+        # Jittered, so retries from many workers don't line up
+        assert len(set(delays)) > 1
+    assert max(client._backoff(7) for _ in range(200)) > 5
+    # Retry-After given as an HTTP date falls back to the exponential backoff
+    assert 0 <= client._backoff(2, "Wed, 21 Oct 2026 07:28:00 GMT") <= 4
+
+
+def test_refusals_and_missing_content_raise():
+    async def test(client, requests):
+        with metrics.scope() as run_metrics:
+            with pytest.raises(ExtractionError, match="refused the request: not a CV"):
+                await client.chat_content(PAYLOAD)
+            with pytest.raises(ExtractionError, match="finish_reason=content_filter"):
+                await client.chat_content(PAYLOAD)
+            with pytest.raises(ExtractionError, match="empty response"):
+                await client.chat_content(PAYLOAD)
+        return run_metrics
+
+    responses = [
+        partial(web.json_response, _completion({"content": None, "refusal": "not a CV"})),
+        partial(web.json_response, _completion({"content": None}, finish_reason="content_filter")),
+        partial(web.json_response, {"choices": []}),
+    ]
+    run_metrics = _run_against(responses, test)
+    assert run_metrics.counter("llm_refusals_total") == 1
+    assert run_metrics.counter("llm_requests_total", model="gpt-4o-mini") == 3
+    assert run_metrics.counter("llm_prompt_tokens_total", model="gpt-4o-mini") == 200
+
+
+def test_token_bucket_waits_for_refill():
+    async def test():
+        # 6000/min refills 100 units a second
+        bucket = TokenBucket(6000)
+        await bucket.acquire(6000)
+        started = time.monotonic()
+        await bucket.acquire(20)
+        waited = time.monotonic() - started
+        # Requests larger than the bucket are clamped to a full bucket instead of waiting forever
+        oversized = TokenBucket(6000)
+        await asyncio.wait_for(oversized.acquire(10 ** 6), timeout=1)
+        return waited
+
+    assert 0.15 <= asyncio.run(test()) < 1.0
+
+
+def test_rpm_and_tpm_buckets_pace_requests():
+    def drained(bucket_name):
+        async def test(client, requests):
+            client._ensure_session()
+            getattr(client, bucket_name).tokens = 0
+            started = time.monotonic()
+            await asyncio.gather(*(client.chat(PAYLOAD) for _ in range(3)))
+            return time.monotonic() - started
+        return test
+
+    response = partial(web.json_response, _completion({"content": "{}"}))
+    assert estimate_request_tokens(PAYLOAD) == 200
+    # With the buckets drained, 600 requests/min lets one through every 0.1s
+    assert 0.25 <= _run_against([response], drained("_request_bucket"), rpm=600) < 2
+    # 60000 tokens/min is 1000 a second, so each 200-token request waits 0.2s
+    assert 0.55 <= _run_against([response], drained("_token_bucket"), tpm=60000) < 2
+
+
+def test_threaded_client_returns_content_to_other_threads():
+    async def test(client, requests):
+        # The wrapped client's session lives on the background loop, which close() shuts down
+        threaded = ThreadedExtractionClient(client)
+        try:
+            return await asyncio.wrap_future(threaded.submit(PAYLOAD)), requests
+        finally:
+            await asyncio.to_thread(threaded.close)
+
+    content, requests = _run_against([partial(web.json_response, _completion({"content": "ok"}))], test)
+    assert content == "ok"
+    assert json.dumps(requests[0], sort_keys=True) == json.dumps(PAYLOAD, sort_keys=True)
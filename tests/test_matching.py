@@ -0,0 +1,29 @@
+import math
+
+import numpy as np
+
+from matching import CandidateMatrix, match_jds
+
+
+def _matrix(experience):
+    ids = [f"c{i}" for i in range(len(experience))]
+    embeddings = np.eye(len(experience), 4)
+    return CandidateMatrix(ids, embeddings, experience, [""] * len(experience), [set()] * len(experience))
+
+
+def test_unknown_experience_passes_the_minimum_experience_filter():
+    matrix = _matrix([1.0, np.nan, 6.0])
+    [result] = match_jds([{"role": "Engineer", "experience": "5+ years"}], matrix, np.ones((1, 4)))
+
+    shortlisted = {entry["candidate_id"]: entry["total_experience"] for entry in result["shortlist"]}
+    assert shortlisted == {"c1": None, "c2": 6.0}
+
+
+def test_from_candidates_keeps_zero_years_distinct_from_unknown(monkeypatch):
+    monkeypatch.setattr("matching.embed_texts", lambda texts, model, cache: np.ones((len(texts), 4)))
+    matrix = CandidateMatrix.from_candidates([
+        {"personal_info": {"name": "A"}, "total_experience": 0},
+        {"personal_info": {"name": "B"}, "total_experience": None},
+    ])
+    assert matrix.experience[0] == 0.0
+    assert math.isnan(matrix.experience[1])
@@ -0,0 +1,40 @@
+from skill_index import InvertedSkillIndex
+
+
+def test_readding_a_candidate_replaces_its_skills():
+    index = InvertedSkillIndex()
+    index.add_candidate("a", ["Python", "k8s"])
+    index.add_candidate("b", ["python"])
+
+    index.add_candidate("a", ["Go"])
+
+    assert index.candidates_with_all(["python"]) == {"b"}
+    assert index.candidates_with_all(["kubernetes"]) == set()
+    assert index.candidates_with_all(["golang"]) == {"a"}
+
+
+def test_remove_candidate_and_save_load_round_trip(tmp_path):
+    index = InvertedSkillIndex()
+    index.add_candidate("a", ["python", "sql"])
+    index.add_candidate("b", ["python"])
+    index.remove_candidate("b")
+    path = str(tmp_path / "skills.json")
+    index.save(path)
+
+    loaded = InvertedSkillIndex.load(path)
+    assert loaded.candidates_with_all(["python"]) == {"a"}
+    loaded.add_candidate("a", ["sql"])
+    assert loaded.candidates_with_all(["python"]) == set()
+    assert loaded.candidates_with_all(["sql"]) == {"a"}
+
+
+def test_cv_is_not_read_as_computer_vision(tmp_path):
+    index = InvertedSkillIndex()
+    index.vocabulary.aliases["cv"] = "computer vision"  # as saved by older versions
+    index.add_candidate("a", ["Computer Vision"])
+    path = str(tmp_path / "skills.json")
+    index.save(path)
+
+    loaded = InvertedSkillIndex.load(path)
+    assert loaded.candidates_with_all(["cv"]) == set()
+    assert loaded.candidates_with_all(["computer vision"]) == {"a"}
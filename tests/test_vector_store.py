@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from vector_store import LocalVectorStore, VectorStore
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(0)
+    return [
+        (f"c{i}#{section}", rng.random(8).tolist(), {"candidate_id": f"c{i}", "section": section})
+        for i in range(40) for section in ("profile", "skills")
+    ]
+
+
+@pytest.mark.parametrize("mode", ["exact", "ivf"])
+def test_query_finds_stored_vector(tmp_path, vectors, mode):
+    store = LocalVectorStore(str(tmp_path), dimension=8, mode=mode, nlist=4, nprobe=4)
+    store.upsert(vectors)
+
+    vector_id, values, _ = vectors[17]
+    matches = store.query(values, top_k=3)
+
+    assert matches[0]["id"] == vector_id
+    assert len(matches) == 3
+
+
+def test_ivf_query_candidates_and_filter(tmp_path, vectors):
+    store = LocalVectorStore(str(tmp_path), dimension=8, mode="ivf", nlist=4, nprobe=4)
+    store.upsert(vectors)
+    _, values, _ = vectors[0]
+
+    filtered = store.query(values, top_k=5, filter={"section": "skills"})
+    assert filtered and all(m["metadata"]["section"] == "skills" for m in filtered)
+
+    restricted = store.query_candidates(values, {"c3", "c5"}, top_k=10)
+    assert {m["metadata"]["candidate_id"] for m in restricted} == {"c3", "c5"}
+
+
+def test_backends_must_implement_the_interface():
+    class Partial(VectorStore):
+        def upsert(self, vectors):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
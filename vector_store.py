@@ -0,0 +1,455 @@
+import os
+import abc
+import json
+import sqlite3
+import threading
+
+import numpy as np
+
+from metrics import get_logger
+
+try:
+    import hnswlib
+except ImportError:  # Optional: only needed for LocalVectorStore(mode="hnsw")
+    hnswlib = None
+
+logger = get_logger("vector_store")
+
+DEFAULT_DIMENSION = 1536  # text-embedding-3-small
+
+
+class VectorStore(abc.ABC):
+    """Backend interface used by PineconeLoader and the search/matching code.
+
+    Vectors are (id, values, metadata) tuples. query() returns matches as dicts with
+    id, score and metadata, best first. For the euclidean metric the score is a
+    squared distance (lower is better), as with Pinecone; for cosine/dotproduct a
+    higher score is better.
+    """
+
+    metric = "euclidean"
+    # Largest top_k a single query() accepts, or None if unlimited
+    max_top_k = None
+
+    @property
+    def higher_is_better(self):
+        return self.metric != "euclidean"
+
+    @property
+    @abc.abstractmethod
+    def location(self):
+        """Backend and place of the stored vectors, e.g. "pinecone:cv-index"; keys the index manifest."""
+
+    @abc.abstractmethod
+    def upsert(self, vectors):
+        """Insert or replace (id, values, metadata) vectors."""
+
+    @abc.abstractmethod
+    def query(self, vector, top_k=10, filter=None, include_metadata=True):
+        """Return the top_k matches for `vector`, optionally restricted by a metadata filter."""
+
+    @abc.abstractmethod
+    def delete(self, ids):
+        """Delete vectors by id; unknown ids are ignored."""
+
+    @abc.abstractmethod
+    def fetch(self, ids):
+        """Return {id: {"values": [...], "metadata": {...}}} for the ids that exist."""
+
+
+class PineconeVectorStore(VectorStore):
+    """Pinecone serverless index, created on first use if it doesn't exist."""
+
+    # Pinecone caps top_k at 10000, and at 1000 when metadata is returned (as query() does by default)
+    max_top_k = 1000
+
+    def __init__(self, index_name, dimension=DEFAULT_DIMENSION, metric="euclidean", client=None,
+                 cloud="aws", region="us-east-1"):
+        from pinecone import Pinecone, ServerlessSpec
+
+        self.index_name = index_name
+        self.metric = metric
+        self.client = client or Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+        self._index = None
+
+        # Check if the index exists, and create it if it doesn't
+        index_names = [index['name'] for index in self.client.list_indexes()]
+        if self.index_name not in index_names:
+            self.client.create_index(
+                name=self.index_name,
+                dimension=dimension,
+                metric=metric,
+                spec=ServerlessSpec(cloud=cloud, region=region)
+            )
+            logger.info(f"Created Pinecone index {self.index_name}")
+
+    @property
+    def location(self):
+        return f"pinecone:{self.index_name}"
+
+    @property
+    def index(self):
+        """Pinecone index handle, created once and reused for every call."""
+        if self._index is None:
+            self._index = self.client.Index(self.index_name)
+        return self._index
+
+    def upsert(self, vectors):
+        self.index.upsert(vectors=vectors)
+
+    def query(self, vector, top_k=10, filter=None, include_metadata=True):
+        response = self.index.query(vector=vector, top_k=top_k, filter=filter, include_metadata=include_metadata)
+        return [
+            {"id": match["id"], "score": match["score"], "metadata": match.get("metadata") or {}}
+            for match in response["matches"]
+        ]
+
+    def delete(self, ids):
+        if ids:
+            self.index.delete(ids=list(ids))
+
+    def fetch(self, ids):
+        response = self.index.fetch(ids=list(ids))
+        return {
+            vector_id: {"values": vector["values"], "metadata": vector.get("metadata") or {}}
+            for vector_id, vector in response["vectors"].items()
+        }
+
+
+def matches_filter(metadata, filter):
+    """Evaluate a Pinecone-style metadata filter ($eq, $ne, $gt(e), $lt(e), $in, $nin, $and, $or)."""
+    if not filter:
+        return True
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, expected in condition.items():
+            # List-valued metadata (e.g. skills) matches if any element matches, as in Pinecone
+            values = value if isinstance(value, list) else [value]
+            if op == "$eq":
+                ok = expected in values
+            elif op == "$ne":
+                ok = expected not in values
+            elif op == "$in":
+                ok = any(v in expected for v in values)
+            elif op == "$nin":
+                ok = not any(v in expected for v in values)
+            elif op in ("$gt", "$gte", "$lt", "$lte"):
+                if value is None or isinstance(value, (list, str)):
+                    return False
+                ok = {"$gt": value > expected, "$gte": value >= expected,
+                      "$lt": value < expected, "$lte": value <= expected}[op]
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+            if not ok:
+                return False
+    return True
+
+
+class LocalVectorStore(VectorStore):
+    """In-process vector store backed by a memory-mapped float32 matrix.
+
+    Vectors live in `<path>/vectors.f32` and ids/metadata in `<path>/metadata.sqlite`.
+    Exact search is a single BLAS matrix-vector product over all live rows. With
+    mode="ivf" queries only scan the `nprobe` nearest of `nlist` k-means clusters, and
+    mode="hnsw" uses an hnswlib graph; both approximate indexes are built in memory on
+    first query and rebuilt after writes.
+    """
+
+    def __init__(self, path, dimension=DEFAULT_DIMENSION, metric="euclidean", mode="exact",
+                 nlist=None, nprobe=8, initial_capacity=1024):
+        if metric not in ("euclidean", "cosine", "dotproduct"):
+            raise ValueError(f"Unsupported metric: {metric}")
+        if mode not in ("exact", "ivf", "hnsw"):
+            raise ValueError(f"Unsupported mode: {mode}")
+        if mode == "hnsw" and hnswlib is None:
+            raise ImportError("mode='hnsw' requires the hnswlib package")
+
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dimension = dimension
+        self.metric = metric
+        self.mode = mode
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self._lock = threading.RLock()
+        self._vectors_path = os.path.join(path, "vectors.f32")
+
+        self._conn = sqlite3.connect(os.path.join(path, "metadata.sqlite"), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors (row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, metadata TEXT)"
+        )
+        self._conn.commit()
+
+        rows = self._conn.execute("SELECT row, id, metadata FROM vectors ORDER BY row").fetchall()
+        self._size = rows[-1][0] + 1 if rows else 0
+        self._row_of = {vector_id: row for row, vector_id, _ in rows}
+        self._ids = [None] * self._size
+        self._metadata = [None] * self._size
+        # candidate_id -> rows, so per-candidate queries work when candidates are stored as chunks
+        self._rows_by_candidate = {}
+        for row, vector_id, metadata in rows:
+            self._ids[row] = vector_id
+            self._metadata[row] = json.loads(metadata) if metadata else {}
+            self._rows_by_candidate.setdefault(self._candidate_of(row), set()).add(row)
+
+        capacity = max(initial_capacity, self._size)
+        if os.path.exists(self._vectors_path):
+            capacity = max(capacity, os.path.getsize(self._vectors_path) // (4 * dimension))
+        self._open_matrix(capacity)
+
+        self._live = np.zeros(capacity, dtype=bool)
+        self._live[[row for row, _, _ in rows]] = True
+        self._sq_norms = np.einsum("ij,ij->i", self._matrix[:self._size], self._matrix[:self._size])
+        self._ann = None
+
+    def _candidate_of(self, row):
+        return self._metadata[row].get("candidate_id", self._ids[row])
+
+    def _open_matrix(self, capacity):
+        mode = "r+" if os.path.exists(self._vectors_path) else "w+"
+        if mode == "r+" and os.path.getsize(self._vectors_path) < capacity * self.dimension * 4:
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(capacity * self.dimension * 4)
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode=mode,
+                                 shape=(capacity, self.dimension))
+        self._capacity = capacity
+
+    def _grow(self, needed):
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        self._matrix.flush()
+        del self._matrix
+        self._open_matrix(capacity)
+        live = np.zeros(capacity, dtype=bool)
+        live[:len(self._live)] = self._live
+        self._live = live
+
+    @property
+    def location(self):
+        return f"local:{os.path.abspath(self.path)}"
+
+    def __len__(self):
+        return int(self._live.sum())
+
+    def upsert(self, vectors):
+        with self._lock:
+            rows, records = [], []
+            for vector_id, values, metadata in vectors:
+                row = self._row_of.get(vector_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._row_of[vector_id] = row
+                    self._ids.append(vector_id)
+                    self._metadata.append(None)
+                else:
+                    self._rows_by_candidate.get(self._candidate_of(row), set()).discard(row)
+                rows.append(row)
+                self._metadata[row] = metadata or {}
+                self._rows_by_candidate.setdefault(self._candidate_of(row), set()).add(row)
+                records.append((row, vector_id, json.dumps(metadata or {})))
+            if self._size > self._capacity:
+                self._grow(self._size)
+
+            block = np.asarray([values for _, values, _ in vectors], dtype=np.float32)
+            self._matrix[rows] = block
+            self._live[rows] = True
+            norms = np.einsum("ij,ij->i", block, block)
+            if len(self._sq_norms) < self._size:
+                self._sq_norms = np.concatenate([self._sq_norms, np.zeros(self._size - len(self._sq_norms), np.float32)])
+            self._sq_norms[rows] = norms
+
+            self._conn.executemany("INSERT OR REPLACE INTO vectors (row, id, metadata) VALUES (?, ?, ?)", records)
+            self._conn.commit()
+            self._matrix.flush()
+            self._ann = None
+
+    def delete(self, ids):
+        with self._lock:
+            rows = [self._row_of[vector_id] for vector_id in ids if vector_id in self._row_of]
+            if not rows:
+                return
+            # Rows are tombstoned; their slots stay allocated so row numbers remain stable
+            self._live[rows] = False
+            self._conn.executemany("DELETE FROM vectors WHERE row = ?", [(row,) for row in rows])
+            self._conn.commit()
+            for row in rows:
+                self._rows_by_candidate.get(self._candidate_of(row), set()).discard(row)
+                del self._row_of[self._ids[row]]
+                self._ids[row] = None
+                self._metadata[row] = None
+            self._ann = None
+
+    def fetch(self, ids):
+        with self._lock:
+            return {
+                vector_id: {"values": self._matrix[row].tolist(), "metadata": self._metadata[row]}
+                for vector_id in ids
+                if (row := self._row_of.get(vector_id)) is not None
+            }
+
+    def _scores(self, queries, rows=None):
+        """Scores of each query against the given rows (all rows when None), as a (q, n) matrix."""
+        matrix = self._matrix[:self._size] if rows is None else self._matrix[rows]
+        dots = queries @ matrix.T
+        if self.metric == "dotproduct":
+            return dots
+        sq_norms = self._sq_norms[:self._size] if rows is None else self._sq_norms[rows]
+        if self.metric == "cosine":
+            query_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            return dots / np.maximum(query_norms * np.sqrt(sq_norms)[None, :], 1e-12)
+        query_sq = np.einsum("ij,ij->i", queries, queries)[:, None]
+        return np.maximum(query_sq - 2 * dots + sq_norms[None, :], 0.0)
+
+    def _candidate_rows(self, query):
+        """Rows to score for one query: everything in exact mode, probed clusters in IVF mode."""
+        if self.mode != "ivf":
+            return None
+        if self._ann is None:
+            self._build_ivf()
+        centroids, lists = self._ann
+        distances = ((centroids - query) ** 2).sum(axis=1)
+        probe = np.argsort(distances)[:self.nprobe]
+        return np.concatenate([lists[c] for c in probe]) if len(probe) else np.array([], dtype=np.int64)
+
+    def _build_ivf(self, iterations=10, seed=0):
+        live_rows = np.flatnonzero(self._live[:self._size])
+        nlist = self.nlist or max(1, int(np.sqrt(len(live_rows))))
+        nlist = min(nlist, max(1, len(live_rows)))
+        rng = np.random.default_rng(seed)
+        data = np.asarray(self._matrix[live_rows])
+        centroids = data[rng.choice(len(data), nlist, replace=False)] if len(data) else np.zeros((1, self.dimension), np.float32)
+        assignment = np.zeros(len(data), dtype=np.int64)
+        for _ in range(iterations):
+            distances = (
+                np.einsum("ij,ij->i", data, data)[:, None]
+                - 2 * data @ centroids.T
+                + np.einsum("ij,ij->i", centroids, centroids)[None, :]
+            )
+            assignment = distances.argmin(axis=1)
+            for c in range(len(centroids)):
+                members = data[assignment == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+        lists = [live_rows[assignment == c] for c in range(len(centroids))]
+        self._ann = (centroids, lists)
+
+    def _build_hnsw(self):
+        live_rows = np.flatnonzero(self._live[:self._size])
+        space = {"euclidean": "l2", "cosine": "cosine", "dotproduct": "ip"}[self.metric]
+        index = hnswlib.Index(space=space, dim=self.dimension)
+        index.init_index(max_elements=max(1, len(live_rows)), ef_construction=200, M=16)
+        if len(live_rows):
+            index.add_items(np.asarray(self._matrix[live_rows]), live_rows)
+        index.set_ef(max(50, self.nprobe * 10))
+        self._ann = index
+
+    def _top_k(self, scores, rows, top_k, filter):
+        if rows is None:
+            rows = np.arange(self._size)
+        order_scores = -scores if self.higher_is_better else scores
+        live = self._live[rows]
+        order_scores = np.where(live, order_scores, np.inf)
+        # Without a filter argpartition is enough; with one, widen the window until it fills
+        window = top_k if not filter else top_k * 4
+        while True:
+            window = min(window, len(rows))
+            if window == 0:
+                return []
+            top = np.argpartition(order_scores, window - 1)[:window]
+            top = top[np.argsort(order_scores[top])]
+            matches = []
+            for i in top:
+                if not np.isfinite(order_scores[i]):
+                    break
+                row = int(rows[i])
+                if matches_filter(self._metadata[row], filter):
+                    matches.append((row, float(scores[i])))
+                    if len(matches) == top_k:
+                        return matches
+            if window == len(rows):
+                return matches
+            window *= 4
+
+    def query(self, vector, top_k=10, filter=None, include_metadata=True):
+        return self.query_many([vector], top_k=top_k, filter=filter, include_metadata=include_metadata)[0]
+
+    def query_candidates(self, vector, candidate_ids, top_k=10, filter=None, include_metadata=True):
+        """Exact search over just the vectors of the given candidates, without scanning the rest."""
+        with self._lock:
+            rows = np.asarray(sorted(
+                row for candidate_id in candidate_ids for row in self._rows_by_candidate.get(candidate_id, ())
+            ), dtype=np.int64)
+            query = np.asarray(vector, dtype=np.float32).reshape(1, self.dimension)
+            scores = self._scores(query, rows)[0] if len(rows) else np.zeros(0, np.float32)
+            return [
+                {"id": self._ids[row], "score": score, "metadata": self._metadata[row] if include_metadata else {}}
+                for row, score in self._top_k(scores, rows, top_k, filter)
+            ]
+
+    def query_many(self, vectors, top_k=10, filter=None, include_metadata=True):
+        """Answer several queries with one matrix product (exact mode) or per-query probes."""
+        with self._lock:
+            queries = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+            results = []
+            if self.mode == "hnsw":
+                if self._ann is None:
+                    self._build_hnsw()
+                # Over-fetch so tombstones and filters still leave top_k matches
+                k = min(len(self), top_k * (4 if filter else 1))
+                labels, _ = self._ann.knn_query(queries, k=k) if k else (np.zeros((len(queries), 0), int), None)
+                for query, candidate_rows in zip(queries, labels):
+                    candidate_rows = np.asarray(candidate_rows, dtype=np.int64)
+                    scores = self._scores(query[None, :], candidate_rows)[0]
+                    results.append(self._top_k(scores, candidate_rows, top_k, filter))
+            elif self.mode == "ivf":
+                for query in queries:
+                    candidate_rows = self._candidate_rows(query)
+                    scores = self._scores(query[None, :], candidate_rows)[0]
+                    results.append(self._top_k(scores, candidate_rows, top_k, filter))
+            else:
+                all_scores = self._scores(queries)
+                for query, scores in zip(queries, all_scores):
+                    results.append(self._top_k(scores, None, top_k, filter))
+
+            return [
+                [
+                    {"id": self._ids[row], "score": score,
+                     "metadata": self._metadata[row] if include_metadata else {}}
+                    for row, score in matches
+                ]
+                for matches in results
+            ]
+
+
+def aggregate_by_candidate(matches, higher_is_better, top_k=None):
+    """Collapse chunk-level matches into one result per candidate, best chunk first.
+
+    Each candidate is scored by its best chunk; the matching chunks are kept under
+    "chunks" so callers can show which sections matched.
+    """
+    candidates = {}
+    for match in matches:
+        candidate_id = match["metadata"].get("candidate_id", match["id"])
+        entry = candidates.get(candidate_id)
+        if entry is None:
+            entry = candidates[candidate_id] = {"id": candidate_id, "score": match["score"],
+                                                "metadata": match["metadata"], "chunks": []}
+        elif (match["score"] > entry["score"] if higher_is_better else match["score"] < entry["score"]):
+            entry["score"] = match["score"]
+            entry["metadata"] = match["metadata"]
+        entry["chunks"].append({"id": match["id"], "score": match["score"],
+                                "section": match["metadata"].get("section")})
+    ranked = sorted(candidates.values(), key=lambda c: c["score"], reverse=higher_is_better)
+    return ranked[:top_k] if top_k else ranked